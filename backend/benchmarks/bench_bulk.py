@@ -0,0 +1,45 @@
+"""Throughput of POST /risks/bulk against looping POST /risks/, on the local PostgREST stub.
+
+Run from `backend/`: python -m benchmarks.bench_bulk --items 1000 --latency-ms 2
+"""
+import argparse
+import os
+import time
+from fastapi.testclient import TestClient
+from tests.postgrest_stub import FAKE_KEY, PostgrestStub, serve
+from utils import auth
+
+HEADERS = {"Authorization": "Bearer demo-risk_manager"}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated database round trip")
+    args = parser.parse_args()
+
+    stub = PostgrestStub()
+    stub.latency = args.latency_ms / 1000
+    items = [{"title": f"Onboarded risk {i}", "impact": i % 5 + 1, "likelihood": (i // 5) % 5 + 1} for i in range(args.items)]
+    with serve(stub) as url:
+        os.environ.update(SUPABASE_URL=url, SUPABASE_ANON_KEY=FAKE_KEY)
+        from main import app
+        from utils.registry import Registry
+        app.state.registry = Registry()
+        auth.configure(auth.AuthSettings(demo_mode=True))
+        with TestClient(app) as client:
+            start = time.perf_counter()
+            for item in items:
+                client.post("/api/v1/risks/", json=item, headers=HEADERS).raise_for_status()
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(0, len(items), 1000):
+                client.post("/api/v1/risks/bulk", json=items[i:i + 1000], headers=HEADERS).raise_for_status()
+            bulk = time.perf_counter() - start
+
+    print(f"{args.items} risks, {args.latency_ms} ms simulated round trip")
+    print(f"single creates: {single:7.3f}s  {args.items / single:9.0f} items/s")
+    print(f"bulk create:    {bulk:7.3f}s  {args.items / bulk:9.0f} items/s  ({single / bulk:.0f}x)")
+
+if __name__ == "__main__":
+    main()
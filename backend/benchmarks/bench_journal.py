@@ -0,0 +1,77 @@
+"""Durable workflow transitions per second, and recovery time after a long history.
+
+Run from `backend/`: python -m benchmarks.bench_journal --transitions 1000000 --concurrency 64
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from schemas.workflow import WorkflowRequest, WorkflowTransition
+from utils.demo_store import WorkflowsStore
+from utils.journal import WORKFLOW_SNAPSHOT_EVERY
+
+async def throughput(directory: str, requests: int, concurrency: int) -> None:
+    store = WorkflowsStore(directory)
+    for i in range(requests):
+        store.create_request(WorkflowRequest(request_id=f"t{i}", title=f"Request {i}"))
+    await store.commit()
+    fsyncs = store._journal.fsyncs
+    ids = iter(range(requests))
+
+    async def approver():
+        # each transition is acknowledged only once it is on disk
+        for i in ids:
+            store.transition(WorkflowTransition(request_id=f"t{i}", action="approve"))
+            await store.commit()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[approver() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    fsyncs = store._journal.fsyncs - fsyncs
+    store.close()
+    print(f"durable transitions: {requests / elapsed:9.0f}/s  ({concurrency} concurrent, {fsyncs} fsyncs, {requests / max(fsyncs, 1):.0f} per fsync)")
+
+async def history(directory: str, transitions: int, snapshot_every: int) -> None:
+    # requests bounce between L1 and L2, so a long history leaves a modest live state
+    store = WorkflowsStore(directory, snapshot_every)
+    live = max(transitions // 10, 1)
+    for i in range(live):
+        store.create_request(WorkflowRequest(request_id=f"h{i}", title=f"Request {i}"))
+    for n in range(transitions):
+        store.transition(WorkflowTransition(request_id=f"h{n % live}", action="approve" if (n // live) % 2 == 0 else "reject"))
+        if n % 10000 == 0:
+            await store.commit()
+    await store.commit()
+    store.close()
+
+def recover(directory: str, snapshot_every: int) -> float:
+    start = time.perf_counter()
+    store = WorkflowsStore(directory, snapshot_every)
+    store.get_config()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000, help="transitions in the throughput run")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--transitions", type=int, default=1_000_000, help="history length for the recovery run")
+    parser.add_argument("--snapshot-every", type=int, default=WORKFLOW_SNAPSHOT_EVERY)
+    parser.add_argument("--full-replay", action="store_true", help="also time recovery from the journal alone")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(throughput(directory, args.requests, args.concurrency))
+
+    runs = [("snapshot + tail", args.snapshot_every)] + ([("journal only", args.transitions * 10)] if args.full_replay else [])
+    for label, every in runs:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            asyncio.run(history(directory, args.transitions, every))
+            built = time.perf_counter() - start
+            elapsed = recover(directory, every)
+            print(f"recovery after {args.transitions} transitions ({label}): {elapsed:.3f}s  (history written in {built:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Rate limiter overhead: a bucket take with 1..8 worker processes sharing the table, and the
+per-request cost of the middleware (default budget) and of a per-route dependency.
+
+Run from `backend/`: DEMO_MODE=true python -m benchmarks.bench_ratelimit --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from starlette.requests import Request
+from utils import ratelimit
+from utils.ratelimit import RateLimitMiddleware, TokenBuckets, parse_limits, rate_limit
+
+# budgets large enough that nothing is rejected, so every request pays for a full take
+LIMITS = parse_limits("default=1000000000/s,bulk=1000000000/s")
+SCOPE = {"type": "http", "method": "GET", "path": "/api/v1/risks/", "query_string": b"", "client": ("10.0.0.1", 1234),
+         "headers": [(b"authorization", b"Bearer demo-admin"), (b"host", b"bench")]}
+
+def taker(path: str, calls: int, start, results):
+    buckets = TokenBuckets(path)
+    rng = random.Random(os.getpid())
+    keys = [f"default|viewer|user:{rng.randrange(10**6)}" for _ in range(1000)]
+    start.wait()
+    begin, cpu = time.perf_counter(), time.process_time()
+    for i in range(calls):
+        buckets.take(keys[i % 1000], 1e9, 1e9)
+    results.put((time.perf_counter() - begin, (time.process_time() - cpu) / calls * 1e6))
+
+def shared_table(path: str, workers: int, calls: int):
+    ctx = multiprocessing.get_context("spawn")
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=taker, args=(path, calls, start, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    time.sleep(1)
+    start.set()
+    runs = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    # CPU per call, since workers time-slice when there are fewer cores than workers
+    return workers * calls / max(wall for wall, _ in runs), sum(cpu for _, cpu in runs) / workers
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def send(message):
+    if message["type"] == "http.response.start" and message["status"] != 200:
+        raise RuntimeError(f"answered {message['status']}")
+
+async def overhead(call, n: int) -> float:
+    # calls with and without limits alternate and medians are compared, so scheduler noise and
+    # drift fall on both sides of the difference
+    timings = {"off": [], "on": []}
+    for i in range(2 * n):
+        variant = "on" if i % 2 else "off"
+        ratelimit.limits = LIMITS if variant == "on" else {}
+        begin = time.perf_counter()
+        await call()
+        timings[variant].append(time.perf_counter() - begin)
+    return (statistics.median(timings["on"]) - statistics.median(timings["off"])) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(f"cpus: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "buckets.bin")
+        for n in args.workers:
+            rate, cpu = shared_table(path, n, args.calls)
+            print(f"take, {n} workers sharing the table: {cpu:5.2f} us CPU/call, {rate:9.0f} calls/s in total")
+        ratelimit._buckets = TokenBuckets(path)
+        middleware, check = RateLimitMiddleware(endpoint), rate_limit("bulk")
+        cost = asyncio.run(overhead(lambda: middleware(SCOPE, receive, send), args.requests))
+        print(f"middleware (default budget): {cost:5.2f} us/request")
+        cost = asyncio.run(overhead(lambda: check(Request(SCOPE)), args.requests))
+        print(f"rate_limit(\"bulk\") dependency: {cost:5.2f} us/request")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Memory and latency of a large risk register in the memory store and the compact store.
+
+Each store is loaded in its own process so the resident-set growth is its own.
+Run from `backend/`: python -m benchmarks.bench_records --rows 1000000
+"""
+import argparse
+import multiprocessing
+import random
+import resource
+import time
+from schemas.risk import RiskCreate, RiskUpdate
+from utils.compact_store import CompactRisksStore
+from utils.demo_store import RisksStore
+from utils.pagination import Cursor
+
+STORES = {"memory": RisksStore, "compact": CompactRisksStore}
+WORDS = ["vendor", "outage", "breach", "phishing", "insider", "ransomware", "backup", "failure", "cloud", "misconfiguration", "fraud", "supplier"]
+OWNERS = [f"owner{i}@example.com" for i in range(200)]
+MITIGATIONS = ["Accept", "Transfer to insurer", "Quarterly access review", "Vendor SLA monitoring", None]
+CHUNK = 1000
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+def payloads(rng: random.Random, start: int, count: int):
+    return [RiskCreate(
+        title=f"{' '.join(rng.choice(WORDS) for _ in range(3))} {i}",
+        description=rng.choice([None, f"Raised in review {i // 1000}"]),
+        impact=rng.randint(1, 5), likelihood=rng.randint(1, 5),
+        mitigation=rng.choice(MITIGATIONS), owner=rng.choice(OWNERS),
+    ) for i in range(start, start + count)]
+
+def latency(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def measure(name: str, rows: int, results):
+    rng = random.Random(rows)
+    before = rss_mb()
+    store = STORES[name]()
+    load = 0.0
+    for start in range(0, rows, CHUNK):
+        batch = payloads(rng, start, min(CHUNK, rows - start))
+        begin = time.perf_counter()
+        # the CSV importer's path: one create_many per chunk
+        store.create_many(batch)
+        load += time.perf_counter() - begin
+    memory = rss_mb() - before
+    ids = [rng.randint(1, rows) for _ in range(1000)]
+    report = {
+        "load_s": load,
+        "rss_mb": memory,
+        "get_us": latency(lambda i: store.get(ids[i % 1000]), 20000),
+        "page_us": latency(lambda i: store.page(skip=0, limit=20, after=Cursor(ids[i % 1000])), 2000),
+        "search_us": latency(lambda i: store.page(q=f"{WORDS[i % len(WORDS)]} {WORDS[(i + 3) % len(WORDS)]}", limit=20), 200),
+        "update_us": latency(lambda i: store.update(ids[i % 1000], RiskUpdate(impact=i % 5 + 1, owner=OWNERS[i % 200])), 2000),
+        "stats_us": latency(lambda i: store.stats(10), 2000),
+    }
+    results.put((name, report))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    reports = {}
+    for name in STORES:
+        proc = ctx.Process(target=measure, args=(name, args.rows, results))
+        proc.start()
+        proc.join()
+        if proc.exitcode:
+            raise SystemExit(f"{name} run failed")
+        key, report = results.get()
+        reports[key] = report
+    print(f"{args.rows} risks")
+    print(f"{'':10}" + "".join(f"{column:>12}" for column in reports["memory"]))
+    for name, report in reports.items():
+        print(f"{name:10}" + "".join(f"{value:12.1f}" for value in report.values()))
+
+if __name__ == "__main__":
+    main()
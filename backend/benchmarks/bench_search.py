@@ -0,0 +1,56 @@
+"""Compare `?q=` lookups on the demo stores with and without the trigram index.
+
+Run from `backend/`: python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from utils.demo_store import PoliciesStore
+from schemas.policy import PolicyCreate
+
+WORDS = [
+    "access", "control", "data", "retention", "backup", "vendor", "incident", "response", "privacy", "encryption",
+    "password", "network", "segmentation", "logging", "monitoring", "change", "management", "asset", "inventory",
+    "training", "awareness", "physical", "security", "continuity", "disaster", "recovery", "cloud", "mobile",
+    "device", "remote", "work", "acceptable", "use", "classification", "third", "party", "patch", "vulnerability",
+]
+QUERIES = ["disaster recovery", "vendor", "key rotation", "ion", "policy 12345"]
+
+def seed(size: int) -> PoliciesStore:
+    rng = random.Random(size)
+    store = PoliciesStore()
+    for i in range(size):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+        store.create(PolicyCreate(title=f"{title} policy {i}"))
+    return store
+
+def scan(store: PoliciesStore, q: str, skip: int = 0, limit: int = 20):
+    # the pre-index implementation of PoliciesStore.list
+    items = list(store._items.values())
+    items = [i for i in items if q.lower() in i.title.lower()]
+    return items[skip: skip + limit]
+
+def timeit(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'query':>18} {'matches':>8} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        store = seed(size)
+        for q in QUERIES:
+            assert [p.id for p in store.list(q=q)] == [p.id for p in scan(store, q)]
+            matches = len(store._index.search(q))
+            scan_s = timeit(lambda: scan(store, q), args.repeat)
+            index_s = timeit(lambda: store.list(q=q), args.repeat)
+            print(f"{size:>9} {q!r:>18} {matches:>8} {scan_s * 1e3:>9.2f} {index_s * 1e3:>9.2f} {scan_s / index_s:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Throughput of the SQLite local store with 1..8 worker processes sharing one database file.
+
+Each worker runs a mix of creates, point reads and searches, like a uvicorn worker would.
+Run from `backend/`: python -m benchmarks.bench_sqlite --workers 1 2 4 8 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from schemas.policy import PolicyCreate, PolicyUpdate
+from utils.sqlite_store import SqliteDB, SqlitePoliciesStore
+
+def worker(path: str, seconds: float, writes: float, start, results):
+    store = SqlitePoliciesStore(SqliteDB(path))
+    rng = random.Random(os.getpid())
+    created, ops = [], {"create": 0, "update": 0, "get": 0, "search": 0}
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < writes * 0.7:
+            created.append(store.create(PolicyCreate(title=f"Policy {rng.randrange(10**6)}")).id)
+            ops["create"] += 1
+        elif roll < writes:
+            store.update(rng.randrange(1, 10001), PolicyUpdate(status="Approved"))
+            ops["update"] += 1
+        elif roll < writes + (1 - writes) / 2:
+            store.get(rng.randrange(1, 10001))
+            ops["get"] += 1
+        else:
+            store.page(q=str(rng.randrange(100, 1000)), limit=20)
+            ops["search"] += 1
+    results.put((ops, created))
+
+def run(workers: int, seconds: float, writes: float) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grc.db")
+        SqlitePoliciesStore(SqliteDB(path)).create_many([PolicyCreate(title=f"Policy {i}") for i in range(10000)])
+        start, results = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(path, seconds, writes, start, results)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        time.sleep(1)
+        start.set()
+        totals, ids = {}, []
+        for _ in procs:
+            ops, created = results.get()
+            ids += created
+            for k, v in ops.items():
+                totals[k] = totals.get(k, 0) + v
+        for p in procs:
+            p.join()
+        assert len(ids) == len(set(ids)), "duplicate ids across workers"
+        count = SqlitePoliciesStore(SqliteDB(path)).count()
+        assert count == 10000 + len(ids), f"expected {10000 + len(ids)} rows, found {count}"
+    total = sum(totals.values())
+    detail = "  ".join(f"{k} {v / seconds:7.0f}/s" for k, v in totals.items())
+    print(f"{workers} workers: {total / seconds:8.0f} ops/s  ({detail})  {len(ids)} unique ids")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writes", type=float, default=0.2, help="share of operations that write")
+    args = parser.parse_args()
+    print(f"cpus: {os.cpu_count()}")
+    for n in args.workers:
+        run(n, args.seconds, args.writes)
+
+if __name__ == "__main__":
+    main()
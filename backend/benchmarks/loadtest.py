@@ -0,0 +1,269 @@
+"""Load test for every router (auth, policies, risks, compliance, workflows). Each mode runs in a fresh
+process: `demo` against the in-memory stores, `postgrest` against the local PostgREST stand-in from
+tests/postgrest_stub.py. The stores are seeded through the API, then every scenario is driven by
+`--concurrency` clients in-process over ASGI and reported as JSON (requests/s, p50/p95/p99 in ms).
+With `--baseline` a previous report is compared and the exit status is 1 on a regression.
+
+Run from `backend/`:
+    python -m benchmarks.loadtest --policies 5000 --risks 5000 --out load.json
+    python -m benchmarks.loadtest --baseline load.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+API = "/api/v1"
+ROLES = ("admin", "risk_manager", "compliance_officer", "viewer")
+CONTROLS = [f"C{i}" for i in range(1, 41)]
+
+class Scenario(NamedTuple):
+    router: str
+    name: str
+    method: str
+    path: str
+    # builds the keyword arguments of one request from (rng, n), n counting the scenario's requests
+    build: Optional[Callable[[random.Random, int], Dict[str, Any]]] = None
+    role: str = "admin"
+    # heavy scenarios (bulk writes, imports, exports) run a tenth of the requests
+    heavy: bool = False
+
+def _csv(fields: List[str], rows: List[List[Any]]) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+def _risk(i: int) -> Dict[str, Any]:
+    return {"title": f"Risk {i} vendor outage", "description": f"Seeded risk {i}", "impact": i % 5 + 1, "likelihood": i // 5 % 5 + 1, "owner": f"owner{i % 20}"}
+
+def _policy(i: int) -> Dict[str, Any]:
+    return {"title": f"Policy {i} access control", "description": f"Seeded policy {i}", "status": ("Draft", "Approved", "Retired")[i % 3]}
+
+def scenarios(sizes: Dict[str, int]) -> List[Scenario]:
+    # reads pick records from the lower half of the seeded ids; deletes walk down from the top
+    def pick(name: str) -> Callable[[random.Random], int]:
+        return lambda rng: rng.randint(1, max(sizes[name] // 2, 1))
+    policy, risk, framework = pick("policies"), pick("risks"), pick("frameworks")
+    request = lambda rng: f"seed-{rng.randrange(max(sizes['workflows'] // 2, 1))}"
+    words = ["access", "vendor", "outage", "control", "policy 1", "risk 2"]
+    return [
+        Scenario("auth", "login", "POST", "/auth/login", lambda rng, n: {"json": {"role": rng.choice(ROLES)}}),
+        Scenario("auth", "me", "GET", "/auth/me", role="viewer"),
+
+        Scenario("policies", "list", "GET", "/policies/", lambda rng, n: {"params": {"skip": rng.randrange(100), "limit": 20}}, "viewer"),
+        Scenario("policies", "search", "GET", "/policies/", lambda rng, n: {"params": {"q": rng.choice(words)}}, "viewer"),
+        Scenario("policies", "get", "GET", "/policies/{id}", lambda rng, n: {"id": policy(rng)}, "viewer"),
+        Scenario("policies", "create", "POST", "/policies/", lambda rng, n: {"json": _policy(n)}),
+        Scenario("policies", "update", "PUT", "/policies/{id}", lambda rng, n: {"id": policy(rng), "json": {"status": "Approved"}}),
+        Scenario("policies", "delete", "DELETE", "/policies/{id}", lambda rng, n: {"id": sizes["policies"] - n}),
+        Scenario("policies", "bulk_create", "POST", "/policies/bulk", lambda rng, n: {"json": [_policy(i) for i in range(100)]}, heavy=True),
+        Scenario("policies", "export", "GET", "/policies/export", lambda rng, n: {"params": {"format": "ndjson"}}, "viewer", True),
+
+        Scenario("risks", "list", "GET", "/risks/", lambda rng, n: {"params": {"skip": rng.randrange(100), "limit": 20}}, "viewer"),
+        Scenario("risks", "search", "GET", "/risks/", lambda rng, n: {"params": {"q": rng.choice(words)}}, "viewer"),
+        Scenario("risks", "get", "GET", "/risks/{id}", lambda rng, n: {"id": risk(rng)}, "viewer"),
+        Scenario("risks", "heatmap", "GET", "/risks/heatmap", role="viewer"),
+        Scenario("risks", "stats", "GET", "/risks/stats", role="viewer"),
+        Scenario("risks", "create", "POST", "/risks/", lambda rng, n: {"json": _risk(n)}, "risk_manager"),
+        Scenario("risks", "update", "PUT", "/risks/{id}", lambda rng, n: {"id": risk(rng), "json": {"impact": rng.randint(1, 5)}}, "risk_manager"),
+        Scenario("risks", "delete", "DELETE", "/risks/{id}", lambda rng, n: {"id": sizes["risks"] - n}),
+        Scenario("risks", "bulk_create", "POST", "/risks/bulk", lambda rng, n: {"json": [_risk(i) for i in range(100)]}, "risk_manager", True),
+        Scenario("risks", "bulk_update", "PUT", "/risks/bulk", lambda rng, n: {"json": [{"id": risk(rng), "likelihood": rng.randint(1, 5)} for _ in range(100)]}, "risk_manager", True),
+        Scenario("risks", "import", "POST", "/risks/import", lambda rng, n: {"files": {"file": ("risks.csv", _csv(["title", "impact", "likelihood"], [[f"Imported {i}", i % 5 + 1, i % 3 + 1] for i in range(100)]), "text/csv")}}, "risk_manager", True),
+        Scenario("risks", "export", "GET", "/risks/export", lambda rng, n: {"params": {"format": "ndjson"}}, "viewer", True),
+
+        Scenario("compliance", "list", "GET", "/compliance/frameworks", lambda rng, n: {"params": {"limit": 20}}, "viewer"),
+        Scenario("compliance", "get", "GET", "/compliance/frameworks/{id}", lambda rng, n: {"id": framework(rng)}, "viewer"),
+        Scenario("compliance", "create", "POST", "/compliance/frameworks", lambda rng, n: {"json": {"name": f"Framework {n}", "controls": CONTROLS[:10]}}, "compliance_officer"),
+        Scenario("compliance", "map_controls", "POST", "/compliance/map-controls", lambda rng, n: {"json": {"framework_id": framework(rng), "control_to_policy": {rng.choice(CONTROLS): [policy(rng)]}}}, "compliance_officer"),
+        Scenario("compliance", "coverage", "GET", "/compliance/coverage", role="viewer"),
+        Scenario("compliance", "framework_coverage", "GET", "/compliance/frameworks/{id}/coverage", lambda rng, n: {"id": framework(rng)}, "viewer"),
+        Scenario("compliance", "unmapped", "GET", "/compliance/frameworks/{id}/unmapped", lambda rng, n: {"id": framework(rng)}, "viewer"),
+        Scenario("compliance", "blast_radius", "GET", "/compliance/policies/{id}/blast-radius", lambda rng, n: {"id": policy(rng)}, "viewer"),
+
+        Scenario("workflows", "config", "GET", "/workflows/config", role="viewer"),
+        Scenario("workflows", "create", "POST", "/workflows/requests", lambda rng, n: {"json": {"request_id": f"load-{n}", "title": f"Load {n}"}}),
+        Scenario("workflows", "get", "GET", "/workflows/requests/{id}", lambda rng, n: {"id": request(rng)}, "viewer"),
+        Scenario("workflows", "stages", "GET", "/workflows/stages", role="viewer"),
+        Scenario("workflows", "queue", "GET", "/workflows/stages/L1/queue", lambda rng, n: {"params": {"limit": 20}}, "viewer"),
+        Scenario("workflows", "transition", "POST", "/workflows/transition", lambda rng, n: {"json": {"request_id": f"load-{n}", "action": "approve"}}),
+        Scenario("workflows", "batch_transition", "POST", "/workflows/transition/batch", lambda rng, n: {"json": {"action": "approve", "stage": "L2", "request_ids": [f"load-{i}" for i in range(n * 100, n * 100 + 100)]}}, heavy=True),
+    ]
+
+async def seed(client, sizes: Dict[str, int]):
+    admin = {"Authorization": "Bearer demo-admin"}
+    for name, make in (("policies", _policy), ("risks", _risk)):
+        # the demo stores start with one seeded record, so ids stay 1..size
+        existing = (await client.get(f"{API}/{name}/", params={"limit": 1}, headers=admin)).json()["total"]
+        for start in range(existing, sizes[name], 1000):
+            res = await client.post(f"{API}/{name}/bulk", json=[make(i) for i in range(start, min(start + 1000, sizes[name]))], headers=admin)
+            res.raise_for_status()
+    rows = [[f"Framework {i}", ";".join(CONTROLS), ""] for i in range(sizes["frameworks"])]
+    res = await client.post(f"{API}/compliance/frameworks/import", files={"file": ("frameworks.csv", _csv(["name", "controls", "description"], rows), "text/csv")}, headers=admin)
+    res.raise_for_status()
+    rng = random.Random(0)
+    for framework_id in range(1, sizes["frameworks"] + 1):
+        mapping = {c: [rng.randint(1, sizes["policies"])] for c in rng.sample(CONTROLS, len(CONTROLS) // 2)}
+        (await client.post(f"{API}/compliance/map-controls", json={"framework_id": framework_id, "control_to_policy": mapping}, headers=admin)).raise_for_status()
+    for i in range(sizes["workflows"]):
+        (await client.post(f"{API}/workflows/requests", json={"request_id": f"seed-{i}", "title": f"Seeded request {i}"}, headers=admin)).raise_for_status()
+
+def _percentile(cuts: List[float], p: int) -> float:
+    return round(cuts[p - 1] * 1000, 3)
+
+async def drive(client, scenario: Scenario, requests: int, concurrency: int, rng: random.Random) -> Dict[str, Any]:
+    # arguments are built up front so their cost stays out of the timings
+    calls = []
+    for n in range(requests):
+        kwargs = scenario.build(rng, n) if scenario.build else {}
+        path = API + scenario.path.format(id=kwargs.pop("id", ""))
+        calls.append((path, kwargs))
+    headers = {"Authorization": f"Bearer demo-{scenario.role}"}
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queue = iter(calls)
+
+    async def worker():
+        for path, kwargs in queue:
+            begin = time.perf_counter()
+            res = await client.request(scenario.method, path, headers=headers, **kwargs)
+            await res.aread()
+            latencies.append(time.perf_counter() - begin)
+            statuses[str(res.status_code)] = statuses.get(str(res.status_code), 0) + 1
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - begin
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "router": scenario.router, "scenario": scenario.name, "method": scenario.method, "path": scenario.path,
+        "requests": requests, "errors": sum(c for s, c in statuses.items() if not s.startswith("2")), "statuses": statuses,
+        "rps": round(requests / wall, 1), "p50_ms": _percentile(cuts, 50), "p95_ms": _percentile(cuts, 95), "p99_ms": _percentile(cuts, 99),
+    }
+
+async def run(mode: str, args: argparse.Namespace, url: Optional[str]) -> List[Dict[str, Any]]:
+    import httpx
+    if url:
+        from tests.postgrest_stub import FAKE_KEY
+        os.environ.update(SUPABASE_URL=url, SUPABASE_ANON_KEY=FAKE_KEY)
+    from main import app
+    from routes import workflows
+    sizes = {"policies": args.policies, "risks": args.risks, "frameworks": args.frameworks, "workflows": args.workflows}
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        await seed(client, sizes)
+        rng = random.Random(args.seed)
+        for scenario in scenarios(sizes):
+            if args.routers and scenario.router not in args.routers:
+                continue
+            requests = max(args.requests // 10, 2) if scenario.heavy else args.requests
+            if scenario.name == "delete":
+                # never below the half that reads pick from
+                requests = min(requests, sizes[scenario.router] // 2)
+            result = await drive(client, scenario, requests, args.concurrency, rng)
+            results.append({"mode": mode, **result})
+            print(f"{mode:9} {scenario.router:10} {scenario.name:18} {result['rps']:9.1f} req/s  p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms"
+                  + (f"  {result['errors']} errors" if result["errors"] else ""), file=sys.stderr)
+    await app.state.registry.close()
+    workflows.store.close()
+    return results
+
+def worker(mode: str, args: argparse.Namespace, conn):
+    # every request runs as a demo user of one role, so the default budget would cut the run short
+    os.environ.update(DEMO_MODE="true", RATE_LIMITS="", RATE_LIMIT_PATH="")
+    os.environ.pop("SUPABASE_URL", None)
+    if mode == "postgrest":
+        from tests.postgrest_stub import PostgrestStub, serve
+        stub = PostgrestStub()
+        stub.latency = args.latency_ms / 1000
+        with serve(stub) as url:
+            conn.send(asyncio.run(run(mode, args, url)))
+    else:
+        conn.send(asyncio.run(run(mode, args, None)))
+
+def _revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    # a scenario regresses when its throughput drops, or its p95 grows, by more than `tolerance`
+    ignored = {"modes", "routers"}
+    if {k: v for k, v in report["config"].items() if k not in ignored} != {k: v for k, v in baseline["config"].items() if k not in ignored}:
+        print("warning: the baseline was recorded with different sizes or settings", file=sys.stderr)
+    before = {(r["mode"], r["router"], r["scenario"]): r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        old = before.get((r["mode"], r["router"], r["scenario"]))
+        if old is None:
+            continue
+        if r["rps"] < old["rps"] * (1 - tolerance) or r["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r['mode']} {r['router']} {r['scenario']}: {old['rps']} -> {r['rps']} req/s, p95 {old['p95_ms']} -> {r['p95_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=["demo", "postgrest"], default=["demo", "postgrest"])
+    parser.add_argument("--routers", nargs="+", choices=["auth", "policies", "risks", "compliance", "workflows"])
+    parser.add_argument("--policies", type=int, default=2000)
+    parser.add_argument("--risks", type=int, default=2000)
+    parser.add_argument("--frameworks", type=int, default=50)
+    parser.add_argument("--workflows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated database round trip (postgrest mode)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="a previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "revision": _revision(),
+        "python": platform.python_version(), "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "tolerance")}, "results": [],
+    }
+    ctx = multiprocessing.get_context("spawn")
+    for mode in args.modes:
+        # a fresh process per mode: the stores and the repository registry are built at import
+        receiver, sender = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=worker, args=(mode, args, sender))
+        proc.start()
+        sender.close()
+        try:
+            report["results"] += receiver.recv()
+        except EOFError:
+            raise SystemExit(f"{mode} run failed")
+        finally:
+            proc.join()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,40 @@
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
 
-from routes import auth, policies, risks, compliance, workflows
+from routes import admin, auth, policies, risks, compliance, workflows
+from utils.metrics import MetricsMiddleware, authorized, metrics
+from utils.profiling import ProfileMiddleware, start_sampler
+from utils.ratelimit import RateLimitMiddleware
+from utils.registry import Registry
 
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173")
 
-limiter = Limiter(key_func=lambda request: request.client.host)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the workflow journal admits one process; a second worker stops here with the reason
+    workflows.store.open()
+    # PROFILE_SAMPLE_HZ > 0 samples every thread in the background for flamegraphs
+    sampler = start_sampler()
+    yield
+    if sampler:
+        sampler.stop()
+    # backends are built lazily on first request; release the shared pool on shutdown
+    await app.state.registry.close()
+    workflows.store.close()
 
-app = FastAPI(title="GRC Platform API", version="1.0.0")
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app = FastAPI(title="GRC Platform API", version="1.0.0", lifespan=lifespan)
+app.state.registry = Registry()
+api_prefix = "/api/v1"
 
+# innermost, so a profiled request (admins only, `X-Profile: 1`) is sampled from routing onwards
+app.add_middleware(ProfileMiddleware, location=f"{api_prefix}/admin/profiles")
+# every request draws from the caller's "default" budget; bulk, import, export and login add their own.
+# Added before CORS so preflights are not counted and rejections still carry CORS headers.
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[origin.strip() for origin in CORS_ORIGINS.split(",")],
@@ -22,14 +42,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so the latencies include rate limiting and CORS
+app.add_middleware(MetricsMiddleware)
 
-api_prefix = "/api/v1"
 app.include_router(auth.router, prefix=api_prefix)
 app.include_router(policies.router, prefix=api_prefix)
 app.include_router(risks.router, prefix=api_prefix)
 app.include_router(compliance.router, prefix=api_prefix)
 app.include_router(workflows.router, prefix=api_prefix)
+app.include_router(admin.router, prefix=api_prefix)
 
 @app.get("/")
 def root():
-    return {"message": "GRC Platform API", "demo_mode": DEMO_MODE}
\ No newline at end of file
+    return {"message": "GRC Platform API", "demo_mode": DEMO_MODE}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    # Prometheus text format, per worker process; METRICS_TOKEN guards it when set
+    if not authorized(authorization):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,29 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from utils.auth import get_current_user
+from utils.rbac import require_roles, Role
+from utils.registry import Registry, get_registry
+from utils.profiling import list_profiles, profile_path
+from schemas.common import CacheStats, ProfileInfo
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/cache", dependencies=[Depends(require_roles([Role.ADMIN]))])
+async def cache_stats(user=Depends(get_current_user), registry: Registry = Depends(get_registry)) -> List[CacheStats]:
+    # empty until the repositories are built, and in demo mode
+    return [CacheStats(**cache.stats()) for cache in registry.caches.values()]
+
+@router.get("/profiles", dependencies=[Depends(require_roles([Role.ADMIN]))])
+async def profiles(user=Depends(get_current_user)) -> List[ProfileInfo]:
+    # newest first; recorded by sending a request with `X-Profile: 1` as an admin
+    return [ProfileInfo(**info) for info in await run_in_threadpool(list_profiles)]
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_roles([Role.ADMIN]))])
+async def download_profile(profile_id: str, user=Depends(get_current_user)):
+    path = await run_in_threadpool(profile_path, profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    # folded stacks, one "frame;frame;frame count" line per stack, for flamegraph.pl or speedscope
+    return FileResponse(path, media_type="text/plain", filename=f"profile-{profile_id}.folded")
@@ -1,9 +1,9 @@
-import os
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from utils.auth import get_current_user, create_demo_token
+from utils.auth import get_current_user, get_settings, create_demo_token
 from utils.rbac import Role
+from utils.ratelimit import rate_limit
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -12,10 +12,9 @@ class LoginRequest(BaseModel):
     password: Optional[str] = None
     role: Optional[Role] = None  # used for demo login
 
-@router.post("/login")
-def login(payload: LoginRequest):
-    demo_mode = os.getenv("DEMO_MODE", "false").lower() == "true"
-    if demo_mode:
+@router.post("/login", dependencies=[Depends(rate_limit("login"))])
+async def login(payload: LoginRequest):
+    if get_settings().demo_mode:
         if not payload.role:
             raise HTTPException(status_code=400, detail="role required in demo mode")
         token = create_demo_token(payload.role.value)
@@ -24,5 +23,5 @@ def login(payload: LoginRequest):
     raise HTTPException(status_code=501, detail="Non-demo login not implemented. Configure Supabase.")
 
 @router.get("/me")
-def me(user=Depends(get_current_user)):
+async def me(user=Depends(get_current_user)):
     return user
\ No newline at end of file
@@ -1,41 +1,77 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File
 from utils.auth import get_current_user
 from utils.rbac import require_roles, Role
-from utils.demo_store import ComplianceStore
-from utils.db import get_repos
-from schemas.compliance import FrameworkCreate, FrameworkUpdate, FrameworkOut, ControlMapRequest
-from schemas.common import PaginatedResponse
+from utils.ratelimit import rate_limit
+from utils.demo_store import local_store
+from utils.registry import get_repos
+from utils.pagination import decode_cursor, page_json
+from utils.versions import ConditionalRoute, collection_etag, record_etag
+from utils.imports import import_csv
+from schemas.compliance import FrameworkCreate, FrameworkUpdate, FrameworkOut, ControlMapRequest, FrameworkCoverage, UnmappedControls, PolicyBlastRadius
+from schemas.common import PaginatedResponse, ImportReport
 
-router = APIRouter(prefix="/compliance", tags=["compliance"])
-store = ComplianceStore()
-repos = get_repos()
+router = APIRouter(prefix="/compliance", tags=["compliance"], route_class=ConditionalRoute)
+store = local_store("compliance")
 
-@router.get("/frameworks")
-def list_frameworks(q: Optional[str] = None, skip: int = 0, limit: int = 20, user=Depends(get_current_user)) -> PaginatedResponse[FrameworkOut]:
+@router.get("/frameworks", dependencies=[Depends(collection_etag("frameworks"))])
+async def list_frameworks(response: Response, q: Optional[str] = None, skip: int = 0, limit: int = 20, cursor: Optional[str] = None, user=Depends(get_current_user), repos=Depends(get_repos)) -> PaginatedResponse[FrameworkOut]:
+    after = decode_cursor(cursor)
     if repos:
-        items = repos["compliance"].list_frameworks(q=q, skip=skip, limit=limit)
-        total = repos["compliance"].count_frameworks()
-        return PaginatedResponse(items=items, total=total)
-    items = store.list(q=q, skip=skip, limit=limit)
-    return PaginatedResponse(items=items, total=store.count())
+        page = await repos["compliance"].page_frameworks(q=q, skip=skip, limit=limit, after=after)
+    else:
+        page = await store.page(q=q, skip=skip, limit=limit, after=after)
+    return page_json(page, response)
 
 @router.post("/frameworks", dependencies=[Depends(require_roles([Role.ADMIN, Role.COMPLIANCE_OFFICER]))])
-def create_framework(payload: FrameworkCreate, user=Depends(get_current_user)) -> FrameworkOut:
+async def create_framework(payload: FrameworkCreate, user=Depends(get_current_user), repos=Depends(get_repos)) -> FrameworkOut:
     if repos:
-        return repos["compliance"].create_framework(payload)
-    return store.create(payload)
+        return await repos["compliance"].create_framework(payload)
+    return await store.create(payload)
+
+@router.post("/frameworks/import", dependencies=[Depends(rate_limit("import")), Depends(require_roles([Role.ADMIN, Role.COMPLIANCE_OFFICER]))])
+async def import_frameworks(file: UploadFile = File(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> ImportReport:
+    return await import_csv(file.file, FrameworkCreate, repos["compliance"].create_frameworks if repos else store.create_many)
+
+@router.get("/frameworks/{framework_id}", dependencies=[Depends(record_etag("frameworks", "framework_id"))])
+async def get_framework(framework_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> FrameworkOut:
+    item = await repos["compliance"].get_framework(framework_id) if repos else await store.get(framework_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Framework not found")
+    return item
 
 @router.put("/frameworks/{framework_id}", dependencies=[Depends(require_roles([Role.ADMIN, Role.COMPLIANCE_OFFICER]))])
-def update_framework(framework_id: int, payload: FrameworkUpdate, user=Depends(get_current_user)) -> FrameworkOut:
-    item = repos["compliance"].update_framework(framework_id, payload) if repos else store.update(framework_id, payload)
+async def update_framework(framework_id: int, payload: FrameworkUpdate, user=Depends(get_current_user), repos=Depends(get_repos)) -> FrameworkOut:
+    item = await repos["compliance"].update_framework(framework_id, payload) if repos else await store.update(framework_id, payload)
     if not item:
         raise HTTPException(status_code=404, detail="Framework not found")
     return item
 
 @router.post("/map-controls", dependencies=[Depends(require_roles([Role.ADMIN, Role.COMPLIANCE_OFFICER]))])
-def map_controls(payload: ControlMapRequest, user=Depends(get_current_user)):
-    ok = repos["compliance"].map_controls(payload.framework_id, payload.control_to_policy) if repos else store.map_controls(payload.framework_id, payload.control_to_policy)
+async def map_controls(payload: ControlMapRequest, user=Depends(get_current_user), repos=Depends(get_repos)):
+    ok = await repos["compliance"].map_controls(payload.framework_id, payload.control_to_policy) if repos else await store.map_controls(payload.framework_id, payload.control_to_policy)
     if not ok:
         raise HTTPException(status_code=404, detail="Framework not found")
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+@router.get("/coverage", dependencies=[Depends(collection_etag("frameworks"))])
+async def list_coverage(user=Depends(get_current_user), repos=Depends(get_repos)) -> List[FrameworkCoverage]:
+    return await repos["compliance"].all_coverage() if repos else await store.all_coverage()
+
+@router.get("/frameworks/{framework_id}/coverage", dependencies=[Depends(collection_etag("frameworks"))])
+async def framework_coverage(framework_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> FrameworkCoverage:
+    item = await repos["compliance"].coverage(framework_id) if repos else await store.coverage(framework_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Framework not found")
+    return item
+
+@router.get("/frameworks/{framework_id}/unmapped", dependencies=[Depends(collection_etag("frameworks"))])
+async def unmapped_controls(framework_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> UnmappedControls:
+    item = await repos["compliance"].unmapped(framework_id) if repos else await store.unmapped(framework_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Framework not found")
+    return item
+
+@router.get("/policies/{policy_id}/blast-radius", dependencies=[Depends(collection_etag("frameworks"))])
+async def policy_blast_radius(policy_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> PolicyBlastRadius:
+    return await repos["compliance"].blast_radius(policy_id) if repos else await store.blast_radius(policy_id)
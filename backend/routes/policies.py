@@ -1,72 +1,133 @@
-from typing import List, Optional
-import os
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Response, Request, UploadFile, File
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from utils.auth import get_current_user
 from utils.rbac import require_roles, Role
-from utils.demo_store import PoliciesStore
-from utils.db import get_repos, get_client
-from schemas.policy import PolicyCreate, PolicyUpdate, PolicyOut
-from schemas.common import PaginatedResponse
+from utils.ratelimit import rate_limit
+from utils.demo_store import local_store
+from utils.registry import Registry, get_registry, get_repos
+from utils.pagination import decode_cursor, page_json
+from utils.versions import ConditionalRoute, collection_etag, record_etag
+from utils.bulk import bulk_body, check_size, missing, validate_items
+from utils.export import export_response
+from utils.uploads import LocalBlobs, StorageBlobs, Staged, UploadSessions, coalesce, read_chunks, stage
+from schemas.policy import PolicyCreate, PolicyUpdate, PolicyBulkUpdate, PolicyOut, UploadSessionCreate, UploadSession
+from schemas.common import PaginatedResponse, BulkError, BulkResponse, BulkDeleteRequest, BulkDeleteResponse
 
-router = APIRouter(prefix="/policies", tags=["policies"])
-store = PoliciesStore()
-repos = get_repos()
+router = APIRouter(prefix="/policies", tags=["policies"], route_class=ConditionalRoute)
+store = local_store("policies")
+sessions = UploadSessions()
 
-@router.get("/")
-def list_policies(q: Optional[str] = None, skip: int = 0, limit: int = 20, user=Depends(get_current_user)) -> PaginatedResponse[PolicyOut]:
+def _blobs(repos, registry: Registry):
+    return StorageBlobs(registry.client) if repos else LocalBlobs()
+
+async def _get_policy(policy_id: int, repos) -> PolicyOut:
+    item = await repos["policies"].get(policy_id) if repos else await store.get(policy_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    return item
+
+async def _attach(policy_id: int, blobs, staged: Staged, content_type: Optional[str], repos) -> PolicyOut:
+    # identical content is stored once; a re-upload only repoints the policy
+    await run_in_threadpool(blobs.put, staged, content_type)
+    change = PolicyUpdate(file_url=blobs.url(staged.digest))
+    return await repos["policies"].update(policy_id, change) if repos else await store.update(policy_id, change)
+
+@router.get("/", dependencies=[Depends(collection_etag("policies"))])
+async def list_policies(response: Response, q: Optional[str] = None, skip: int = 0, limit: int = 20, cursor: Optional[str] = None, user=Depends(get_current_user), repos=Depends(get_repos)) -> PaginatedResponse[PolicyOut]:
+    after = decode_cursor(cursor)
     if repos:
-        items = repos["policies"].list(q=q, skip=skip, limit=limit)
-        total = repos["policies"].count()
-        return PaginatedResponse(items=items, total=total)
-    items = store.list(q=q, skip=skip, limit=limit)
-    return PaginatedResponse(items=items, total=store.count())
+        page = await repos["policies"].page(q=q, skip=skip, limit=limit, after=after)
+    else:
+        page = await store.page(q=q, skip=skip, limit=limit, after=after)
+    return page_json(page, response)
 
 @router.post("/", dependencies=[Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER, Role.COMPLIANCE_OFFICER]))])
-def create_policy(payload: PolicyCreate, user=Depends(get_current_user)) -> PolicyOut:
+async def create_policy(payload: PolicyCreate, user=Depends(get_current_user), repos=Depends(get_repos)) -> PolicyOut:
     if repos:
-        return repos["policies"].create(payload)
-    return store.create(payload)
+        return await repos["policies"].create(payload)
+    return await store.create(payload)
+
+@router.post("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER, Role.COMPLIANCE_OFFICER]))], openapi_extra=bulk_body(PolicyCreate))
+async def bulk_create_policies(payload: List[Any] = Body(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkResponse[PolicyOut]:
+    valid, errors = validate_items(PolicyCreate, payload)
+    creates = [item for _, item in valid]
+    items = await repos["policies"].create_many(creates) if repos else await store.create_many(creates)
+    return BulkResponse(items=items, errors=errors)
+
+@router.put("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER, Role.COMPLIANCE_OFFICER]))], openapi_extra=bulk_body(PolicyBulkUpdate))
+async def bulk_update_policies(payload: List[Any] = Body(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkResponse[PolicyOut]:
+    valid, errors = validate_items(PolicyBulkUpdate, payload)
+    updates = [item for _, item in valid]
+    updated = await repos["policies"].update_many(updates) if repos else await store.update_many(updates)
+    errors += missing(valid, updated, "Policy not found")
+    return BulkResponse(items=list(updated.values()), errors=sorted(errors, key=lambda e: e.index))
 
-@router.get("/{policy_id}")
-def get_policy(policy_id: int, user=Depends(get_current_user)) -> PolicyOut:
-    item = repos["policies"].get(policy_id) if repos else store.get(policy_id)
+@router.delete("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN]))])
+async def bulk_delete_policies(payload: BulkDeleteRequest, user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkDeleteResponse:
+    check_size(payload.ids)
+    deleted = await repos["policies"].delete_many(payload.ids) if repos else await store.delete_many(payload.ids)
+    found = set(deleted)
+    errors = [BulkError(index=i, id=item_id, detail="Policy not found") for i, item_id in enumerate(payload.ids) if item_id not in found]
+    return BulkDeleteResponse(deleted=deleted, errors=errors)
+
+@router.get("/export", dependencies=[Depends(rate_limit("export"))])
+async def export_policies(format: Literal["csv", "ndjson"] = "csv", user=Depends(get_current_user), repos=Depends(get_repos)):
+    list_fn = repos["policies"].list if repos else store.list
+    return export_response(list_fn, PolicyOut, format, "policies")
+
+@router.get("/{policy_id}", dependencies=[Depends(record_etag("policies", "policy_id"))])
+async def get_policy(policy_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> PolicyOut:
+    item = await repos["policies"].get(policy_id) if repos else await store.get(policy_id)
     if not item:
         raise HTTPException(status_code=404, detail="Policy not found")
     return item
 
 @router.put("/{policy_id}", dependencies=[Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER, Role.COMPLIANCE_OFFICER]))])
-def update_policy(policy_id: int, payload: PolicyUpdate, user=Depends(get_current_user)) -> PolicyOut:
-    item = repos["policies"].update(policy_id, payload) if repos else store.update(policy_id, payload)
+async def update_policy(policy_id: int, payload: PolicyUpdate, user=Depends(get_current_user), repos=Depends(get_repos)) -> PolicyOut:
+    item = await repos["policies"].update(policy_id, payload) if repos else await store.update(policy_id, payload)
     if not item:
         raise HTTPException(status_code=404, detail="Policy not found")
     return item
 
 @router.delete("/{policy_id}", dependencies=[Depends(require_roles([Role.ADMIN]))])
-def delete_policy(policy_id: int, user=Depends(get_current_user)):
-    ok = repos["policies"].delete(policy_id) if repos else store.delete(policy_id)
+async def delete_policy(policy_id: int, user=Depends(get_current_user), repos=Depends(get_repos)):
+    ok = await repos["policies"].delete(policy_id) if repos else await store.delete(policy_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Policy not found")
     return {"ok": True}
 
 @router.post("/{policy_id}/upload")
-def upload_policy_file(policy_id: int, file: UploadFile = File(...), user=Depends(get_current_user)) -> PolicyOut:
-    item = (repos["policies"].get(policy_id) if repos else store.get(policy_id))
-    if not item:
-        raise HTTPException(status_code=404, detail="Policy not found")
-    if repos:
-        client = get_client()
-        bucket = os.getenv("SUPABASE_STORAGE_BUCKET", "policy_files")
-        path = f"policy_{policy_id}_{file.filename}"
-        content = file.file.read()
-        client.storage.from_(bucket).upload(path, content)
-        public_url = client.storage.from_(bucket).get_public_url(path)
-        updated = repos["policies"].update(policy_id, PolicyUpdate(file_url=public_url))
-        return updated
-    uploads_dir = os.path.join(os.getcwd(), 'uploads')
-    os.makedirs(uploads_dir, exist_ok=True)
-    file_path = os.path.join(uploads_dir, f"policy_{policy_id}_{file.filename}")
-    with open(file_path, 'wb') as f:
-        f.write(file.file.read())
-    updated = store.update(policy_id, PolicyUpdate(file_url=f"/uploads/{os.path.basename(file_path)}"))
-    return updated
\ No newline at end of file
+async def upload_policy_file(policy_id: int, file: UploadFile = File(...), user=Depends(get_current_user), repos=Depends(get_repos), registry: Registry = Depends(get_registry)) -> PolicyOut:
+    await _get_policy(policy_id, repos)
+    staged = await stage(read_chunks(file))
+    return await _attach(policy_id, _blobs(repos, registry), staged, file.content_type, repos)
+
+@router.post("/{policy_id}/uploads")
+async def create_upload(policy_id: int, payload: UploadSessionCreate, user=Depends(get_current_user), repos=Depends(get_repos), registry: Registry = Depends(get_registry)) -> UploadSession:
+    await _get_policy(policy_id, repos)
+    blobs = _blobs(repos, registry)
+    if payload.sha256 and await run_in_threadpool(blobs.exists, payload.sha256):
+        change = PolicyUpdate(file_url=blobs.url(payload.sha256))
+        item = await repos["policies"].update(policy_id, change) if repos else await store.update(policy_id, change)
+        return UploadSession(policy_id=policy_id, offset=payload.size, policy=item, **payload.model_dump())
+    info = await run_in_threadpool(sessions.create, policy_id, payload.filename, payload.size, payload.content_type, payload.sha256)
+    return UploadSession(**info)
+
+@router.get("/{policy_id}/uploads/{upload_id}")
+async def get_upload(policy_id: int, upload_id: str, user=Depends(get_current_user)) -> UploadSession:
+    return UploadSession(**await run_in_threadpool(sessions.get, policy_id, upload_id))
+
+@router.put("/{policy_id}/uploads/{upload_id}")
+async def put_upload_range(policy_id: int, upload_id: str, request: Request, content_range: Optional[str] = Header(None), user=Depends(get_current_user), repos=Depends(get_repos), registry: Registry = Depends(get_registry)) -> UploadSession:
+    info = await run_in_threadpool(sessions.get, policy_id, upload_id)
+    info = await sessions.append(info, content_range, coalesce(request.stream()))
+    if info["offset"] < info["size"]:
+        return UploadSession(**info)
+    staged = await sessions.finish(info)
+    if info["sha256"] and staged.digest != info["sha256"]:
+        sessions.discard(upload_id)
+        raise HTTPException(status_code=422, detail="Uploaded content does not match sha256")
+    item = await _attach(policy_id, _blobs(repos, registry), staged, info["content_type"], repos)
+    return UploadSession(**{**info, "sha256": staged.digest}, policy=item)
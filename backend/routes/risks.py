@@ -1,48 +1,93 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, UploadFile, File
 from utils.auth import get_current_user
 from utils.rbac import require_roles, Role
-from utils.demo_store import RisksStore
-from utils.db import get_repos
-from schemas.risk import RiskCreate, RiskUpdate, RiskOut
-from schemas.common import PaginatedResponse
+from utils.ratelimit import rate_limit
+from utils.demo_store import local_store
+from utils.registry import get_repos
+from utils.pagination import decode_cursor, page_json
+from utils.versions import ConditionalRoute, collection_etag, record_etag
+from utils.bulk import bulk_body, check_size, missing, validate_items
+from utils.export import export_response
+from utils.imports import import_csv
+from schemas.risk import RiskCreate, RiskUpdate, RiskBulkUpdate, RiskOut, RiskHeatmap, RiskStats
+from schemas.common import PaginatedResponse, BulkError, BulkResponse, BulkDeleteRequest, BulkDeleteResponse, ImportReport
 
-router = APIRouter(prefix="/risks", tags=["risks"])
-store = RisksStore()
-repos = get_repos()
+router = APIRouter(prefix="/risks", tags=["risks"], route_class=ConditionalRoute)
+store = local_store("risks")
 
-@router.get("/")
-def list_risks(q: Optional[str] = None, skip: int = 0, limit: int = 20, user=Depends(get_current_user)) -> PaginatedResponse[RiskOut]:
+@router.get("/", dependencies=[Depends(collection_etag("risks"))])
+async def list_risks(response: Response, q: Optional[str] = None, skip: int = 0, limit: int = 20, cursor: Optional[str] = None, user=Depends(get_current_user), repos=Depends(get_repos)) -> PaginatedResponse[RiskOut]:
+    after = decode_cursor(cursor)
     if repos:
-        items = repos["risks"].list(q=q, skip=skip, limit=limit)
-        total = repos["risks"].count()
-        return PaginatedResponse(items=items, total=total)
-    items = store.list(q=q, skip=skip, limit=limit)
-    return PaginatedResponse(items=items, total=store.count())
+        page = await repos["risks"].page(q=q, skip=skip, limit=limit, after=after)
+    else:
+        page = await store.page(q=q, skip=skip, limit=limit, after=after)
+    return page_json(page, response)
 
 @router.post("/", dependencies=[Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER]))])
-def create_risk(payload: RiskCreate, user=Depends(get_current_user)) -> RiskOut:
+async def create_risk(payload: RiskCreate, user=Depends(get_current_user), repos=Depends(get_repos)) -> RiskOut:
     if repos:
-        return repos["risks"].create(payload)
-    return store.create(payload)
+        return await repos["risks"].create(payload)
+    return await store.create(payload)
 
-@router.get("/{risk_id}")
-def get_risk(risk_id: int, user=Depends(get_current_user)) -> RiskOut:
-    item = repos["risks"].get(risk_id) if repos else store.get(risk_id)
+@router.post("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER]))], openapi_extra=bulk_body(RiskCreate))
+async def bulk_create_risks(payload: List[Any] = Body(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkResponse[RiskOut]:
+    valid, errors = validate_items(RiskCreate, payload)
+    creates = [item for _, item in valid]
+    items = await repos["risks"].create_many(creates) if repos else await store.create_many(creates)
+    return BulkResponse(items=items, errors=errors)
+
+@router.put("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER]))], openapi_extra=bulk_body(RiskBulkUpdate))
+async def bulk_update_risks(payload: List[Any] = Body(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkResponse[RiskOut]:
+    valid, errors = validate_items(RiskBulkUpdate, payload)
+    updates = [item for _, item in valid]
+    updated = await repos["risks"].update_many(updates) if repos else await store.update_many(updates)
+    errors += missing(valid, updated, "Risk not found")
+    return BulkResponse(items=list(updated.values()), errors=sorted(errors, key=lambda e: e.index))
+
+@router.delete("/bulk", dependencies=[Depends(rate_limit("bulk")), Depends(require_roles([Role.ADMIN]))])
+async def bulk_delete_risks(payload: BulkDeleteRequest, user=Depends(get_current_user), repos=Depends(get_repos)) -> BulkDeleteResponse:
+    check_size(payload.ids)
+    deleted = await repos["risks"].delete_many(payload.ids) if repos else await store.delete_many(payload.ids)
+    found = set(deleted)
+    errors = [BulkError(index=i, id=item_id, detail="Risk not found") for i, item_id in enumerate(payload.ids) if item_id not in found]
+    return BulkDeleteResponse(deleted=deleted, errors=errors)
+
+@router.post("/import", dependencies=[Depends(rate_limit("import")), Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER]))])
+async def import_risks(file: UploadFile = File(...), user=Depends(get_current_user), repos=Depends(get_repos)) -> ImportReport:
+    return await import_csv(file.file, RiskCreate, repos["risks"].create_many if repos else store.create_many)
+
+@router.get("/export", dependencies=[Depends(rate_limit("export"))])
+async def export_risks(format: Literal["csv", "ndjson"] = "csv", user=Depends(get_current_user), repos=Depends(get_repos)):
+    list_fn = repos["risks"].list if repos else store.list
+    return export_response(list_fn, RiskOut, format, "risks")
+
+@router.get("/heatmap", dependencies=[Depends(collection_etag("risks"))])
+async def risk_heatmap(user=Depends(get_current_user), repos=Depends(get_repos)) -> RiskHeatmap:
+    return await repos["risks"].heatmap() if repos else await store.heatmap()
+
+@router.get("/stats", dependencies=[Depends(collection_etag("risks"))])
+async def risk_stats(top: int = Query(10, ge=0, le=100), user=Depends(get_current_user), repos=Depends(get_repos)) -> RiskStats:
+    return await repos["risks"].stats(top) if repos else await store.stats(top)
+
+@router.get("/{risk_id}", dependencies=[Depends(record_etag("risks", "risk_id"))])
+async def get_risk(risk_id: int, user=Depends(get_current_user), repos=Depends(get_repos)) -> RiskOut:
+    item = await repos["risks"].get(risk_id) if repos else await store.get(risk_id)
     if not item:
         raise HTTPException(status_code=404, detail="Risk not found")
     return item
 
 @router.put("/{risk_id}", dependencies=[Depends(require_roles([Role.ADMIN, Role.RISK_MANAGER]))])
-def update_risk(risk_id: int, payload: RiskUpdate, user=Depends(get_current_user)) -> RiskOut:
-    item = repos["risks"].update(risk_id, payload) if repos else store.update(risk_id, payload)
+async def update_risk(risk_id: int, payload: RiskUpdate, user=Depends(get_current_user), repos=Depends(get_repos)) -> RiskOut:
+    item = await repos["risks"].update(risk_id, payload) if repos else await store.update(risk_id, payload)
     if not item:
         raise HTTPException(status_code=404, detail="Risk not found")
     return item
 
 @router.delete("/{risk_id}", dependencies=[Depends(require_roles([Role.ADMIN]))])
-def delete_risk(risk_id: int, user=Depends(get_current_user)):
-    ok = repos["risks"].delete(risk_id) if repos else store.delete(risk_id)
+async def delete_risk(risk_id: int, user=Depends(get_current_user), repos=Depends(get_repos)):
+    ok = await repos["risks"].delete(risk_id) if repos else await store.delete(risk_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Risk not found")
     return {"ok": True}
\ No newline at end of file
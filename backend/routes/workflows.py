@@ -1,29 +1,61 @@
-from typing import List
+import os
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from utils.auth import get_current_user
 from utils.rbac import require_roles, Role
+from utils.ratelimit import rate_limit
 from utils.demo_store import WorkflowsStore
-from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowTransition, WorkflowStatus
+from utils.pagination import decode_cursor, page_json
+from utils.bulk import check_size
+from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowTransition, WorkflowStatus, WorkflowBatchTransition, WorkflowStageQueue
+from schemas.common import BulkResponse, PaginatedResponse
 
 router = APIRouter(prefix="/workflows", tags=["workflows"])
-store = WorkflowsStore()
+# WORKFLOW_JOURNAL_DIR makes workflow state durable; unset, it lives in memory
+store = WorkflowsStore(os.getenv("WORKFLOW_JOURNAL_DIR") or None)
 
 @router.get("/config")
-def get_config(user=Depends(get_current_user)) -> WorkflowConfig:
+async def get_config(user=Depends(get_current_user)) -> WorkflowConfig:
     return store.get_config()
 
 @router.post("/config", dependencies=[Depends(require_roles([Role.ADMIN]))])
-def set_config(config: WorkflowConfig, user=Depends(get_current_user)) -> WorkflowConfig:
+async def set_config(config: WorkflowConfig, user=Depends(get_current_user)) -> WorkflowConfig:
     store.set_config(config)
+    await store.commit()
     return store.get_config()
 
 @router.post("/requests")
-def create_request(req: WorkflowRequest, user=Depends(get_current_user)) -> WorkflowStatus:
-    return store.create_request(req)
+async def create_request(req: WorkflowRequest, user=Depends(get_current_user)) -> WorkflowStatus:
+    status = store.create_request(req)
+    await store.commit()
+    return status
+
+@router.get("/requests/{request_id}")
+async def get_request(request_id: str, user=Depends(get_current_user)) -> WorkflowStatus:
+    status = store.get_request(request_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return status
+
+@router.get("/stages")
+async def list_stages(user=Depends(get_current_user)) -> List[WorkflowStageQueue]:
+    return store.stages()
+
+@router.get("/stages/{stage}/queue")
+async def stage_queue(stage: str, limit: int = 20, cursor: Optional[str] = None, user=Depends(get_current_user)) -> PaginatedResponse[WorkflowStatus]:
+    return page_json(store.queue(stage, limit=limit, after=decode_cursor(cursor)))
 
 @router.post("/transition")
-def transition(tr: WorkflowTransition, user=Depends(get_current_user)) -> WorkflowStatus:
+async def transition(tr: WorkflowTransition, user=Depends(get_current_user)) -> WorkflowStatus:
     status = store.transition(tr)
     if not status:
         raise HTTPException(status_code=400, detail="Invalid transition")
-    return status
\ No newline at end of file
+    await store.commit()
+    return status
+
+@router.post("/transition/batch", dependencies=[Depends(rate_limit("bulk"))])
+async def transition_batch(payload: WorkflowBatchTransition, user=Depends(get_current_user)) -> BulkResponse[WorkflowStatus]:
+    check_size(payload.request_ids)
+    items, errors = store.transition_many(payload.action, payload.request_ids, payload.stage)
+    await store.commit()
+    return BulkResponse(items=items, errors=errors)
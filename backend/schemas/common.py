@@ -1,8 +1,63 @@
-from typing import Generic, List, TypeVar
+from typing import Any, Generic, List, Optional, TypeVar
 from pydantic import BaseModel
 
 T = TypeVar("T")
 
 class PaginatedResponse(BaseModel, Generic[T]):
     items: List[T]
-    total: int
\ No newline at end of file
+    total: int
+    next_cursor: Optional[str] = None
+
+class BulkError(BaseModel):
+    index: int
+    id: Optional[int] = None
+    detail: Any
+
+class BulkResponse(BaseModel, Generic[T]):
+    items: List[T]
+    errors: List[BulkError] = []
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[int]
+    errors: List[BulkError] = []
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: Any
+
+class ImportProgress(BaseModel):
+    chunk: int
+    rows: int
+    imported: int
+
+class ImportReport(BaseModel):
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    progress: List[ImportProgress] = []
+    errors: List[ImportRowError] = []
+    errors_truncated: bool = False
+
+class CacheStats(BaseModel):
+    collection: str
+    size: int
+    max_entries: int
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    expirations: int
+    hit_ratio: float
+
+class ProfileInfo(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: int
+    created: float
+    duration_ms: float
+    interval_ms: float
+    samples: int
@@ -20,4 +20,27 @@ class FrameworkOut(FrameworkBase):
 
 class ControlMapRequest(BaseModel):
     framework_id: int
-    control_to_policy: Dict[str, List[int]]
\ No newline at end of file
+    control_to_policy: Dict[str, List[int]]
+
+class FrameworkCoverage(BaseModel):
+    framework_id: int
+    name: str
+    controls: int
+    covered: int
+    percent: float
+
+class UnmappedControls(BaseModel):
+    framework_id: int
+    controls: List[str]
+
+class FrameworkControls(BaseModel):
+    framework_id: int
+    name: str
+    controls: List[str]
+
+class PolicyBlastRadius(BaseModel):
+    # every (framework, control) a policy is mapped to
+    policy_id: int
+    frameworks: int
+    controls: int
+    mappings: List[FrameworkControls]
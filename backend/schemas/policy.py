@@ -18,5 +18,26 @@ class PolicyUpdate(BaseModel):
     reviewers: Optional[List[str]] = None
     file_url: Optional[str] = None
 
+class PolicyBulkUpdate(PolicyUpdate):
+    id: int
+
 class PolicyOut(PolicyBase):
-    id: int
\ No newline at end of file
+    id: int
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1)
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    # when the content is already stored the upload completes without sending any bytes
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-f]{64}$")
+
+class UploadSession(BaseModel):
+    upload_id: Optional[str] = None
+    policy_id: int
+    filename: str
+    size: int
+    offset: int
+    content_type: Optional[str] = None
+    sha256: Optional[str] = None
+    # set once the last range is stored and the policy points at the file
+    policy: Optional[PolicyOut] = None
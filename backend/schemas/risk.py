@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class RiskBase(BaseModel):
@@ -20,6 +20,21 @@ class RiskUpdate(BaseModel):
     mitigation: Optional[str] = None
     owner: Optional[str] = None
 
+class RiskBulkUpdate(RiskUpdate):
+    id: int
+
 class RiskOut(RiskBase):
     id: int
-    score: int
\ No newline at end of file
+    score: int
+
+class RiskHeatmap(BaseModel):
+    # cells[impact - 1][likelihood - 1] is the number of risks in that cell
+    cells: List[List[int]]
+    total: int
+
+class RiskStats(BaseModel):
+    total: int
+    average_score: float
+    max_score: int
+    levels: Dict[str, int]
+    top: List[RiskOut]
@@ -1,8 +1,8 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class WorkflowConfig(BaseModel):
-    role_order: List[str] = ["L1", "L2", "L3"]
+    role_order: List[str] = Field(["L1", "L2", "L3"], min_length=1)
 
 class WorkflowRequest(BaseModel):
     request_id: str
@@ -16,4 +16,15 @@ class WorkflowTransition(BaseModel):
 class WorkflowStatus(BaseModel):
     request_id: str
     status: str  # Pending, Approved, Rejected
-    stage: Optional[str] = None
\ No newline at end of file
+    stage: Optional[str] = None
+    title: Optional[str] = None
+
+class WorkflowBatchTransition(BaseModel):
+    action: str  # approve or reject
+    request_ids: List[str]
+    # when given, only requests still pending at this stage are moved
+    stage: Optional[str] = None
+
+class WorkflowStageQueue(BaseModel):
+    stage: str
+    pending: int
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+# the suite makes hundreds of requests as one demo user; test_ratelimit sets its own limits
+os.environ.setdefault("RATE_LIMITS", "")
+os.environ.setdefault("RATE_LIMIT_PATH", "")
+# the stub keeps the versions table the README's triggers maintain
+os.environ.setdefault("VERSIONS_TABLE", "versions")
+import httpx
+import pytest
+from supabase import create_client
+from main import app
+from utils.async_db import HttpPool, get_async_repos
+from utils.registry import get_repos
+from utils.versions import versions
+from postgrest_stub import FAKE_KEY, PostgrestStub, serve
+
+@pytest.fixture(autouse=True)
+def version_source():
+    # building repositories points ETags at their database; don't leak that into later tests
+    source = versions.source
+    yield
+    versions.use(source)
+
+@pytest.fixture
+def postgrest():
+    stub = PostgrestStub()
+    with serve(stub) as url:
+        stub.url = url
+        yield stub
+
+@pytest.fixture
+def supabase_client(postgrest):
+    return create_client(postgrest.url, FAKE_KEY)
+
+# Async tests (`@pytest.mark.anyio`) get the repositories on a pool opened against the stub,
+# and `api` serves the app's routes from them over ASGI.
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def pool(postgrest):
+    pool = HttpPool(postgrest.url, FAKE_KEY, size=20)
+    await pool.open()
+    yield pool
+    await pool.close()
+
+@pytest.fixture
+def repos(pool):
+    return get_async_repos(pool)
+
+@pytest.fixture
+async def api(repos):
+    app.dependency_overrides[get_repos] = lambda: repos
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test/api/v1") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
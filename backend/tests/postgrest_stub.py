@@ -0,0 +1,340 @@
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# In-memory stand-in for the subset of PostgREST (and Supabase storage) that utils/db.py speaks. Every
+# request is recorded so tests can assert on round trips.
+
+FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.c3R1Yg"
+RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+def _coerce(value: str, sample: Any) -> Any:
+    if isinstance(sample, bool):
+        return value == "true"
+    if isinstance(sample, int):
+        return int(value)
+    if isinstance(sample, float):
+        return float(value)
+    return value
+
+def _like(pattern: str, flags: int = 0):
+    parts = [".*" if c in "%*" else "." if c == "_" else re.escape(c) for c in pattern]
+    return re.compile("".join(parts), flags | re.DOTALL)
+
+def _matches(row: Dict[str, Any], column: str, expr: str) -> bool:
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, arg = expr.partition(".")
+    value = row.get(column)
+    if op == "is":
+        result = value is None if arg == "null" else value == (arg == "true")
+    elif op in ("like", "ilike"):
+        result = value is not None and _like(arg, re.IGNORECASE if op == "ilike" else 0).fullmatch(str(value)) is not None
+    elif op == "in":
+        options = [o.strip('"') for o in arg.strip("()").split(",") if o]
+        result = value is not None and value in [_coerce(o, value) for o in options]
+    elif value is None:
+        result = False
+    else:
+        other = _coerce(arg, value)
+        result = {
+            "eq": value == other, "neq": value != other,
+            "gt": value > other, "gte": value >= other,
+            "lt": value < other, "lte": value <= other,
+        }[op]
+    return result != negate
+
+# generated columns, as declared in the README (`generated always as (...) stored`)
+GENERATED = {
+    "risks": {"score": lambda r: r["impact"] * r["likelihood"]},
+    "frameworks": {"control_count": lambda r: len(r.get("controls") or [])},
+}
+
+# foreign keys PostgREST can embed through, e.g. select=framework_id,frameworks(name)
+FOREIGN_KEYS = {"control_mappings": {"frameworks": "framework_id"}}
+
+def _covered(tables, framework: Dict[str, Any]) -> int:
+    controls = set(framework.get("controls") or [])
+    return len({m["control"] for m in tables["control_mappings"].values() if m["framework_id"] == framework["id"] and m["control"] in controls})
+
+# `before insert or update of <columns>` triggers, as declared in the README
+def _recount_covered(tables, row: Dict[str, Any]):
+    row["covered"] = _covered(tables, row)
+
+TRIGGERS = {"frameworks": ({"controls"}, _recount_covered)}
+
+# the README's row-level bump_version trigger: every write to these tables moves the table's
+# version and the written row's in `versions`
+VERSIONED = {"policies", "risks", "frameworks"}
+
+def _bump_versions(tables, table: str, ids):
+    if table not in VERSIONED:
+        return
+    rows, now = tables["versions"], time.time()
+    version = rows.get(table, {"version": 0})["version"]
+    for record_id in ids:
+        version += 1
+        rows[table] = {"key": table, "version": version, "modified": now}
+        rows[f"{table}:{record_id}"] = {"key": f"{table}:{record_id}", "version": version, "modified": now}
+
+# read-only views, mirroring the SQL in the README
+def _risk_heatmap(tables) -> List[Dict[str, Any]]:
+    counts = Counter((r["impact"], r["likelihood"]) for r in tables["risks"].values())
+    return [{"impact": i, "likelihood": l, "count": c} for (i, l), c in sorted(counts.items())]
+
+def _risk_stats(tables) -> List[Dict[str, Any]]:
+    scores = [r["score"] for r in tables["risks"].values()]
+    return [{
+        "total": len(scores),
+        "average_score": sum(scores) / len(scores) if scores else None,
+        "max_score": max(scores, default=None),
+        "low": sum(s < 10 for s in scores),
+        "medium": sum(10 <= s < 20 for s in scores),
+        "high": sum(s >= 20 for s in scores),
+    }]
+
+def _unmapped_controls(tables) -> List[Dict[str, Any]]:
+    mapped = {(m["framework_id"], m["control"]) for m in tables["control_mappings"].values()}
+    return [{"framework_id": f["id"], "control": control, "position": position}
+            for f in tables["frameworks"].values()
+            for position, control in enumerate(f.get("controls") or [], 1) if (f["id"], control) not in mapped]
+
+VIEWS = {"risk_heatmap": _risk_heatmap, "risk_stats": _risk_stats, "unmapped_controls": _unmapped_controls}
+
+# database functions, mirroring the SQL in the README
+def _merge_control_mappings(tables, framework_id: int, mapping: Dict[str, Any]):
+    framework = tables["frameworks"].get(framework_id)
+    if framework is None:
+        return None
+    rows = tables["control_mappings"]
+    for key in [k for k, m in rows.items() if m["framework_id"] == framework_id and m["control"] in mapping]:
+        del rows[key]
+    for control, policy_ids in mapping.items():
+        for policy_id in policy_ids:
+            rows[(framework_id, control, int(policy_id))] = {"framework_id": framework_id, "control": control, "policy_id": int(policy_id)}
+    framework["control_mappings"] = {**(framework.get("control_mappings") or {}), **mapping}
+    framework["covered"] = _covered(tables, framework)
+    _bump_versions(tables, "frameworks", [framework_id])
+    return True
+
+def _bulk_update(table: str):
+    # update ... from jsonb_array_elements(changes): only the columns present in each change are written
+    def update(tables, changes: List[Dict[str, Any]]):
+        rows = []
+        for change in changes:
+            row = tables[table].get(change["id"])
+            if row is not None:
+                row.update(change)
+                for column, expr in GENERATED.get(table, {}).items():
+                    row[column] = expr(row)
+                rows.append(dict(row))
+        _bump_versions(tables, table, [row["id"] for row in rows])
+        return rows
+    return update
+
+RPCS = {
+    "merge_control_mappings": _merge_control_mappings,
+    "bulk_update_policies": _bulk_update("policies"), "bulk_update_risks": _bulk_update("risks"),
+}
+
+class PostgrestStub:
+    def __init__(self):
+        self.tables: Dict[str, Dict[int, Dict[str, Any]]] = defaultdict(dict)
+        self.seq: Dict[str, int] = defaultdict(int)
+        self.objects: Dict[str, bytes] = {}
+        self.requests: List[str] = []
+        self.rpc_calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.latency = 0.0
+        self._lock = threading.Lock()
+        self.app = Starlette(routes=[
+            Route("/rest/v1/rpc/{fn}", self.handle_rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self.handle, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+            Route("/storage/v1/object/list/{bucket}", self.list_objects, methods=["POST"]),
+            Route("/storage/v1/object/{key:path}", self.handle_object, methods=["POST", "PUT"]),
+        ])
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]):
+        with self._lock:
+            for row in rows:
+                self._insert(table, dict(row))
+
+    def reset_requests(self):
+        self.requests.clear()
+        self.rpc_calls.clear()
+
+    def _generate(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        for column, expr in GENERATED.get(table, {}).items():
+            row[column] = expr(row)
+        return row
+
+    def _insert(self, table: str, row: Dict[str, Any], upsert_on: str = "") -> Dict[str, Any]:
+        rows = self.tables[table]
+        if upsert_on:
+            for existing in rows.values():
+                if all(existing.get(c) == row.get(c) for c in upsert_on.split(",")):
+                    existing.update(row)
+                    _bump_versions(self.tables, table, [existing["id"]])
+                    return self._generate(table, existing)
+        self._generate(table, row)
+        if row.get("id") is None:
+            self.seq[table] += 1
+            row["id"] = self.seq[table]
+        else:
+            self.seq[table] = max(self.seq[table], row["id"])
+        self._trigger(table, row, row.keys())
+        rows[row["id"]] = row
+        _bump_versions(self.tables, table, [row["id"]])
+        return row
+
+    def _trigger(self, table: str, row: Dict[str, Any], written):
+        if table in TRIGGERS:
+            columns, trigger = TRIGGERS[table]
+            if columns & set(written):
+                trigger(self.tables, row)
+
+    def _filter(self, table: str, params) -> List[Dict[str, Any]]:
+        filters = [(k, v) for k, v in params.multi_items() if k not in RESERVED]
+        rows = VIEWS[table](self.tables) if table in VIEWS else self.tables[table].values()
+        return [r for r in rows if all(_matches(r, k, v) for k, v in filters)]
+
+    @staticmethod
+    def _order(rows: List[Dict[str, Any]], order: str) -> List[Dict[str, Any]]:
+        for term in reversed(order.split(",")):
+            column, *mods = term.split(".")
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse="desc" in mods)
+            rows = present + missing
+        return rows
+
+    def _project(self, table: str, rows: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+        if not select or select == "*":
+            return [dict(r) for r in rows]
+        projected = [{} for _ in rows]
+        for term in re.findall(r"[^,(]+(?:\([^)]*\))?", select):
+            alias, _, column = term.strip().rpartition(":")
+            embed = re.fullmatch(r"(\w+)\((.*)\)", column)
+            for out, row in zip(projected, rows):
+                if embed:
+                    parent = self.tables[embed[1]].get(row[FOREIGN_KEYS[table][embed[1]]])
+                    out[alias or embed[1]] = {c: parent.get(c) for c in embed[2].split(",")} if parent else None
+                else:
+                    out[alias or column] = row.get(column)
+        return projected
+
+    async def handle(self, request: Request) -> Response:
+        table = request.path_params["table"]
+        params = request.query_params
+        prefer = request.headers.get("prefer", "")
+        body = await request.body()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.method in ("POST", "PATCH"):
+            payload = json.loads(body or b"[]")
+            written = set().union(*[r.keys() for r in (payload if isinstance(payload, list) else [payload])])
+            generated = written & set(GENERATED.get(table, {}))
+            if generated:
+                self.requests.append(f"{request.method} {table}?{params}")
+                column = sorted(generated)[0]
+                return JSONResponse({"code": "428C9", "message": f'cannot insert a non-DEFAULT value into column "{column}"',
+                                     "details": f'Column "{column}" is a generated column.', "hint": None}, status_code=400)
+        with self._lock:
+            self.requests.append(f"{request.method} {table}?{params}")
+            if request.method in ("GET", "HEAD"):
+                rows = self._filter(table, params)
+                if "order" in params:
+                    rows = self._order(rows, params["order"])
+                total = len(rows)
+                offset = int(params.get("offset", 0))
+                rows = rows[offset:offset + int(params["limit"])] if "limit" in params else rows[offset:]
+                rows = self._project(table, rows, params.get("select", "*"))
+            elif request.method == "POST":
+                upsert_on = params.get("on_conflict", "id") if "merge-duplicates" in prefer else ""
+                rows = [dict(self._insert(table, dict(r), upsert_on)) for r in (payload if isinstance(payload, list) else [payload])]
+                total = len(rows)
+            elif request.method == "PATCH":
+                rows = self._filter(table, params)
+                for row in rows:
+                    row.update(payload)
+                    self._generate(table, row)
+                    self._trigger(table, row, payload.keys())
+                _bump_versions(self.tables, table, [r["id"] for r in rows])
+                rows = [dict(r) for r in rows]
+                total = len(rows)
+            else:
+                rows = self._filter(table, params)
+                for row in rows:
+                    del self.tables[table][row["id"]]
+                _bump_versions(self.tables, table, [r["id"] for r in rows])
+                total = len(rows)
+        headers = {}
+        if request.method in ("GET", "HEAD"):
+            count = str(total) if "count=" in prefer else "*"
+            span = f"{offset}-{offset + len(rows) - 1}" if rows else "*"
+            headers["content-range"] = f"{span}/{count}"
+        if request.headers.get("accept") == "application/vnd.pgrst.object+json":
+            if len(rows) != 1:
+                return JSONResponse({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                                     "details": f"The result contains {len(rows)} rows", "hint": None}, status_code=406)
+            return JSONResponse(rows[0], headers=headers)
+        if request.method in ("POST", "PATCH", "DELETE") and "return=representation" not in prefer:
+            return Response(status_code=204)
+        status_code = 201 if request.method == "POST" else 200
+        return JSONResponse(rows, status_code=status_code, headers=headers)
+
+    async def handle_rpc(self, request: Request) -> Response:
+        fn = request.path_params["fn"]
+        args = json.loads(await request.body() or b"{}")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with self._lock:
+            self.requests.append(f"POST rpc/{fn}")
+            self.rpc_calls.append((fn, args))
+            result = RPCS[fn](self.tables, **args)
+        return JSONResponse(result)
+
+    async def handle_object(self, request: Request) -> Response:
+        key = request.path_params["key"]
+        form = await request.form()
+        content = await form["file"].read()
+        with self._lock:
+            self.requests.append(f"{request.method} storage/{key}")
+            self.objects[key] = content
+        return JSONResponse({"Key": key})
+
+    async def list_objects(self, request: Request) -> Response:
+        bucket = request.path_params["bucket"]
+        body = await request.json()
+        prefix = f"{bucket}/{body.get('prefix', '')}".rstrip("/") + "/"
+        with self._lock:
+            self.requests.append(f"POST storage/list/{bucket}")
+            names = [k[len(prefix):] for k in sorted(self.objects) if k.startswith(prefix)]
+        names = [n for n in names if "/" not in n and body.get("search", "") in n]
+        return JSONResponse([{"name": n} for n in names[:body.get("limit", 100)]])
+
+@contextmanager
+def serve(stub: PostgrestStub):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(stub.app, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join()
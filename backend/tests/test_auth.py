@@ -1,5 +1,8 @@
+import time
 from fastapi.testclient import TestClient
+from jose import jwt
 from main import app
+from utils import auth
 
 client = TestClient(app)
 
@@ -14,4 +17,20 @@ def test_demo_login_and_me():
     token = res.json()["access_token"]
     res2 = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
     assert res2.status_code == 200
-    assert res2.json()["role"] == "admin"
\ No newline at end of file
+    assert res2.json()["role"] == "admin"
+
+def test_jwt_users_cached_until_secret_changes():
+    previous = auth.get_settings()
+    auth.configure(auth.AuthSettings(jwt_secret="first-secret", default_role="auditor"))
+    try:
+        token = jwt.encode({"sub": "a@example.com", "exp": int(time.time()) + 60}, "first-secret", algorithm="HS256")
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.get("/api/v1/auth/me", headers=headers).json()["role"] == "auditor"
+        assert auth.token_cache.get(token) is not None
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+        auth.configure(auth.AuthSettings(jwt_secret="second-secret"))
+        assert auth.token_cache.get(token) is None
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 401
+    finally:
+        auth.configure(previous)
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from schemas.policy import PolicyCreate, PolicyUpdate
+from utils.cache import ReadCache, with_caches
+
+@pytest.mark.anyio
+async def test_read_through_cache_over_repositories(postgrest, repos):
+    postgrest.seed("policies", [{"title": f"Policy {i}", "status": "Draft"} for i in range(10)])
+    postgrest.seed("frameworks", [{"name": "ISO 27001", "controls": ["A.5.1"], "control_mappings": {}}])
+    postgrest.latency = 0.05
+    repos, caches = with_caches(repos)
+    policies = repos["policies"]
+    # a stampede of misses on one key costs one fetch
+    items = await asyncio.gather(*[policies.get(1) for _ in range(100)])
+    assert {item.title for item in items} == {"Policy 0"}
+    assert policies.round_trips == 1
+    await policies.get(1)
+    assert policies.round_trips == 1
+    stats = caches["policies"].stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 99, 1)
+
+    # misses are cached too, until a create could have filled them
+    assert await policies.get(11) is None and await policies.get(11) is None
+    assert policies.round_trips == 2
+    created = await policies.create(PolicyCreate(title="New"))
+    assert created.id == 11
+    assert (await policies.get(11)).title == "New"
+
+    # a write drops the record it touched
+    await policies.update(1, PolicyUpdate(title="Renamed"))
+    assert (await policies.get(1)).title == "Renamed"
+    # one that found nothing leaves the cache alone
+    assert await policies.get(99) is None
+    trips = policies.round_trips
+    assert await policies.update(99, PolicyUpdate(title="Nobody")) is None
+    assert not await policies.delete_many([99])
+    assert await policies.get(99) is None
+    assert policies.round_trips == trips + 2
+
+    frameworks = repos["compliance"]
+    assert (await frameworks.get_framework(1)).control_mappings == {}
+    await frameworks.map_controls(1, {"A.5.1": [1]})
+    assert (await frameworks.get_framework(1)).control_mappings == {"A.5.1": [1]}
+
+def test_lru_and_ttl_bounds():
+    now = [0.0]
+    cache = ReadCache("test-bounds", ttl=10, negative_ttl=1, max_entries=2, clock=lambda: now[0])
+    fetches = []
+
+    async def load(key):
+        fetches.append(key)
+        return None if key == "missing" else key
+
+    async def get(key):
+        return await cache.get(key, lambda: load(key))
+
+    async def scenario():
+        for key in ("a", "b", "a", "c"):
+            await get(key)
+        # "b" was least recently used when "c" came in
+        assert fetches == ["a", "b", "c"]
+        await get("b")
+        assert cache.stats()["evictions"] == 2
+
+        await get("missing")
+        now[0] = 2
+        await get("missing")
+        assert fetches.count("missing") == 2
+        now[0] = 20
+        await get("b")
+        assert fetches[-1] == "b"
+        assert cache.stats()["expirations"] >= 1
+
+    asyncio.run(scenario())
+
+def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    cache = ReadCache("test-errors")
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        results = await asyncio.gather(*[cache.get(1, load) for _ in range(5)], return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        await asyncio.gather(cache.get(1, load), return_exceptions=True)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+def test_cache_can_be_switched_off_per_entity(monkeypatch):
+    monkeypatch.setenv("POLICIES_CACHE", "false")
+    repos = {"policies": object(), "risks": object(), "compliance": object()}
+    wrapped, caches = with_caches(repos)
+    assert wrapped["policies"] is repos["policies"]
+    assert wrapped["risks"] is not repos["risks"]
+    assert set(caches) == {"risks", "frameworks"}
@@ -0,0 +1,45 @@
+import random
+from schemas.policy import PolicyBulkUpdate, PolicyCreate, PolicyUpdate
+from schemas.risk import RiskBulkUpdate, RiskCreate, RiskUpdate
+from utils.compact_store import CompactPoliciesStore, CompactRisksStore
+from utils.demo_store import PoliciesStore, RisksStore
+from utils.pagination import decode_cursor
+
+OWNERS = ["alice@corp", "bob@corp", None]
+
+def test_compact_risks_match_the_memory_store():
+    rng = random.Random(11)
+    memory, compact = RisksStore(), CompactRisksStore()
+    payloads = [RiskCreate(title=f"Risk {i} vendor", impact=rng.randint(1, 5), likelihood=rng.randint(1, 5), owner=OWNERS[i % 3]) for i in range(300)]
+    for store in (memory, compact):
+        store.create_many(payloads)
+    for _ in range(200):
+        risk_id, impact, likelihood = rng.randint(1, 320), rng.randint(1, 5), rng.randint(1, 5)
+        action = rng.random()
+        if action < 0.5:
+            results = [store.update(risk_id, RiskUpdate(impact=impact, likelihood=likelihood, title=f"Risk {risk_id} renamed")) for store in (memory, compact)]
+        elif action < 0.7:
+            results = [store.update_many([RiskBulkUpdate(id=risk_id, impact=impact), RiskBulkUpdate(id=risk_id + 1, owner="carol@corp")]) for store in (memory, compact)]
+        else:
+            results = [store.delete(risk_id) for store in (memory, compact)]
+        assert results[0] == results[1]
+    assert compact.heatmap() == memory.heatmap()
+    assert compact.stats(15) == memory.stats(15)
+    assert compact.count() == memory.count()
+    for q in [None, "vendor", "RENAMED", "1", "zzz"]:
+        assert compact.page(q=q, skip=5, limit=30) == memory.page(q=q, skip=5, limit=30)
+    page = compact.page(limit=40)
+    assert compact.page(limit=40, after=decode_cursor(page.next_cursor)) == memory.page(limit=40, after=decode_cursor(page.next_cursor))
+    assert compact.get(999) is None and compact.update(999, RiskUpdate(impact=2)) is None
+
+def test_compact_policies_keep_lists_and_share_strings():
+    memory, compact = PoliciesStore(), CompactPoliciesStore()
+    for store in (memory, compact):
+        store.create_many([PolicyCreate(title=f"Policy {i}", status="Under Review", reviewers=["alice", "bob"]) for i in range(5)])
+        store.update(2, PolicyUpdate(reviewers=["carol"], file_url="/files/p2"))
+        store.update_many([PolicyBulkUpdate(id=3, status="Approved")])
+        store.delete_many([4, 99])
+    assert compact.list(limit=10) == memory.list(limit=10)
+    assert compact.get(2).reviewers == ["carol"] and compact.get(4) is None
+    assert compact._rows.value(5, "status") is compact._rows.value(6, "status")
+    assert compact.create(PolicyCreate(title="After delete")).id == 7
@@ -0,0 +1,35 @@
+import pytest
+from utils.async_db import AsyncPoliciesDB
+from utils.pagination import TotalCounter, decode_cursor
+
+pytestmark = pytest.mark.anyio
+
+def seed_policies(postgrest, n):
+    postgrest.seed("policies", [{"title": f"Policy {i}", "status": "Draft"} for i in range(n)])
+
+async def test_page_and_exact_total_in_one_round_trip(postgrest, pool):
+    seed_policies(postgrest, 30)
+    repo = AsyncPoliciesDB(pool, TotalCounter("exact"))
+    postgrest.reset_requests()
+    page = await repo.page(q="policy 1", skip=0, limit=5)
+    assert len(postgrest.requests) == 1
+    assert page.total == 11 and [p.title for p in page.items][:2] == ["Policy 1", "Policy 10"]
+
+async def test_cursor_pages_report_full_total(postgrest, pool):
+    seed_policies(postgrest, 12)
+    repo = AsyncPoliciesDB(pool, TotalCounter("exact"))
+    first = await repo.page(q=None, skip=0, limit=5)
+    second = await repo.page(q=None, skip=0, limit=5, after=decode_cursor(first.next_cursor))
+    assert second.total == 12
+    assert [p.id for p in second.items] == list(range(6, 11))
+
+async def test_cached_total_skips_count_until_write(postgrest, pool):
+    seed_policies(postgrest, 8)
+    repo = AsyncPoliciesDB(pool, TotalCounter("cached"))
+    postgrest.reset_requests()
+    assert (await repo.page(q=None, skip=0, limit=5)).total == 8
+    postgrest.seed("policies", [{"title": "Written elsewhere"}])
+    assert (await repo.page(q=None, skip=0, limit=5)).total == 8
+    await repo.delete(1)
+    assert (await repo.page(q=None, skip=0, limit=5)).total == 8
+    assert len(postgrest.requests) == 4
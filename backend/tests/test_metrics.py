@@ -0,0 +1,83 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from utils import metrics as metrics_module, ratelimit
+from utils.metrics import InstrumentedRepo, Metrics, metrics
+from utils.ratelimit import TokenBuckets, parse_limits
+
+client = TestClient(app)
+
+def _count(name: str, *labels: str) -> float:
+    value = metrics.collect().get((name, labels))
+    if value is None:
+        return 0
+    return sum(value[:-1]) if type(value) is list else value
+
+def test_requests_are_timed_per_route_template_and_status():
+    route = ("grc_http_request_duration_seconds", "/api/v1/risks/{risk_id}", "GET")
+    before = _count(*route, "404"), _count(*route, "200")
+    client.get("/api/v1/risks/1", headers={"Authorization": "Bearer demo-viewer"})
+    client.get("/api/v1/risks/987654", headers={"Authorization": "Bearer demo-viewer"})
+    client.get("/api/v1/risks/987655", headers={"Authorization": "Bearer demo-viewer"})
+    assert (_count(*route, "404"), _count(*route, "200")) == (before[0] + 2, before[1] + 1)
+
+    text = client.get("/metrics").text
+    assert "# TYPE grc_http_request_duration_seconds histogram" in text
+    assert 'grc_http_request_duration_seconds_bucket{route="/api/v1/risks/{risk_id}",method="GET",status="404",le="+Inf"}' in text
+    assert 'route="/api/v1/risks/987654"' not in text
+
+def test_auth_failures_and_rate_limit_rejections_are_counted(monkeypatch):
+    failures = {reason: _count("grc_auth_failures_total", reason) for reason in ("missing_token", "invalid_token", "forbidden")}
+    client.get("/api/v1/policies/")
+    client.get("/api/v1/policies/", headers={"Authorization": "Bearer demo-nobody"})
+    client.delete("/api/v1/policies/1", headers={"Authorization": "Bearer demo-viewer"})
+    assert {reason: _count("grc_auth_failures_total", reason) - n for reason, n in failures.items()} == {"missing_token": 1, "invalid_token": 1, "forbidden": 1}
+
+    monkeypatch.setattr(ratelimit, "limits", parse_limits("default=100/m,bulk=1/m"))
+    monkeypatch.setattr(ratelimit, "_buckets", TokenBuckets("", slots=64))
+    before = _count("grc_rate_limit_rejections_total", "bulk", "admin")
+    statuses = [client.post("/api/v1/policies/bulk", json=[], headers={"Authorization": "Bearer demo-admin"}).status_code for _ in range(3)]
+    assert statuses == [200, 429, 429]
+    assert _count("grc_rate_limit_rejections_total", "bulk", "admin") == before + 2
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(metrics_module, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    res = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert res.status_code == 200 and res.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+@pytest.mark.anyio
+async def test_repository_calls_and_round_trips(postgrest, repos):
+    postgrest.seed("policies", [{"title": f"Policy {i}", "status": "Draft"} for i in range(3)])
+    trips = _count("grc_db_round_trip_duration_seconds", "policies", "GET")
+    calls = _count("grc_repository_call_duration_seconds", "policies", "page")
+    policies = InstrumentedRepo("policies", repos["policies"])
+    await policies.page(q=None, skip=0, limit=2)
+    await policies.get(1)
+    assert _count("grc_repository_call_duration_seconds", "policies", "page") == calls + 1
+    assert policies.round_trips == 2
+    assert _count("grc_db_round_trip_duration_seconds", "policies", "GET") == trips + 2
+
+def test_threads_record_without_losing_updates():
+    registry = Metrics()
+    hits = registry.counter("hits_total", "Hits.", ("kind",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+    def record():
+        for i in range(20000):
+            hits.inc("a")
+            latency.observe(0.05 if i % 2 else 0.5)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    totals = registry.collect()
+    assert totals[("hits_total", ("a",))] == 160000
+    assert totals[("latency_seconds", ())][:3] == [80000, 80000, 0]
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 80000' in text and 'latency_seconds_bucket{le="+Inf"} 160000' in text
+    assert "latency_seconds_count 160000" in text and 'hits_total{kind="a"} 160000' in text
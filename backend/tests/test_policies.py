@@ -1,5 +1,12 @@
+import base64
+import json
+import os
+import time
+import httpx
+import pytest
 from fastapi.testclient import TestClient
 from main import app
+from utils.export import encode_ndjson, keyset_batches
 
 client = TestClient(app)
 
@@ -26,4 +33,143 @@ def test_create_update_delete_policy():
     assert res2.json()["status"] == "Approved"
     # delete
     res3 = client.delete(f"/api/v1/policies/{pid}", headers={"Authorization": f"Bearer {token}"})
-    assert res3.status_code == 200
\ No newline at end of file
+    assert res3.status_code == 200
+
+def test_cursor_pagination_matches_offset_pages():
+    token = get_admin_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(7):
+        client.post("/api/v1/policies/", json={"title": f"Cursor Policy {i}"}, headers=headers)
+    offset_ids = [p["id"] for p in client.get("/api/v1/policies/", params={"q": "cursor policy", "limit": 100}, headers=headers).json()["items"]]
+    seen, cursor = [], None
+    while True:
+        params = {"q": "cursor policy", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/v1/policies/", params=params, headers=headers).json()
+        seen += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == offset_ids and len(seen) >= 7
+
+def test_invalid_cursor_rejected():
+    token = get_admin_token()
+    res = client.get("/api/v1/policies/", params={"cursor": "not-a-cursor"}, headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 400
+
+def test_forged_cursor_position_rejected():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    cursor = client.get("/api/v1/policies/", params={"limit": 1}, headers=headers).json()["next_cursor"]
+    body, signature = cursor.split(".")
+    data = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    forged = base64.urlsafe_b64encode(json.dumps({**data, "pos": 10**9}).encode()).decode().rstrip("=")
+    assert client.get("/api/v1/policies/", params={"cursor": cursor}, headers=headers).status_code == 200
+    assert client.get("/api/v1/policies/", params={"cursor": f"{forged}.{signature}"}, headers=headers).status_code == 400
+
+def test_upload_is_content_addressed(tmp_path, monkeypatch):
+    import hashlib
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    first = client.post("/api/v1/policies/", json={"title": "Upload Policy A"}, headers=headers).json()["id"]
+    second = client.post("/api/v1/policies/", json={"title": "Upload Policy B"}, headers=headers).json()["id"]
+    content = b"%PDF-1.7 " * 100_000
+    digest = hashlib.sha256(content).hexdigest()
+    urls = [client.post(f"/api/v1/policies/{pid}/upload", files={"file": (f"{pid}.pdf", content, "application/pdf")}, headers=headers).json()["file_url"] for pid in (first, second)]
+    assert urls == [f"/uploads/sha256/{digest}"] * 2
+    assert os.listdir(tmp_path / "sha256") == [digest] and os.listdir(tmp_path / ".staging") == []
+
+def test_resumable_upload(tmp_path, monkeypatch):
+    import hashlib
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    pid = client.post("/api/v1/policies/", json={"title": "Resumable Policy"}, headers=headers).json()["id"]
+    content = os.urandom(300_000)
+    session = client.post(f"/api/v1/policies/{pid}/uploads", json={"filename": "big.pdf", "size": len(content)}, headers=headers).json()
+    url = f"/api/v1/policies/{pid}/uploads/{session['upload_id']}"
+
+    res = client.put(url, content=content[:100_000], headers={**headers, "Content-Range": f"bytes 0-99999/{len(content)}"})
+    assert res.json()["offset"] == 100_000 and res.json()["policy"] is None
+    # a retried or out-of-order range is refused with the offset to resume from
+    res = client.put(url, content=content[200_000:], headers={**headers, "Content-Range": f"bytes 200000-299999/{len(content)}"})
+    assert res.status_code == 409 and res.json()["detail"]["offset"] == 100_000
+    offset = client.get(url, headers=headers).json()["offset"]
+    res = client.put(url, content=content[offset:], headers={**headers, "Content-Range": f"bytes {offset}-{len(content) - 1}/{len(content)}"})
+    digest = hashlib.sha256(content).hexdigest()
+    assert res.json()["sha256"] == digest and res.json()["policy"]["file_url"] == f"/uploads/sha256/{digest}"
+    assert (tmp_path / "sha256" / digest).read_bytes() == content
+
+    # known content completes without sending any bytes
+    session = client.post(f"/api/v1/policies/{pid}/uploads", json={"filename": "copy.pdf", "size": len(content), "sha256": digest}, headers=headers).json()
+    assert session["upload_id"] is None and session["policy"]["file_url"].endswith(digest)
+
+def test_conditional_get_on_the_memory_store():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    etag = client.get("/api/v1/policies/", headers=headers).headers["etag"]
+    assert client.get("/api/v1/policies/", headers={**headers, "If-None-Match": etag}).status_code == 304
+    # the counters are this process's, so a tag from another worker (another epoch) never matches
+    epoch, version = etag[3:-1].split(".")
+    assert client.get("/api/v1/policies/", headers={**headers, "If-None-Match": f'W/"{"0" * len(epoch)}.{version}"'}).status_code == 200
+    # a write that finds nothing changes nothing
+    assert client.delete("/api/v1/policies/9999", headers=headers).status_code == 404
+    assert client.put("/api/v1/policies/9999", json={"title": "Nobody"}, headers=headers).status_code == 404
+    assert client.get("/api/v1/policies/", headers={**headers, "If-None-Match": etag}).status_code == 304
+    client.post("/api/v1/policies/", json={"title": "Memory ETag Policy"}, headers=headers)
+    assert client.get("/api/v1/policies/", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+@pytest.mark.anyio
+async def test_conditional_get_with_etags(postgrest, api):
+    postgrest.seed("policies", [{"title": "Seeded", "status": "Draft"}])
+    headers = {"Authorization": "Bearer demo-admin"}
+    etag = (await api.get("/policies/", headers=headers)).headers["etag"]
+    assert (await api.get("/policies/", headers={**headers, "If-None-Match": etag})).status_code == 304
+
+    created = (await api.post("/policies/", json={"title": "ETag Policy"}, headers=headers)).json()
+    res = await api.get("/policies/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["etag"] != etag and "last-modified" in res.headers
+
+    url = f"/policies/{created['id']}"
+    record_etag = (await api.get(url, headers=headers)).headers["etag"]
+    assert (await api.get(url, headers={**headers, "If-None-Match": record_etag})).status_code == 304
+    # a write made straight in the database (another worker, the SQL editor) is seen by the next GET
+    async with httpx.AsyncClient(base_url=f"{postgrest.url}/rest/v1") as db:
+        await db.patch("/policies", params={"id": f"eq.{created['id']}"}, json={"status": "Approved"})
+    res = await api.get(url, headers={**headers, "If-None-Match": record_etag})
+    assert res.status_code == 200 and res.json()["status"] == "Approved"
+    # unauthenticated requests never get a 304
+    assert (await api.get(url, headers={"If-None-Match": res.headers["etag"]})).status_code == 401
+
+@pytest.mark.anyio
+async def test_list_reads_its_version_alongside_the_page(postgrest, api):
+    postgrest.seed("policies", [{"title": f"Policy {i}", "status": "Draft"} for i in range(5)])
+    postgrest.latency = 0.2
+    headers = {"Authorization": "Bearer demo-admin"}
+    start = time.perf_counter()
+    res = await api.get("/policies/", headers=headers)
+    assert res.status_code == 200 and "etag" in res.headers
+    # the versions read and the page (with its count) ran together: one round trip, not two
+    assert time.perf_counter() - start < 0.35
+    assert any(r.startswith("GET versions?") for r in postgrest.requests)
+    assert (await api.get("/policies/", headers={**headers, "If-None-Match": res.headers["etag"]})).status_code == 304
+
+def test_list_is_encoded_once_with_the_documented_schema():
+    import asyncio
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from routes.policies import store
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    client.post("/api/v1/policies/", json={"title": "Encoded Policy", "reviewers": ["ünïcode"]}, headers=headers)
+    res = client.get("/api/v1/policies/?limit=50", headers=headers)
+    assert res.status_code == 200 and res.headers["content-type"] == "application/json"
+    # byte for byte what FastAPI would have produced from the return annotation
+    route = next(r for r in app.routes if getattr(r, "path", "") == "/api/v1/policies/" and "GET" in r.methods)
+    expected = asyncio.run(serialize_response(field=route.response_field, response_content=asyncio.run(store.page(limit=50)), is_coroutine=True))
+    assert res.content == JSONResponse(expected).body
+    schema = app.openapi()["paths"]["/api/v1/policies/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema == {"$ref": "#/components/schemas/PaginatedResponse_PolicyOut_"}
+
+@pytest.mark.anyio
+async def test_export_reads_in_keyset_batches(postgrest, repos):
+    postgrest.seed("policies", [{"title": f"Policy {i}", "status": "Draft"} for i in range(25)])
+    postgrest.reset_requests()
+    chunks = [chunk async for chunk in encode_ndjson(keyset_batches(repos["policies"].list, batch_size=10))]
+    assert len(chunks) == 3 and sum(c.count("\n") for c in chunks) == 25
+    assert len(postgrest.requests) == 3 and "id=gt.10" in postgrest.requests[1]
@@ -0,0 +1,103 @@
+import asyncio
+import re
+import threading
+import time
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from main import app
+from utils import profiling
+from utils.profiling import ProfileMiddleware, StackSampler
+
+client = TestClient(app)
+ADMIN = {"Authorization": "Bearer demo-admin"}
+FOLDED = re.compile(r"^[^ ].* \d+$")
+
+def _spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def _blocking_work():
+    _spin(0.05)
+
+async def slow(request):
+    _spin(0.05)
+    await run_in_threadpool(_blocking_work)
+    await asyncio.sleep(0.05)
+    return PlainTextResponse("done")
+
+def test_profiled_request_is_attributed_to_its_own_work(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    slow_app = TestClient(ProfileMiddleware(Starlette(routes=[Route("/slow", slow)]), location="/profiles"))
+    assert "x-profile-location" not in slow_app.get("/slow", headers=ADMIN).headers
+    res = slow_app.get("/slow", params={"profile": "1"}, headers=ADMIN)
+    assert res.text == "done"
+    profile_id = res.headers["x-profile-location"].rsplit("/", 1)[1]
+    assert res.headers["x-profile-location"] == f"/profiles/{profile_id}"
+
+    with open(profiling.profile_path(profile_id)) as f:
+        lines = f.read().splitlines()
+    assert lines and all(FOLDED.match(line) for line in lines)
+    counts = {"loop": 0, "threadpool": 0, "await": 0}
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        frames = stack.split(";")
+        if frames[-1].startswith("_spin") and "[threadpool]" not in frames:
+            counts["loop"] += int(count)
+        elif "[threadpool]" in frames and any(f.startswith("_blocking_work (tests/test_profiling.py") for f in frames):
+            counts["threadpool"] += int(count)
+        elif frames[-1] == "[await]" and any(f.startswith("sleep (") for f in frames):
+            counts["await"] += int(count)
+    # each phase takes 50ms; stacks are weighted in microseconds
+    assert all(35000 <= n <= 65000 for n in counts.values()), counts
+    info = profiling.list_profiles()[0]
+    assert (info["id"], info["path"], info["status"]) == (profile_id, "/slow", 200) and info["samples"] >= 10
+
+def test_profiling_is_admin_only_and_downloadable(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    assert client.get("/api/v1/risks/", headers={"X-Profile": "1"}).status_code == 401
+    assert client.get("/api/v1/risks/", headers={"X-Profile": "1", "Authorization": "Bearer demo-viewer"}).status_code == 403
+    assert client.get("/api/v1/risks/", headers={"Authorization": "Bearer demo-viewer"}).status_code == 200
+
+    res = client.get("/api/v1/risks/", headers={"X-Profile": "1", **ADMIN})
+    assert res.status_code == 200 and res.json()["items"]
+    location = res.headers["x-profile-location"]
+    assert location.startswith("/api/v1/admin/profiles/")
+    download = client.get(location, headers=ADMIN)
+    assert download.status_code == 200 and download.headers["content-disposition"].startswith("attachment")
+    assert all(FOLDED.match(line) for line in download.text.splitlines())
+    assert client.get(location, headers={"Authorization": "Bearer demo-viewer"}).status_code == 403
+    assert client.get("/api/v1/admin/profiles/../../etc", headers=ADMIN).status_code == 404
+    assert [p["path"] for p in client.get("/api/v1/admin/profiles", headers=ADMIN).json()] == ["/api/v1/risks/"]
+
+def test_profiles_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_KEEP", 3)
+    for i in range(5):
+        profiling.save_profile(f"{i:032x}", {"a;b": 1}, {"id": f"{i:032x}", "created": float(i)})
+    assert [p["created"] for p in profiling.list_profiles()] == [4.0, 3.0, 2.0]
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(f"{i:032x}.{ext}" for i in (2, 3, 4) for ext in ("json", "folded"))
+
+def test_background_sampler_writes_folded_stacks(tmp_path):
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            _spin(0.001)
+
+    worker = threading.Thread(target=busy, name="busy-worker")
+    worker.start()
+    sampler = StackSampler(str(tmp_path / "sampler.folded"), hz=500, flush=0.05).start()
+    time.sleep(0.3)
+    # flushed while running, not only on stop
+    assert (tmp_path / "sampler.folded").exists()
+    sampler.stop()
+    done.set()
+    worker.join()
+    lines = (tmp_path / "sampler.folded").read_text().splitlines()
+    assert all(FOLDED.match(line) for line in lines)
+    busy_samples = sum(int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("busy-worker;") and "busy (tests/test_profiling.py" in line)
+    assert busy_samples >= 20
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from main import app
+from utils import auth, ratelimit
+from utils.ratelimit import TokenBuckets, parse_limits
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import sys
+from utils.ratelimit import TokenBuckets
+buckets = TokenBuckets(sys.argv[1])
+print(sum(buckets.take("shared", 100, 1e-9) == 0 for _ in range(60)))
+"""
+
+client = TestClient(app)
+
+def test_parse_limits():
+    assert parse_limits("default=600/m, bulk:viewer=0/hour,login=2/s") == {
+        ("default", None): (600.0, 10.0), ("bulk", "viewer"): (0.0, 0.0), ("login", None): (2.0, 2.0)}
+    assert parse_limits("") == {}
+    with pytest.raises(ValueError):
+        parse_limits("bulk=ten/m")
+
+def test_token_bucket_refills_at_the_configured_rate():
+    buckets = TokenBuckets("", slots=8)
+    assert [buckets.take("k", 3, 1.0, now=100.0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("k", 3, 1.0, now=100.0) == pytest.approx(1.0)
+    assert buckets.take("k", 3, 1.0, now=100.5) == pytest.approx(0.5)
+    assert buckets.take("k", 3, 1.0, now=101.5) == 0
+    # a full group reuses the slot refilled longest ago
+    for i in range(20):
+        assert buckets.take(f"other{i}", 1, 1.0, now=200.0 + i) == 0
+    assert buckets.take("k", 3, 1.0, now=300.0) == 0
+
+def test_workers_share_buckets(tmp_path):
+    path = str(tmp_path / "buckets.bin")
+    workers = [subprocess.Popen([sys.executable, "-c", WORKER, path], cwd=BACKEND, stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    granted = sum(int(worker.communicate()[0]) for worker in workers)
+    assert granted == 100
+
+def test_routes_are_limited_per_role_and_client(monkeypatch):
+    monkeypatch.setattr(ratelimit, "limits", parse_limits("default=100/m,bulk=2/m,bulk:viewer=0/m,login=1/m"))
+    monkeypatch.setattr(ratelimit, "_buckets", TokenBuckets("", slots=64))
+    admin = {"Authorization": "Bearer demo-admin"}
+    assert [client.post("/api/v1/policies/bulk", json=[], headers=admin).status_code for _ in range(2)] == [200, 200]
+    res = client.post("/api/v1/policies/bulk", json=[], headers=admin)
+    assert res.status_code == 429 and res.headers["retry-after"] == "30"
+    # other routes still have budget, and a role blocked from a scope never gets in
+    assert client.get("/api/v1/policies/", headers=admin).status_code == 200
+    res = client.post("/api/v1/workflows/transition/batch", json={"action": "approve", "request_ids": []}, headers={"Authorization": "Bearer demo-viewer"})
+    assert res.status_code == 429 and "retry-after" not in res.headers
+
+    # anonymous callers are keyed on the address the proxy saw
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_PROXY_HOPS", 1)
+    login = lambda forwarded: client.post("/api/v1/auth/login", json={"role": "admin"}, headers={"X-Forwarded-For": forwarded}).status_code
+    assert login("10.0.0.1") == 200 and login("10.0.0.1") == 429
+    assert login("10.0.0.1, 10.0.0.2") == 200
+
+def test_each_jwt_subject_has_its_own_budget(monkeypatch):
+    monkeypatch.setattr(ratelimit, "limits", parse_limits("default=100/m,bulk=1/m"))
+    monkeypatch.setattr(ratelimit, "_buckets", TokenBuckets("", slots=64))
+    previous = auth.get_settings()
+    auth.configure(auth.AuthSettings(jwt_secret="limit-secret", default_role="admin"))
+    try:
+        token = lambda sub: jwt.encode({"sub": sub, "role": "admin", "exp": int(time.time()) + 60}, "limit-secret", algorithm="HS256")
+        bulk = lambda sub: client.post("/api/v1/policies/bulk", json=[], headers={"Authorization": f"Bearer {token(sub)}"}).status_code
+        assert bulk("3f1c-alice") == 200 and bulk("3f1c-alice") == 429
+        # same role, different user: a separate bucket
+        assert bulk("9b2e-bob") == 200
+    finally:
+        auth.configure(previous)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from main import app
+from utils import db
+from utils.registry import Registry
+from postgrest_stub import FAKE_KEY
+
+HEADERS = {"Authorization": "Bearer demo-admin"}
+
+STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+from main import app
+from fastapi.testclient import TestClient
+imported = time.perf_counter()
+built_at_import = app.state.registry._built
+with TestClient(app) as client:
+    status = client.get("/api/v1/policies/", headers={"Authorization": "Bearer demo-admin"}).status_code
+served = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "first_request_s": served - start, "built_at_import": built_at_import, "status": status}))
+"""
+
+def test_one_client_shared_by_routes_and_uploads(postgrest, monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", postgrest.url)
+    monkeypatch.setenv("SUPABASE_ANON_KEY", FAKE_KEY)
+    created = []
+    real_create_client = db.create_client
+    monkeypatch.setattr(db, "create_client", lambda url, key: created.append(url) or real_create_client(url, key))
+    postgrest.seed("policies", [{"title": "Access Control", "status": "Draft"}])
+
+    previous = app.state.registry
+    app.state.registry = Registry(async_db=False)
+    try:
+        with TestClient(app) as client:
+            assert created == []
+            assert client.get("/api/v1/policies/", headers=HEADERS).json()["total"] == 1
+            assert client.get("/api/v1/risks/", headers=HEADERS).status_code == 200
+            for name in ("a.pdf", "b.pdf"):
+                res = client.post("/api/v1/policies/1/upload", files={"file": (name, b"%PDF-1.7")}, headers=HEADERS)
+                assert res.status_code == 200
+        assert len(created) == 1
+        # the second upload has the same content, so it is stored once
+        digest = hashlib.sha256(b"%PDF-1.7").hexdigest()
+        assert list(postgrest.objects) == [f"policy_files/sha256/{digest}"]
+        assert f"/policy_files/sha256/{digest}" in res.json()["file_url"]
+    finally:
+        app.state.registry = previous
+
+def test_startup_time_to_first_request(postgrest):
+    env = {"DEMO_MODE": "true", "SUPABASE_URL": postgrest.url, "SUPABASE_ANON_KEY": FAKE_KEY, "PATH": ""}
+    out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    report = f"import {timings['import_s']:.3f}s, first request served {timings['first_request_s']:.3f}s"
+    assert timings["status"] == 200
+    assert timings["built_at_import"] is False
+    assert timings["first_request_s"] < 10, report
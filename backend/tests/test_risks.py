@@ -1,5 +1,9 @@
+import json
+import pytest
 from fastapi.testclient import TestClient
 from main import app
+from schemas.policy import PolicyCreate, PolicyBulkUpdate
+from schemas.risk import RiskCreate, RiskUpdate, RiskBulkUpdate
 
 client = TestClient(app)
 
@@ -12,4 +16,163 @@ def test_create_risk_and_score():
     res = client.post("/api/v1/risks/", json={"title": "Server Outage", "impact": 4, "likelihood": 2}, headers={"Authorization": f"Bearer {token}"})
     assert res.status_code == 200
     data = res.json()
-    assert data["score"] == 8
\ No newline at end of file
+    assert data["score"] == 8
+
+def test_bulk_create_update_delete_reports_item_errors():
+    headers = {"Authorization": f"Bearer {get_manager_token()}"}
+    items = [{"title": f"Bulk Risk {i}", "impact": i % 5 + 1, "likelihood": 2} for i in range(5)]
+    items.insert(2, {"title": "x", "impact": 9, "likelihood": 1})
+    res = client.post("/api/v1/risks/bulk", json=items, headers=headers)
+    assert res.status_code == 200
+    data = res.json()
+    assert [e["index"] for e in data["errors"]] == [2]
+    assert [r["score"] for r in data["items"]] == [2, 4, 6, 8, 10]
+    ids = [r["id"] for r in data["items"]]
+
+    res = client.put("/api/v1/risks/bulk", json=[{"id": ids[0], "likelihood": 5}, {"id": 999999, "title": "Missing"}], headers=headers)
+    data = res.json()
+    assert data["items"][0]["score"] == 5
+    assert data["errors"] == [{"index": 1, "id": 999999, "detail": "Risk not found"}]
+
+    admin = client.post("/api/v1/auth/login", json={"role": "admin"}).json()["access_token"]
+    res = client.request("DELETE", "/api/v1/risks/bulk", json={"ids": ids + [999999]}, headers={"Authorization": f"Bearer {admin}"})
+    assert res.json()["deleted"] == ids
+    assert [e["id"] for e in res.json()["errors"]] == [999999]
+
+def test_bulk_bodies_are_documented():
+    paths = app.openapi()["paths"]
+    for path, method, model in (("/api/v1/risks/bulk", "post", RiskCreate), ("/api/v1/risks/bulk", "put", RiskBulkUpdate),
+                                ("/api/v1/policies/bulk", "post", PolicyCreate), ("/api/v1/policies/bulk", "put", PolicyBulkUpdate)):
+        schema = paths[path][method]["requestBody"]["content"]["application/json"]["schema"]
+        assert schema["type"] == "array" and schema["items"]["properties"].keys() == model.model_fields.keys()
+        assert schema["items"]["required"] == model.model_json_schema()["required"]
+
+def test_export_streams_csv_and_ndjson():
+    import csv, io, json
+    headers = {"Authorization": f"Bearer {get_manager_token()}"}
+    client.post("/api/v1/risks/", json={"title": "Export Me", "impact": 3, "likelihood": 3}, headers=headers)
+    total = client.get("/api/v1/risks/", headers=headers).json()["total"]
+
+    res = client.get("/api/v1/risks/export", headers=headers)
+    assert res.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert len(rows) == total and any(r["title"] == "Export Me" and r["score"] == "9" for r in rows)
+
+    res = client.get("/api/v1/risks/export", params={"format": "ndjson"}, headers=headers)
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert len(lines) == total and lines[0]["id"] < lines[-1]["id"]
+
+def test_import_csv_reports_row_errors():
+    headers = {"Authorization": f"Bearer {get_manager_token()}"}
+    lines = ["title,impact,likelihood,owner"] + [f"Imported Risk {i},{i % 5 + 1},2,ops" for i in range(5)]
+    lines.insert(3, "Bad Risk,7,2,ops")
+    body = "\n".join(lines).encode()
+    res = client.post("/api/v1/risks/import", files={"file": ("risks.csv", body, "text/csv")}, headers=headers)
+    assert res.status_code == 200
+    data = res.json()
+    assert (data["rows"], data["imported"], data["failed"]) == (6, 5, 1)
+    assert [e["row"] for e in data["errors"]] == [4]
+    found = client.get("/api/v1/risks/", params={"q": "Imported Risk"}, headers=headers).json()
+    assert found["total"] == 5
+
+def test_heatmap_and_stats_follow_writes():
+    headers = {"Authorization": f"Bearer {get_manager_token()}"}
+    admin = {"Authorization": f"Bearer {client.post('/api/v1/auth/login', json={'role': 'admin'}).json()['access_token']}"}
+    created = client.post("/api/v1/risks/", json={"title": "Heatmap Risk", "impact": 5, "likelihood": 5}, headers=headers).json()
+    client.put(f"/api/v1/risks/{created['id']}", json={"likelihood": 4}, headers=headers)
+    other = client.post("/api/v1/risks/", json={"title": "Heatmap Gone", "impact": 1, "likelihood": 1}, headers=headers).json()
+    client.delete(f"/api/v1/risks/{other['id']}", headers=admin)
+
+    export = client.get("/api/v1/risks/export", params={"format": "ndjson"}, headers=headers)
+    risks = [json.loads(line) for line in export.text.splitlines()]
+    cells = [[0] * 5 for _ in range(5)]
+    for r in risks:
+        cells[r["impact"] - 1][r["likelihood"] - 1] += 1
+    heatmap = client.get("/api/v1/risks/heatmap", headers=headers).json()
+    assert heatmap == {"cells": cells, "total": len(risks)}
+
+    stats = client.get("/api/v1/risks/stats", params={"top": 3}, headers=headers).json()
+    expected = sorted(risks, key=lambda r: (-r["score"], r["id"]))[:3]
+    assert [r["id"] for r in stats["top"]] == [r["id"] for r in expected]
+    assert stats["max_score"] == expected[0]["score"] and stats["total"] == len(risks)
+    assert sum(stats["levels"].values()) == len(risks)
+
+@pytest.mark.anyio
+async def test_bulk_writes_are_single_statements(postgrest, repos):
+    risks = repos["risks"]
+    postgrest.reset_requests()
+    created = await risks.create_many([RiskCreate(title=f"Risk {i}", impact=2, likelihood=3) for i in range(500)])
+    assert len(postgrest.requests) == 1 and all(r.score == 6 for r in created)
+    # a write from elsewhere to a column the bulk update doesn't touch must survive it
+    postgrest.tables["risks"][created[0].id]["owner"] = "CISO"
+    updates = [RiskBulkUpdate(id=r.id, impact=5) for r in created[:100]]
+    updated = await risks.update_many(updates)
+    assert len(postgrest.requests) == 2 and all(r.score == 15 for r in updated.values())
+    assert postgrest.rpc_calls == [("bulk_update_risks", {"changes": [{"id": r.id, "impact": 5} for r in created[:100]]})]
+    assert updated[created[0].id].owner == "CISO"
+    assert len(postgrest.tables["risks"]) == 500
+    deleted = await risks.delete_many([r.id for r in created[:10]] + [10_000])
+    assert len(postgrest.requests) == 3 and len(deleted) == 10
+
+@pytest.mark.anyio
+async def test_risk_aggregates_read_views(postgrest, repos):
+    postgrest.seed("risks", [{"title": f"Risk {i}", "impact": i % 5 + 1, "likelihood": 4, "score": (i % 5 + 1) * 4} for i in range(50)])
+    risks = repos["risks"]
+    postgrest.reset_requests()
+    heatmap, stats = await risks.heatmap(), await risks.stats(top=5)
+    assert [row[3] for row in heatmap.cells] == [10] * 5 and heatmap.total == 50
+    assert stats.max_score == 20 and stats.levels == {"high": 10, "medium": 20, "low": 20}
+    assert [r.score for r in stats.top] == [20] * 5 and [r.id for r in stats.top] == [5, 10, 15, 20, 25]
+    # no request reads the whole table
+    assert len(postgrest.requests) == 3 and any("limit=5" in r for r in postgrest.requests)
+
+@pytest.mark.anyio
+async def test_round_trips_per_risk_endpoint(repos, api):
+    risks = repos["risks"]
+    headers = {"Authorization": "Bearer demo-admin"}
+    trips = {}
+
+    async def call(name, method, url, **kwargs):
+        before = risks.round_trips
+        res = await api.request(method, f"/risks{url}", headers=headers, **kwargs)
+        assert res.status_code == 200, res.text
+        trips[name] = risks.round_trips - before
+        return res.json()
+
+    created = await call("create", "POST", "/", json={"title": "Phishing", "impact": 2, "likelihood": 2})
+    updated = await call("update", "PUT", f"/{created['id']}", json={"impact": 5})
+    assert updated["score"] == 10
+    await call("get", "GET", f"/{created['id']}")
+    await call("list", "GET", "/")
+    bulk = await call("bulk_create", "POST", "/bulk", json=[{"title": f"Bulk {i}", "impact": 1, "likelihood": 3} for i in range(20)])
+    await call("bulk_update", "PUT", "/bulk", json=[{"id": r["id"], "likelihood": 5} for r in bulk["items"]])
+    await call("bulk_delete", "DELETE", "/bulk", json={"ids": [r["id"] for r in bulk["items"]]})
+    await call("heatmap", "GET", "/heatmap")
+    await call("stats", "GET", "/stats")
+    await call("delete", "DELETE", f"/{created['id']}")
+    assert trips == {
+        "create": 1, "update": 1, "get": 1, "list": 1,
+        "bulk_create": 1, "bulk_update": 1, "bulk_delete": 1,
+        "heatmap": 1, "stats": 2, "delete": 1,
+    }
+
+@pytest.mark.anyio
+async def test_not_modified_skips_the_database(postgrest, repos, api):
+    postgrest.seed("risks", [{"title": "Outage", "impact": 2, "likelihood": 2}])
+    headers = {"Authorization": "Bearer demo-admin"}
+    etag = (await api.get("/risks/1", headers=headers)).headers["etag"]
+    before = repos["risks"].round_trips
+    res = await api.get("/risks/1", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304 and res.content == b"" and repos["risks"].round_trips == before
+    await api.put("/risks/1", json={"impact": 3}, headers=headers)
+    res = await api.get("/risks/1", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and res.json()["score"] == 6
+
+@pytest.mark.anyio
+async def test_risk_update_is_one_round_trip(postgrest, repos):
+    postgrest.seed("risks", [{"title": "Outage", "impact": 2, "likelihood": 2}])
+    risks = repos["risks"]
+    updated = await risks.update(1, RiskUpdate(impact=4))
+    # the score is generated by the database, never sent
+    assert updated.score == 8 and risks.round_trips == 1
+    assert await risks.update(2, RiskUpdate(impact=4)) is None and risks.round_trips == 2
@@ -0,0 +1,37 @@
+import random
+import pytest
+from utils.search import CompactTrigramIndex, TrigramIndex
+from utils.demo_store import PoliciesStore
+from schemas.policy import PolicyCreate, PolicyUpdate
+
+WORDS = ["Access", "Control", "Data", "Backup", "Vendor", "Incident", "Response", "Privacy", "Ünïcode", "key"]
+
+def naive(texts, q):
+    return sorted(k for k, t in texts.items() if q.lower() in t.lower())
+
+@pytest.mark.parametrize("index_class", [TrigramIndex, CompactTrigramIndex])
+def test_trigram_index_matches_substring_search(index_class):
+    rng = random.Random(7)
+    index = index_class()
+    texts = {}
+    for i in range(1, 500):
+        texts[i] = " ".join(rng.choice(WORDS) for _ in range(3))
+        index.add(i, texts[i])
+    for i in range(1, 500, 7):
+        texts[i] = " ".join(rng.choice(WORDS) for _ in range(2))
+        index.add(i, texts[i])
+    for i in range(3, 500, 11):
+        del texts[i]
+        index.remove(i)
+    for q in ["a", "Ac", "acc", "CONTROL", "ol da", "ünï", "key key", "zzz", "data backup vendor"]:
+        assert index.search(q) == naive(texts, q)
+
+def test_store_search_follows_updates_and_deletes():
+    store = PoliciesStore()
+    created = store.create(PolicyCreate(title="Vendor Risk Policy"))
+    assert [p.id for p in store.list(q="vendor")] == [created.id]
+    store.update(created.id, PolicyUpdate(title="Supplier Risk Policy"))
+    assert store.list(q="vendor") == []
+    assert [p.id for p in store.list(q="SUPPLIER")] == [created.id]
+    store.delete(created.id)
+    assert store.list(q="supplier") == []
@@ -0,0 +1,117 @@
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from schemas.common import BulkDeleteRequest
+from schemas.compliance import FrameworkCreate, FrameworkUpdate
+from schemas.policy import PolicyBulkUpdate, PolicyCreate, PolicyUpdate
+from schemas.risk import RiskCreate, RiskUpdate
+from utils import sqlite_store
+from utils.demo_store import AsyncStore, ComplianceStore, RisksStore
+from utils.imports import import_csv
+from utils.pagination import decode_cursor
+from utils.sqlite_store import SqliteComplianceStore, SqliteDB, SqlitePoliciesStore, SqliteRisksStore
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys
+from fastapi.testclient import TestClient
+from main import app
+with TestClient(app) as client:
+    ids = [client.post("/api/v1/policies/", json={"title": f"Worker policy {i}"}, headers={"Authorization": "Bearer demo-admin"}).json()["id"] for i in range(int(sys.argv[1]))]
+print(json.dumps(ids))
+"""
+
+def test_policies_crud_search_and_paging(tmp_path):
+    store = SqlitePoliciesStore(SqliteDB(str(tmp_path / "grc.db")))
+    created = store.create_many([PolicyCreate(title=f"Policy {i:03d}", reviewers=["a"] if i % 2 else None) for i in range(120)])
+    store.create(PolicyCreate(title="Information Security Policy"))
+    assert [p.id for p in created[:3]] == [1, 2, 3] and created[1].reviewers == ["a"]
+
+    assert store.page(q="SECURITY").total == 1
+    assert store.page(q="y 01", limit=5).total == 10
+    assert store.page(q="5", limit=200).total == 21
+    page = store.page(limit=50)
+    second = store.page(limit=50, after=decode_cursor(page.next_cursor))
+    assert page.total == 121 and second.items[0].id == 51 and store.page(skip=50, limit=50).items == second.items
+
+    assert store.update(1, PolicyUpdate(title="Renamed")).title == "Renamed"
+    assert store.page(q="renamed").items[0].id == 1 and store.page(q="Policy 000").total == 0
+    assert store.update(999, PolicyUpdate(title="Nope")) is None
+    updated = store.update_many([PolicyBulkUpdate(id=2, status="Approved"), PolicyBulkUpdate(id=999, status="Approved")])
+    assert list(updated) == [2] and updated[2].status == "Approved"
+    assert store.delete_many(BulkDeleteRequest(ids=[3, 4, 999]).ids) == [3, 4]
+    assert store.get(3) is None and store.count() == 119
+    # ids are never reused
+    assert store.create(PolicyCreate(title="After delete")).id == 122
+
+def test_risks_and_compliance_match_the_memory_stores(tmp_path):
+    db = SqliteDB(str(tmp_path / "grc.db"))
+    memory, sqlite = RisksStore(), SqliteRisksStore(db)
+    sqlite.create(RiskCreate(title="Data Breach", description="Unauthorized access", impact=5, likelihood=3))
+    for store in (memory, sqlite):
+        store.create_many([RiskCreate(title=f"Risk {i}", impact=i % 5 + 1, likelihood=(i // 5) % 5 + 1) for i in range(50)])
+        store.update(2, RiskUpdate(impact=5, likelihood=5))
+        store.delete(3)
+    assert sqlite.get(2).score == 25
+    assert sqlite.heatmap() == memory.heatmap()
+    assert sqlite.stats(5) == memory.stats(5)
+
+    memory, sqlite = ComplianceStore(), SqliteComplianceStore(db)
+    sqlite.create(FrameworkCreate(name="ISO 27001", description="Information Security Management", controls=["A.5.1", "A.8.2"]))
+    for store in (memory, sqlite):
+        store.create(FrameworkCreate(name="SOC 2", controls=["CC1", "CC2", "CC3"]))
+        store.map_controls(2, {"CC1": [1, 2], "CC3": [1], "X": [1]})
+        store.map_controls(2, {"CC3": []})
+        store.map_controls(1, {"A.5.1": [1]})
+        store.update(2, FrameworkUpdate(controls=["CC1", "CC2", "CC3", "X"]))
+    assert not sqlite.map_controls(99, {"C": [1]})
+    assert sqlite.get(2) == memory.get(2)
+    assert sqlite.all_coverage() == memory.all_coverage()
+    assert sqlite.unmapped(2) == memory.unmapped(2) and sqlite.unmapped(99) is None
+    assert sqlite.blast_radius(1) == memory.blast_radius(1)
+    assert sqlite.page(q="soc").items == memory.page(q="soc").items
+
+def test_workers_share_one_database(tmp_path):
+    env = {**os.environ, "DEMO_MODE": "true", "LOCAL_STORE": "sqlite", "SQLITE_PATH": str(tmp_path / "grc.db"), "SUPABASE_URL": "", "SUPABASE_ANON_KEY": ""}
+    workers = [subprocess.Popen([sys.executable, "-c", WORKER, "50"], env=env, cwd=BACKEND, stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    ids = [i for worker in workers for i in json.loads(worker.communicate()[0].strip().splitlines()[-1])]
+    assert sorted(ids) == list(range(1, 201))
+
+    # versions are in the database, so a second process sees the first one's writes
+    first, second = SqliteDB(str(tmp_path / "grc.db")), SqliteDB(str(tmp_path / "grc.db"))
+    before = second.record_version("policies", 1)
+    SqlitePoliciesStore(first).update(1, PolicyUpdate(title="Moved on"))
+    assert second.record_version("policies", 1)[0] > before[0] and first.epoch == second.epoch
+
+def test_a_locked_database_waits_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "SQLITE_BUSY_TIMEOUT_MS", 200)
+    path = str(tmp_path / "grc.db")
+    store = AsyncStore(SqliteRisksStore(SqliteDB(path)), threaded=True)
+    assert asyncio.run(store.count()) == 0
+    # another worker holds the write lock for longer than the busy timeout
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        ticker = asyncio.create_task(tick())
+        report = await import_csv(io.BytesIO(b"title,impact,likelihood\nOutage,2,3\n"), RiskCreate, store.create_many)
+        ticker.cancel()
+        return report, ticks
+
+    report, ticks = asyncio.run(scenario())
+    assert report.imported == 0 and "was not written" in report.errors[0].detail
+    # the loop kept serving while the write waited on the lock
+    assert ticks >= 10
+    holder.execute("ROLLBACK")
@@ -0,0 +1,172 @@
+import asyncio
+import errno
+import time
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from routes import workflows
+from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowTransition
+from utils.demo_store import WorkflowsStore
+from utils.journal import Journal, JournalLocked
+from utils.pagination import decode_cursor
+from utils.workflow import WorkflowEngine
+
+client = TestClient(app)
+HEADERS = {"Authorization": "Bearer demo-admin"}
+
+def test_stage_queue_and_batch_transitions():
+    ids = [f"queue-{i}" for i in range(25)]
+    for request_id in ids:
+        client.post("/api/v1/workflows/requests", json={"request_id": request_id, "title": f"Review {request_id}"}, headers=HEADERS)
+
+    # page through everything pending at L1 with the cursor
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/v1/workflows/stages/L1/queue", params=params, headers=HEADERS).json()
+        seen += [item["request_id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert [s for s in seen if s.startswith("queue-")] == ids
+
+    res = client.post("/api/v1/workflows/transition/batch", json={"action": "approve", "stage": "L1", "request_ids": ids[:20] + ["missing"]}, headers=HEADERS).json()
+    assert {item["stage"] for item in res["items"]} == {"L2"} and len(res["items"]) == 20
+    assert res["errors"] == [{"index": 20, "id": None, "detail": "Request not found"}]
+    # a second approver clearing the same queue doesn't push them on again
+    again = client.post("/api/v1/workflows/transition/batch", json={"action": "approve", "stage": "L1", "request_ids": ids[:2]}, headers=HEADERS).json()
+    assert again["items"] == [] and len(again["errors"]) == 2
+
+    l2 = client.get("/api/v1/workflows/stages/L2/queue", params={"limit": 100}, headers=HEADERS).json()
+    assert [item["request_id"] for item in l2["items"] if item["request_id"].startswith("queue-")] == ids[:20]
+    stages = {s["stage"]: s["pending"] for s in client.get("/api/v1/workflows/stages", headers=HEADERS).json()}
+    assert stages["L2"] >= 20
+    assert client.get("/api/v1/workflows/stages/L9/queue", headers=HEADERS).status_code == 404
+
+def test_finished_requests_cannot_move():
+    engine = WorkflowEngine(WorkflowConfig(role_order=["L1"]))
+    engine.create(WorkflowRequest(request_id="r", title="Done"))
+    assert engine.transition(WorkflowTransition(request_id="r", action="approve")).status == "Approved"
+    assert engine.transition(WorkflowTransition(request_id="r", action="reject")) is None
+
+def test_role_order_change_keeps_requests_in_flight():
+    engine = WorkflowEngine(WorkflowConfig(role_order=["L1", "L2", "L3"]))
+    for i, stage_index in enumerate([0, 1, 1, 2]):
+        engine.create(WorkflowRequest(request_id=f"r{i}", title="t", current_stage_index=stage_index))
+
+    # reordering keeps each request at its stage by name
+    engine.set_config(WorkflowConfig(role_order=["L3", "L2", "L1"]))
+    assert [engine.get(f"r{i}").stage for i in range(4)] == ["L1", "L2", "L2", "L3"]
+    assert engine.transition(WorkflowTransition(request_id="r0", action="approve")).status == "Approved"
+
+    # a removed stage hands its requests on to the next surviving one, in arrival order
+    engine.set_config(WorkflowConfig(role_order=["L3", "L1"]))
+    assert [item.request_id for item in engine.queue("L1").items] == ["r1", "r2"]
+    assert engine.transition(WorkflowTransition(request_id="r1", action="reject")).stage == "L3"
+    assert [(s.stage, s.pending) for s in engine.stages()] == [("L3", 2), ("L1", 1)]
+
+    # dropping the last stages leaves their requests at the new last stage
+    engine.set_config(WorkflowConfig(role_order=["L3"]))
+    assert [item.request_id for item in engine.queue("L3").items] == ["r2", "r3", "r1"]
+
+def test_deep_queue_pages_are_cheap():
+    engine = WorkflowEngine()
+    for i in range(50_000):
+        engine.create(WorkflowRequest(request_id=f"r{i}", title="t", current_stage_index=i % 3))
+    items, errors = engine.transition_many("approve", [f"r{i}" for i in range(0, 3000, 3)], stage="L1")
+    assert len(items) == 1000 and not errors
+
+    page = engine.queue("L2", limit=50)
+    start = time.perf_counter()
+    while page.next_cursor:
+        page = engine.queue("L2", limit=50, after=decode_cursor(page.next_cursor))
+    elapsed = time.perf_counter() - start
+    assert page.total == 16_667 + 1000
+    # ~350 pages; a scan of every request per page would take seconds
+    assert elapsed < 1.0
+
+def test_journal_survives_restarts(tmp_path):
+    async def scenario():
+        store = WorkflowsStore(str(tmp_path), snapshot_every=25)
+        for i in range(40):
+            store.create_request(WorkflowRequest(request_id=f"r{i}", title=f"Request {i}"))
+        # concurrent approvals share fsyncs
+        async def approve(i):
+            store.transition(WorkflowTransition(request_id=f"r{i}", action="approve"))
+            await store.commit()
+        await asyncio.gather(*[approve(i) for i in range(30)])
+        store.transition_many("approve", [f"r{i}" for i in range(10)], stage="L2")
+        store.set_config(WorkflowConfig(role_order=["L1", "L3"]))
+        await store.commit()
+        assert store._journal.fsyncs < 30
+        before = store._engine.snapshot()
+        store.close()
+        return before
+
+    before = asyncio.run(scenario())
+    # a snapshot was taken, so only the tail is replayed
+    assert (tmp_path / "snapshot.json").exists()
+    restarted = WorkflowsStore(str(tmp_path), snapshot_every=25)
+    assert restarted._engine.snapshot() == before
+    assert restarted.get_request("r0").stage == "L3"
+    assert [s.pending for s in restarted.stages()] == [10, 30]
+    restarted.close()
+
+def test_journal_ignores_a_torn_last_record(tmp_path):
+    async def scenario():
+        store = WorkflowsStore(str(tmp_path))
+        store.create_request(WorkflowRequest(request_id="a", title="Kept"))
+        await store.commit()
+        store.close()
+
+    asyncio.run(scenario())
+    segment = sorted(tmp_path.glob("journal-*.log"))[-1]
+    with open(segment, "a") as f:
+        f.write('{"lsn":2,"op":"create","request":{"request_id":"b"')
+    store = WorkflowsStore(str(tmp_path))
+    assert store.get_request("a").title == "Kept"
+    assert store.get_request("b") is None
+    with pytest.raises(RuntimeError):
+        WorkflowsStore(str(tmp_path)).get_config()
+    store.close()
+
+def test_failed_snapshot_keeps_the_journal(tmp_path, monkeypatch):
+    def disk_full(self, *args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    async def scenario():
+        store = WorkflowsStore(str(tmp_path), snapshot_every=5)
+        store.get_config()
+        monkeypatch.setattr(Journal, "_write_snapshot", disk_full)
+        append = Journal._append_sync
+        monkeypatch.setattr(Journal, "_append_sync", lambda self, data: (time.sleep(0.03), append(self, data)))
+        acked = []
+
+        # records appended while a flush runs are still buffered when the snapshot is due
+        async def create(i):
+            await asyncio.sleep(0.01 * i)
+            store.create_request(WorkflowRequest(request_id=f"r{i}", title=f"Request {i}"))
+            try:
+                await store.commit()
+                acked.append(f"r{i}")
+            except OSError:
+                pass
+        await asyncio.gather(*[create(i) for i in range(20)])
+        store.close()
+        return acked
+
+    acked = asyncio.run(scenario())
+    monkeypatch.undo()
+    restarted = WorkflowsStore(str(tmp_path), snapshot_every=5)
+    assert acked and all(restarted.get_request(r) for r in acked)
+    restarted.close()
+
+def test_second_worker_fails_at_startup(tmp_path, monkeypatch):
+    owner = WorkflowsStore(str(tmp_path))
+    owner.open()
+    # what another worker on the same journal directory would run
+    monkeypatch.setattr(workflows, "store", WorkflowsStore(str(tmp_path)))
+    with pytest.raises(JournalLocked, match="single worker"):
+        with TestClient(app):
+            pass
+    owner.close()
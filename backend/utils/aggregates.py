@@ -0,0 +1,84 @@
+from array import array
+from bisect import insort
+from typing import Any, Dict, List
+from schemas.risk import RiskOut, RiskHeatmap, RiskStats
+from utils.pagination import remove_id
+
+SCALE = 5
+# same bands as the dashboard badges
+LEVELS = (("high", 20), ("medium", 10), ("low", 0))
+
+def risk_level(score: int) -> str:
+    return next(name for name, floor in LEVELS if score >= floor)
+
+def empty_cells() -> List[List[int]]:
+    return [[0] * SCALE for _ in range(SCALE)]
+
+class RiskAggregates:
+    # Heatmap cells, level counters and the ids of each score in ascending order, kept in step
+    # with every write so the dashboard reads them in O(1) and the top k risks, by (score desc,
+    # id), in O(k). Ids usually arrive in ascending order, so a write is an append.
+    def __init__(self):
+        self.cells = empty_cells()
+        self.levels: Dict[str, int] = {name: 0 for name, _ in LEVELS}
+        self.total = 0
+        self.score_sum = 0
+        self._by_score: List[array] = [array("q") for _ in range(SCALE * SCALE + 1)]
+
+    def add(self, risk: RiskOut):
+        self.add_values(risk.id, risk.impact, risk.likelihood)
+
+    def remove(self, risk: RiskOut):
+        self.remove_values(risk.id, risk.impact, risk.likelihood)
+
+    def add_values(self, risk_id: int, impact: int, likelihood: int):
+        score = impact * likelihood
+        self.cells[impact - 1][likelihood - 1] += 1
+        self.levels[risk_level(score)] += 1
+        self.total += 1
+        self.score_sum += score
+        ids = self._by_score[score]
+        if not ids or ids[-1] < risk_id:
+            ids.append(risk_id)
+        else:
+            insort(ids, risk_id)
+
+    def remove_values(self, risk_id: int, impact: int, likelihood: int):
+        score = impact * likelihood
+        self.cells[impact - 1][likelihood - 1] -= 1
+        self.levels[risk_level(score)] -= 1
+        self.total -= 1
+        self.score_sum -= score
+        remove_id(self._by_score[score], risk_id)
+
+    def max_score(self) -> int:
+        return next((score for score in range(len(self._by_score) - 1, 0, -1) if self._by_score[score]), 0)
+
+    def top_ids(self, k: int) -> List[int]:
+        top: List[int] = []
+        for score in range(len(self._by_score) - 1, 0, -1):
+            if len(top) >= k:
+                break
+            top.extend(self._by_score[score][:k - len(top)])
+        return top
+
+    def summary(self) -> Dict[str, Any]:
+        average = self.score_sum / self.total if self.total else 0.0
+        return {"total": self.total, "average_score": round(average, 2), "max_score": self.max_score(), "levels": dict(self.levels)}
+
+# Supabase side: the `risk_heatmap` and `risk_stats` views (see README) aggregate in the database,
+# so a request reads at most 25 + 1 rows plus the top k by the (score desc, id) index.
+def heatmap_from_rows(rows: List[Dict[str, Any]]) -> RiskHeatmap:
+    cells = empty_cells()
+    for row in rows:
+        cells[row["impact"] - 1][row["likelihood"] - 1] = row["count"]
+    return RiskHeatmap(cells=cells, total=sum(row["count"] for row in rows))
+
+def stats_from_rows(summary: Dict[str, Any], top: List[RiskOut]) -> RiskStats:
+    return RiskStats(
+        total=summary["total"],
+        average_score=round(summary["average_score"] or 0.0, 2),
+        max_score=summary["max_score"] or 0,
+        levels={name: summary[name] for name, _ in LEVELS},
+        top=top,
+    )
@@ -0,0 +1,439 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import httpx
+from postgrest.exceptions import APIError
+from starlette.concurrency import run_in_threadpool
+from schemas.policy import PolicyCreate, PolicyUpdate, PolicyBulkUpdate, PolicyOut
+from schemas.risk import RiskCreate, RiskUpdate, RiskBulkUpdate, RiskOut, RiskHeatmap, RiskStats
+from schemas.compliance import FrameworkCreate, FrameworkUpdate, FrameworkOut, FrameworkCoverage, UnmappedControls, PolicyBlastRadius
+from schemas.common import PaginatedResponse
+from utils.aggregates import heatmap_from_rows, stats_from_rows
+from utils.batching import Coalescer
+from utils.bulk import merge_changes
+from utils.coverage import blast_radius_from_rows, coverage_from_row
+from utils.metrics import db_round_trips
+from utils.pagination import Cursor, TotalCounter, page_response
+from utils.versions import versions
+
+class HttpPool:
+    # One keep-alive connection pool to PostgREST shared by every repository. Opened by the
+    # app's Registry on first use and closed by the lifespan. `threaded` is the sync fallback:
+    # the same repositories, their requests sent by a blocking client from the threadpool.
+    def __init__(self, url: Optional[str], key: Optional[str], size: int = 50, timeout: float = 10.0, threaded: bool = False):
+        self.url = url
+        self.key = key
+        self.size = size
+        self.timeout = timeout
+        self.threaded = threaded
+        self._client: Optional[Union[httpx.AsyncClient, httpx.Client]] = None
+
+    @classmethod
+    def from_env(cls, threaded: bool = False) -> "HttpPool":
+        return cls(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"), int(os.getenv("DB_POOL_SIZE", "50")), threaded=threaded)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.key)
+
+    @property
+    def http(self) -> Union[httpx.AsyncClient, httpx.Client]:
+        if self._client is None:
+            raise RuntimeError("HTTP pool is not open")
+        return self._client
+
+    async def open(self):
+        if self._client is not None or not self.configured:
+            return
+        client = httpx.Client if self.threaded else httpx.AsyncClient
+        self._client = client(
+            base_url=f"{self.url.rstrip('/')}/rest/v1",
+            headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+            limits=httpx.Limits(max_connections=self.size, max_keepalive_connections=self.size),
+            timeout=self.timeout,
+        )
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.threaded:
+            return await run_in_threadpool(self.http.request, method, path, **kwargs)
+        return await self.http.request(method, path, **kwargs)
+
+    async def close(self):
+        if self._client is None:
+            return
+        if self.threaded:
+            self._client.close()
+        else:
+            await self._client.aclose()
+        self._client = None
+
+def _raise_for_error(res: httpx.Response):
+    if res.is_success:
+        return
+    try:
+        raise APIError(res.json())
+    except ValueError:
+        raise APIError({"message": res.text, "code": str(res.status_code), "hint": None, "details": None})
+
+def _content_range_total(header: Optional[str]) -> Optional[int]:
+    # "0-19/123", "*/0", or "0-19/*" when no count was requested
+    if not header or "/" not in header:
+        return None
+    total = header.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+class PostgrestTable:
+    def __init__(self, pool: HttpPool, name: str, owner: Optional["AsyncRepository"] = None):
+        self.pool = pool
+        self.name = name
+        self.owner = owner
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.owner is not None:
+            self.owner.round_trips += 1
+        begin = time.perf_counter()
+        try:
+            res = await self.pool.request(method, path, **kwargs)
+        finally:
+            db_round_trips.observe(time.perf_counter() - begin, self.name, method)
+        _raise_for_error(res)
+        return res
+
+    async def select(self, params: Dict[str, str], count: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        headers = {"Prefer": f"count={count}"} if count else {}
+        res = await self._send("GET", f"/{self.name}", params=params, headers=headers)
+        return res.json(), _content_range_total(res.headers.get("content-range"))
+
+    async def insert(self, rows: Any) -> List[Dict[str, Any]]:
+        res = await self._send("POST", f"/{self.name}", json=rows, headers={"Prefer": "return=representation"})
+        return res.json()
+
+    async def update(self, row: Dict[str, Any], filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        res = await self._send("PATCH", f"/{self.name}", params=filters, json=row, headers={"Prefer": "return=representation"})
+        return res.json()
+
+    async def delete(self, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        res = await self._send("DELETE", f"/{self.name}", params=filters, headers={"Prefer": "return=representation"})
+        return res.json()
+
+    async def rpc(self, params: Dict[str, Any]) -> Any:
+        # for a database function, name is "rpc/<function>"
+        res = await self._send("POST", f"/{self.name}", json=params)
+        return res.json()
+
+class AsyncRepository:
+    # Every PostgREST request a repository sends goes through its tables and is counted, so
+    # tests can assert how many round trips an endpoint costs.
+    round_trips = 0
+    collection = ""
+
+    def _table(self, name: str) -> PostgrestTable:
+        return PostgrestTable(self.pool, name, self)
+
+    def _changed(self, ids: Iterable[int] = ()):
+        # after every write: cached totals are stale and read caches drop what it touched
+        self.totals.invalidate()
+        versions.bump(self.collection, ids)
+
+def in_filter(ids: List[int]) -> str:
+    return f"in.({','.join(str(i) for i in ids)})"
+
+def _page_params(column: str, q: Optional[str], skip: int, limit: int, after: Optional[int]) -> Dict[str, str]:
+    params = {"select": "*", "order": "id", "limit": str(limit)}
+    if q:
+        params[column] = f"ilike.%{q}%"
+    # keyset seek on the primary key when a cursor is given, offset paging otherwise
+    if after is not None:
+        params["id"] = f"gt.{after}"
+    else:
+        params["offset"] = str(skip)
+    return params
+
+async def _page(table: PostgrestTable, column: str, totals: TotalCounter, q: Optional[str], skip: int, limit: int, after: Optional[Cursor]) -> Tuple[List[Dict[str, Any]], int]:
+    cached, generation = totals.get(q)
+    count = None if cached is not None else totals.count_method
+    rows, counted = await table.select(_page_params(column, q, skip, limit, after.id if after else None), count)
+    if cached is not None:
+        return rows, cached
+    total = (after.position if after else 0) + (counted or 0)
+    return rows, totals.put(q, total, generation)
+
+class AsyncPoliciesDB(AsyncRepository):
+    collection = "policies"
+
+    def __init__(self, pool: HttpPool, totals: Optional[TotalCounter] = None):
+        self.pool = pool
+        self.table = self._table("policies")
+        self.bulk_update = self._table("rpc/bulk_update_policies")
+        self.totals = totals or TotalCounter()
+
+    async def list(self, q: Optional[str], skip: int, limit: int, after: Optional[int] = None) -> List[PolicyOut]:
+        rows, _ = await self.table.select(_page_params("title", q, skip, limit, after))
+        return [PolicyOut(**row) for row in rows]
+
+    async def page(self, q: Optional[str], skip: int, limit: int, after: Optional[Cursor] = None) -> PaginatedResponse[PolicyOut]:
+        rows, total = await _page(self.table, "title", self.totals, q, skip, limit, after)
+        return page_response([PolicyOut(**row) for row in rows], total, skip, limit, after)
+
+    async def count(self) -> int:
+        _, total = await self.table.select({"select": "id", "limit": "0"}, count="exact")
+        return total or 0
+
+    async def create(self, payload: PolicyCreate) -> PolicyOut:
+        rows = await self.table.insert(payload.model_dump())
+        self._changed()
+        return PolicyOut(**rows[0])
+
+    async def get(self, policy_id: int) -> Optional[PolicyOut]:
+        rows, _ = await self.table.select({"select": "*", "id": f"eq.{policy_id}"})
+        return PolicyOut(**rows[0]) if rows else None
+
+    async def update(self, policy_id: int, payload: PolicyUpdate) -> Optional[PolicyOut]:
+        rows = await self.table.update(payload.model_dump(exclude_none=True), {"id": f"eq.{policy_id}"})
+        if not rows:
+            return None
+        self._changed([policy_id])
+        return PolicyOut(**rows[0])
+
+    async def delete(self, policy_id: int) -> bool:
+        rows = await self.table.delete({"id": f"eq.{policy_id}"})
+        if not rows:
+            return False
+        self._changed([policy_id])
+        return True
+
+    async def create_many(self, payloads: List[PolicyCreate]) -> List[PolicyOut]:
+        if not payloads:
+            return []
+        rows = await self.table.insert([p.model_dump() for p in payloads])
+        self._changed()
+        return [PolicyOut(**row) for row in rows]
+
+    async def update_many(self, payloads: List[PolicyBulkUpdate]) -> Dict[int, PolicyOut]:
+        # one statement carrying only the changed columns; the database merges them into the current rows
+        changes = merge_changes(payloads)
+        if not changes:
+            return {}
+        rows = await self.bulk_update.rpc({"changes": [{"id": i, **c} for i, c in changes.items()]})
+        updated = {row["id"]: PolicyOut(**row) for row in rows}
+        if updated:
+            self._changed(list(updated))
+        return updated
+
+    async def delete_many(self, policy_ids: List[int]) -> List[int]:
+        if not policy_ids:
+            return []
+        rows = await self.table.delete({"id": in_filter(policy_ids)})
+        deleted = [row["id"] for row in rows]
+        if deleted:
+            self._changed(deleted)
+        return deleted
+
+class AsyncRisksDB(AsyncRepository):
+    collection = "risks"
+
+    def __init__(self, pool: HttpPool, totals: Optional[TotalCounter] = None):
+        self.pool = pool
+        self.table = self._table("risks")
+        self.bulk_update = self._table("rpc/bulk_update_risks")
+        self.heatmap_view = self._table("risk_heatmap")
+        self.stats_view = self._table("risk_stats")
+        self.totals = totals or TotalCounter()
+
+    async def list(self, q: Optional[str], skip: int, limit: int, after: Optional[int] = None) -> List[RiskOut]:
+        rows, _ = await self.table.select(_page_params("title", q, skip, limit, after))
+        return [RiskOut(**row) for row in rows]
+
+    async def page(self, q: Optional[str], skip: int, limit: int, after: Optional[Cursor] = None) -> PaginatedResponse[RiskOut]:
+        rows, total = await _page(self.table, "title", self.totals, q, skip, limit, after)
+        return page_response([RiskOut(**row) for row in rows], total, skip, limit, after)
+
+    async def count(self) -> int:
+        _, total = await self.table.select({"select": "id", "limit": "0"}, count="exact")
+        return total or 0
+
+    async def create(self, payload: RiskCreate) -> RiskOut:
+        # score is generated by the database from impact and likelihood
+        rows = await self.table.insert(payload.model_dump())
+        self._changed()
+        return RiskOut(**rows[0])
+
+    async def get(self, risk_id: int) -> Optional[RiskOut]:
+        rows, _ = await self.table.select({"select": "*", "id": f"eq.{risk_id}"})
+        return RiskOut(**rows[0]) if rows else None
+
+    async def update(self, risk_id: int, payload: RiskUpdate) -> Optional[RiskOut]:
+        # one PATCH; the generated score comes back with the row
+        rows = await self.table.update(payload.model_dump(exclude_none=True), {"id": f"eq.{risk_id}"})
+        if not rows:
+            return None
+        self._changed([risk_id])
+        return RiskOut(**rows[0])
+
+    async def delete(self, risk_id: int) -> bool:
+        rows = await self.table.delete({"id": f"eq.{risk_id}"})
+        if not rows:
+            return False
+        self._changed([risk_id])
+        return True
+
+    async def create_many(self, payloads: List[RiskCreate]) -> List[RiskOut]:
+        if not payloads:
+            return []
+        rows = await self.table.insert([p.model_dump() for p in payloads])
+        self._changed()
+        return [RiskOut(**row) for row in rows]
+
+    async def update_many(self, payloads: List[RiskBulkUpdate]) -> Dict[int, RiskOut]:
+        # one statement carrying only the changed columns; score is regenerated by the database
+        changes = merge_changes(payloads)
+        if not changes:
+            return {}
+        rows = await self.bulk_update.rpc({"changes": [{"id": i, **c} for i, c in changes.items()]})
+        updated = {row["id"]: RiskOut(**row) for row in rows}
+        if updated:
+            self._changed(list(updated))
+        return updated
+
+    async def delete_many(self, risk_ids: List[int]) -> List[int]:
+        if not risk_ids:
+            return []
+        rows = await self.table.delete({"id": in_filter(risk_ids)})
+        deleted = [row["id"] for row in rows]
+        if deleted:
+            self._changed(deleted)
+        return deleted
+
+    async def heatmap(self) -> RiskHeatmap:
+        rows, _ = await self.heatmap_view.select({"select": "*"})
+        return heatmap_from_rows(rows)
+
+    async def stats(self, top: int = 10) -> RiskStats:
+        # the summary row and the top k are independent reads
+        (summary, _), (rows, _) = await asyncio.gather(
+            self.stats_view.select({"select": "*"}),
+            self.table.select({"select": "*", "order": "score.desc,id", "limit": str(top)}),
+        )
+        return stats_from_rows(summary[0], [RiskOut(**row) for row in rows])
+
+# both counts are stored on the framework row, kept current by merge_control_mappings
+COVERAGE_COLUMNS = "framework_id:id,name,controls:control_count,covered"
+
+def _framework(row: Dict[str, Any]) -> FrameworkOut:
+    return FrameworkOut(**{**row, "control_mappings": row.get("control_mappings") or {}})
+
+class AsyncComplianceDB(AsyncRepository):
+    collection = "frameworks"
+
+    def __init__(self, pool: HttpPool, totals: Optional[TotalCounter] = None):
+        self.pool = pool
+        self.frameworks = self._table("frameworks")
+        self.mappings = self._table("control_mappings")
+        self.unmapped_view = self._table("unmapped_controls")
+        self.merge_mappings = self._table("rpc/merge_control_mappings")
+        self.totals = totals or TotalCounter()
+        self.mapping_writes = Coalescer(self._merge_mappings)
+
+    async def list_frameworks(self, q: Optional[str], skip: int, limit: int, after: Optional[int] = None) -> List[FrameworkOut]:
+        rows, _ = await self.frameworks.select(_page_params("name", q, skip, limit, after))
+        return [_framework(row) for row in rows]
+
+    async def page_frameworks(self, q: Optional[str], skip: int, limit: int, after: Optional[Cursor] = None) -> PaginatedResponse[FrameworkOut]:
+        rows, total = await _page(self.frameworks, "name", self.totals, q, skip, limit, after)
+        return page_response([_framework(row) for row in rows], total, skip, limit, after)
+
+    async def count_frameworks(self) -> int:
+        _, total = await self.frameworks.select({"select": "id", "limit": "0"}, count="exact")
+        return total or 0
+
+    async def create_framework(self, payload: FrameworkCreate) -> FrameworkOut:
+        rows = await self.frameworks.insert({**payload.model_dump(), "control_mappings": {}})
+        self._changed()
+        return _framework(rows[0])
+
+    async def create_frameworks(self, payloads: List[FrameworkCreate]) -> List[FrameworkOut]:
+        if not payloads:
+            return []
+        rows = await self.frameworks.insert([{**p.model_dump(), "control_mappings": {}} for p in payloads])
+        self._changed()
+        return [_framework(row) for row in rows]
+
+    async def get_framework(self, framework_id: int) -> Optional[FrameworkOut]:
+        rows, _ = await self.frameworks.select({"select": "*", "id": f"eq.{framework_id}"})
+        return _framework(rows[0]) if rows else None
+
+    async def update_framework(self, framework_id: int, payload: FrameworkUpdate) -> Optional[FrameworkOut]:
+        rows = await self.frameworks.update(payload.model_dump(exclude_none=True), {"id": f"eq.{framework_id}"})
+        if not rows:
+            return None
+        self._changed([framework_id])
+        return _framework(rows[0])
+
+    async def map_controls(self, framework_id: int, mapping: Dict[str, List[int]]) -> bool:
+        # concurrent calls for one framework share a single merge
+        return await self.mapping_writes.submit(framework_id, mapping)
+
+    async def _merge_mappings(self, framework_id: int, mapping: Dict[str, List[int]]) -> bool:
+        # merged by the database in one call, which also updates control_mappings and the covered
+        # count, so nothing is read back and concurrent writers cannot overwrite each other
+        found = await self.merge_mappings.rpc({"framework_id": framework_id, "mapping": mapping})
+        if not found:
+            return False
+        versions.bump(self.collection, [framework_id])
+        return True
+
+    async def coverage(self, framework_id: int) -> Optional[FrameworkCoverage]:
+        rows, _ = await self.frameworks.select({"select": COVERAGE_COLUMNS, "id": f"eq.{framework_id}"})
+        return coverage_from_row(rows[0]) if rows else None
+
+    async def all_coverage(self) -> List[FrameworkCoverage]:
+        rows, _ = await self.frameworks.select({"select": COVERAGE_COLUMNS, "order": "id"})
+        return [coverage_from_row(row) for row in rows]
+
+    async def unmapped(self, framework_id: int) -> Optional[UnmappedControls]:
+        # the existence check runs alongside, so a fully covered framework is not a 404
+        (rows, _), found = await asyncio.gather(
+            self.unmapped_view.select({"select": "control", "framework_id": f"eq.{framework_id}", "order": "position"}),
+            self.coverage(framework_id),
+        )
+        if not found:
+            return None
+        return UnmappedControls(framework_id=framework_id, controls=[row["control"] for row in rows])
+
+    async def blast_radius(self, policy_id: int) -> PolicyBlastRadius:
+        # an index lookup on control_mappings.policy_id, with the framework names embedded
+        rows, _ = await self.mappings.select({"select": "framework_id,control,frameworks(name)", "policy_id": f"eq.{policy_id}"})
+        return blast_radius_from_rows(policy_id, [{**row, "name": row["frameworks"]["name"]} for row in rows])
+
+class PostgrestVersions:
+    # ETag versions from the table the README's triggers bump on every write to policies, risks
+    # and frameworks, including writes made outside the API. One small read per conditional GET,
+    # sent alongside a list's own query (utils/versions.py ConditionalRoute).
+    epoch = "pg"
+    remote = True
+
+    def __init__(self, pool: HttpPool, table: str = "versions"):
+        self.table = PostgrestTable(pool, table)
+
+    async def _version(self, key: str) -> Tuple[int, float]:
+        rows, _ = await self.table.select({"select": "version,modified", "key": f"eq.{key}"})
+        return (rows[0]["version"], rows[0]["modified"]) if rows else (0, 0.0)
+
+    async def collection_version(self, collection: str) -> Tuple[int, float]:
+        return await self._version(collection)
+
+    async def record_version(self, collection: str, record_id: int) -> Tuple[int, float]:
+        return await self._version(f"{collection}:{record_id}")
+
+def get_async_repos(http_pool: HttpPool) -> Optional[Dict[str, Any]]:
+    if not http_pool.configured:
+        return None
+    # without the versions table there is nothing shared to derive ETags from, so they stay off
+    table = os.getenv("VERSIONS_TABLE")
+    versions.use(PostgrestVersions(http_pool, table) if table else None)
+    return {
+        "policies": AsyncPoliciesDB(http_pool, TotalCounter(os.getenv("POLICIES_TOTAL_STRATEGY", "exact"))),
+        "risks": AsyncRisksDB(http_pool, TotalCounter(os.getenv("RISKS_TOTAL_STRATEGY", "exact"))),
+        "compliance": AsyncComplianceDB(http_pool, TotalCounter(os.getenv("FRAMEWORKS_TOTAL_STRATEGY", "exact")))
+    }
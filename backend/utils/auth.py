@@ -1,12 +1,87 @@
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from schemas.user import User
+from utils.metrics import auth_failures
 from utils.rbac import Role
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# a missing token is rejected in get_current_user rather than by the scheme, so it is counted
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+ROLE_VALUES = frozenset(r.value for r in Role)
+
+class AuthSettings:
+    def __init__(self, demo_mode: bool = False, jwt_secret: Optional[str] = None, default_role: str = Role.VIEWER.value):
+        self.demo_mode = demo_mode
+        self.jwt_secret = jwt_secret
+        # Allow configuring a default role when Supabase JWT lacks a role claim
+        self.default_role = default_role
+
+    @classmethod
+    def from_env(cls) -> "AuthSettings":
+        return cls(
+            demo_mode=os.getenv("DEMO_MODE", "false").lower() == "true",
+            jwt_secret=os.getenv("SUPABASE_JWT_SECRET"),
+            default_role=os.getenv("DEFAULT_ROLE", Role.VIEWER.value),
+        )
+
+class TokenCache:
+    # Verified token -> User, least recently used evicted first. Entries expire at the
+    # token's `exp` claim; tokens without one are never cached.
+    def __init__(self, maxsize: int = 1024, secret: Optional[str] = None):
+        self.maxsize = maxsize
+        self.secret = secret
+        self._entries: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[0]
+
+    def put(self, token: str, user: User, exp: Optional[float], secret: Optional[str]):
+        if self.maxsize <= 0 or exp is None:
+            return
+        with self._lock:
+            # verified under a secret that has since been rotated out
+            if secret != self.secret:
+                return
+            self._entries[token] = (user, float(exp))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def reset(self, secret: Optional[str]):
+        with self._lock:
+            self._entries.clear()
+            self.secret = secret
+
+_settings = AuthSettings.from_env()
+token_cache = TokenCache(int(os.getenv("TOKEN_CACHE_SIZE", "1024")), _settings.jwt_secret)
+
+def get_settings() -> AuthSettings:
+    return _settings
+
+def configure(settings: AuthSettings):
+    global _settings
+    # tokens verified under another secret must not outlive it
+    if settings.jwt_secret != token_cache.secret:
+        token_cache.reset(settings.jwt_secret)
+    _settings = settings
 
 def create_demo_token(role: str) -> str:
     return f"demo-{role}"
@@ -15,29 +90,45 @@ def parse_demo_token(token: str) -> Optional[User]:
     if not token.startswith("demo-"):
         return None
     role = token.replace("demo-", "")
-    if role not in [r.value for r in Role]:
+    if role not in ROLE_VALUES:
         return None
     return User(id="demo-user", email=f"demo@{role}.local", role=Role(role))
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    demo_mode = os.getenv("DEMO_MODE", "false").lower() == "true"
-    if demo_mode:
+async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> User:
+    # async, so it runs on the event loop instead of costing a threadpool hop per request:
+    # a token seen before is a cache lookup, a new one a single HMAC check
+    if not token:
+        auth_failures.inc("missing_token")
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return authenticate(token)
+    except HTTPException as e:
+        if e.status_code == 401:
+            auth_failures.inc("invalid_token")
+        raise
+
+def authenticate(token: str) -> User:
+    settings = _settings
+    if settings.demo_mode:
         user = parse_demo_token(token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid demo token")
         return user
 
-    secret = os.getenv("SUPABASE_JWT_SECRET")
-    if not secret:
+    if not settings.jwt_secret:
         raise HTTPException(status_code=500, detail="JWT secret not configured")
+    user = token_cache.get(token)
+    if user is not None:
+        return user
     try:
-        payload = jwt.decode(token, secret, algorithms=["HS256"])
-        email = payload.get("email") or payload.get("sub")
-        # Allow configuring a default role when Supabase JWT lacks a role claim
-        default_role = os.getenv("DEFAULT_ROLE", Role.VIEWER.value)
-        role = payload.get("role", default_role)
-        if role not in [r.value for r in Role]:
-            role = Role.VIEWER.value
-        return User(id=str(payload.get("user_id", "unknown")), email=email or "unknown", role=Role(role))
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token")
+    email = payload.get("email") or payload.get("sub")
+    role = payload.get("role", settings.default_role)
+    if role not in ROLE_VALUES:
+        role = Role.VIEWER.value
+    # Supabase puts the user id in `sub`; the rate limiter keys callers on it
+    user = User(id=str(payload.get("sub") or payload.get("user_id", "unknown")), email=email or "unknown", role=Role(role))
+    token_cache.put(token, user, payload.get("exp"), settings.jwt_secret)
+    return user
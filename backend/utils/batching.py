@@ -0,0 +1,51 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+MAP_COALESCE_MS = float(os.getenv("MAP_COALESCE_MS", "0"))
+
+class Coalescer:
+    # Group commit per key: while a write for a key is in flight, later submissions for the same
+    # key are merged (later values win) and go out together as the next write. Every caller gets
+    # the result of the write that carried its changes. `window_ms` optionally holds the first
+    # write back to gather more.
+    def __init__(self, write: Callable[[Any, Dict[str, Any]], Awaitable[Any]], window_ms: float = MAP_COALESCE_MS):
+        self._write = write
+        self._window = window_ms / 1000
+        self._pending: Dict[Any, Tuple[Dict[str, Any], List[asyncio.Future]]] = {}
+        self._busy: Set[Any] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.writes = 0
+
+    async def submit(self, key: Any, changes: Dict[str, Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        merged, waiters = self._pending.setdefault(key, ({}, []))
+        merged.update(changes)
+        waiters.append(future)
+        if key not in self._busy:
+            self._busy.add(key)
+            # the drain runs on its own so a cancelled caller does not strand the others
+            task = asyncio.ensure_future(self._drain(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await asyncio.shield(future)
+
+    async def _drain(self, key: Any):
+        try:
+            if self._window:
+                await asyncio.sleep(self._window)
+            while key in self._pending:
+                merged, waiters = self._pending.pop(key)
+                self.writes += 1
+                try:
+                    result = await self._write(key, merged)
+                except Exception as e:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                else:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_result(result)
+        finally:
+            self._busy.discard(key)
@@ -0,0 +1,40 @@
+import os
+from typing import Any, Dict, List, Sequence, Tuple, Type, TypeVar
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from schemas.common import BulkError
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+M = TypeVar("M", bound=BaseModel)
+
+def check_size(items: Sequence):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per bulk request")
+
+def bulk_body(model: Type[BaseModel]) -> Dict[str, Any]:
+    # the body is taken as List[Any] so items can be validated one by one; this puts the item schema back in OpenAPI
+    schema = {"type": "array", "items": model.model_json_schema(), "maxItems": BULK_MAX_ITEMS}
+    return {"requestBody": {"content": {"application/json": {"schema": schema}}, "required": True}}
+
+def validate_items(model: Type[M], raw: List[Any]) -> Tuple[List[Tuple[int, M]], List[BulkError]]:
+    # one pass over the batch; invalid items are reported by index instead of failing the request
+    check_size(raw)
+    valid, errors = [], []
+    for index, item in enumerate(raw):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            item_id = item.get("id") if isinstance(item, dict) and isinstance(item.get("id"), int) else None
+            errors.append(BulkError(index=index, id=item_id, detail=e.errors(include_url=False, include_context=False)))
+    return valid, errors
+
+def merge_changes(payloads: Sequence[BaseModel]) -> Dict[int, Dict[str, Any]]:
+    # later updates to the same id win, so each row is written once
+    changes: Dict[int, Dict[str, Any]] = {}
+    for payload in payloads:
+        changes.setdefault(payload.id, {}).update(payload.model_dump(exclude_none=True, exclude={"id"}))
+    return changes
+
+def missing(valid: List[Tuple[int, Any]], found, detail: str) -> List[BulkError]:
+    return [BulkError(index=index, id=payload.id, detail=detail) for index, payload in valid if payload.id not in found]
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from utils.versions import versions
+
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "30"))
+CACHE_NEGATIVE_TTL_S = float(os.getenv("CACHE_NEGATIVE_TTL_S", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# repository name -> (collection, the single-record read that goes through the cache)
+CACHED_READS = {
+    "policies": ("policies", "get"),
+    "risks": ("risks", "get"),
+    "compliance": ("frameworks", "get_framework"),
+}
+
+class ReadCache:
+    # In-process LRU of one collection's records by id, bounded by size and TTL. A lookup that
+    # found nothing is cached too, for a shorter TTL. Every write through the API bumps the
+    # collection's version, which drops the ids it touched here, or every cached miss when the
+    # ids are not known yet (a create). Concurrent misses on one key share a single fetch.
+    def __init__(self, collection: str, ttl: float = CACHE_TTL_S, negative_ttl: float = CACHE_NEGATIVE_TTL_S,
+                 max_entries: int = CACHE_MAX_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.collection = collection
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # bumped by every write; a fetch that overlapped a write is served but not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        versions.watch(self)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def _store(self, key: Hashable, value: Any, generation: int):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            if generation != self._generation or ttl <= 0:
+                return
+            self._entries[key] = (value, self.clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    self.misses += 1
+                    future = asyncio.get_running_loop().create_future()
+                    self._inflight[key] = future
+                    generation = self._generation
+                else:
+                    self.coalesced += 1
+            if leader:
+                return await self._fetch(key, load, future, generation)
+            # wait without propagating our own cancellation into the shared fetch
+            await asyncio.wait([future])
+            if not future.cancelled():
+                return future.result()
+            # the fetching request went away; the next caller in line fetches instead
+
+    async def _fetch(self, key: Hashable, load: Callable[[], Awaitable[Any]], future: asyncio.Future, generation: int) -> Any:
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # waiters re-raise it; don't log it as never retrieved when there are none
+            future.exception()
+            raise
+        else:
+            self._store(key, value, generation)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def changed(self, collection: str, ids: List[int]):
+        if collection != self.collection:
+            return
+        with self._lock:
+            self._generation += 1
+            if ids:
+                for record_id in ids:
+                    self._entries.pop(record_id, None)
+                    self._inflight.pop(record_id, None)
+            else:
+                for key in [k for k, (value, _) in self._entries.items() if value is None]:
+                    del self._entries[key]
+                self._inflight.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "collection": self.collection,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+class CachedRepo:
+    # Async repository whose single-record read goes through a ReadCache; every other
+    # attribute (writes included) is the wrapped repository's own.
+    def __init__(self, repo: Any, cache: ReadCache, read: str = "get"):
+        self.repo = repo
+        self.cache = cache
+        self.read = read
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.repo, name)
+        if name != self.read:
+            return attr
+
+        async def get(record_id: int):
+            return await self.cache.get(record_id, lambda: attr(record_id))
+
+        return get
+
+def cache_enabled(collection: str) -> bool:
+    # POLICIES_CACHE / RISKS_CACHE / FRAMEWORKS_CACHE=false switch an entity off
+    return os.getenv(f"{collection.upper()}_CACHE", "true").lower() == "true"
+
+def with_caches(repos: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Dict[str, ReadCache]]:
+    if not repos:
+        return repos, {}
+    caches: Dict[str, ReadCache] = {}
+    wrapped = dict(repos)
+    for name, (collection, read) in CACHED_READS.items():
+        if name in repos and cache_enabled(collection):
+            caches[collection] = ReadCache(collection)
+            wrapped[name] = CachedRepo(repos[name], caches[collection], read)
+    return wrapped, caches
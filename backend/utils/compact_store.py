@@ -0,0 +1,198 @@
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from schemas.policy import PolicyCreate, PolicyOut
+from schemas.risk import RiskCreate, RiskOut, RiskHeatmap, RiskStats
+from schemas.common import PaginatedResponse
+from utils.aggregates import RiskAggregates
+from utils.bulk import merge_changes
+from utils.pagination import Cursor, page_ids, page_response, remove_id
+from utils.search import CompactTrigramIndex
+from utils.versions import versions
+
+class Columns:
+    # Rows stored column-wise at position id - 1 (the stores hand ids out in order and never
+    # reuse them): `small` fields in byte arrays, the rest in lists. Strings in `shared` fields
+    # are interned, so an owner or status repeated across a million rows is stored once, and
+    # their lists are kept as tuples.
+    def __init__(self, fields: Tuple[str, ...], small: Tuple[str, ...] = (), shared: Tuple[str, ...] = ()):
+        self._columns = {field: array("b") if field in small else [] for field in fields}
+        self._shared = set(shared)
+        self._live = bytearray()
+
+    def __contains__(self, key: int) -> bool:
+        return 0 < key <= len(self._live) and self._live[key - 1] == 1
+
+    def _pack(self, field: str, value: Any) -> Any:
+        if value is None or field not in self._shared:
+            return value
+        return tuple(sys.intern(v) for v in value) if isinstance(value, list) else sys.intern(value)
+
+    def append(self, data: Dict[str, Any]) -> int:
+        shared = self._shared
+        for field, column in self._columns.items():
+            value = data.get(field)
+            column.append(self._pack(field, value) if field in shared else value)
+        self._live.append(1)
+        return len(self._live)
+
+    def row(self, key: int) -> Dict[str, Any]:
+        i = key - 1
+        data = {}
+        for field, column in self._columns.items():
+            value = column[i]
+            data[field] = list(value) if type(value) is tuple else value
+        return data
+
+    def value(self, key: int, field: str) -> Any:
+        return self._columns[field][key - 1]
+
+    def update(self, key: int, data: Dict[str, Any]):
+        for field, value in data.items():
+            if field in self._columns:
+                self._columns[field][key - 1] = self._pack(field, value)
+
+    def remove(self, key: int) -> bool:
+        if key not in self:
+            return False
+        self._live[key - 1] = 0
+        for column in self._columns.values():
+            if isinstance(column, list):
+                column[key - 1] = None
+        return True
+
+class CompactStore:
+    # The in-memory store interface over Columns, an id array and a CompactTrigramIndex. Models
+    # are only built for the records a call returns.
+    collection = ""
+    column = "title"
+    model: Type[BaseModel] = BaseModel
+    fields: Tuple[str, ...] = ()
+    small: Tuple[str, ...] = ()
+    shared: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self._rows = Columns(self.fields, self.small, self.shared)
+        self._ids = array("q")
+        self._index = CompactTrigramIndex()
+
+    def _item(self, key: int) -> Any:
+        return self.model(id=key, **self._rows.row(key))
+
+    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[int] = None) -> List[Any]:
+        ids = self._index.search(q) if q else self._ids
+        return [self._item(i) for i in page_ids(ids, skip, limit, after)]
+
+    def page(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse:
+        ids = self._index.search(q) if q else self._ids
+        items = [self._item(i) for i in page_ids(ids, skip, limit, after.id if after else None)]
+        return page_response(items, len(ids), skip, limit, after)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _insert(self, data: Dict[str, Any]) -> int:
+        key = self._rows.append(data)
+        self._ids.append(key)
+        self._index.add(key, data[self.column])
+        return key
+
+    def _change(self, key: int, data: Dict[str, Any]) -> bool:
+        if key not in self._rows:
+            return False
+        self._rows.update(key, data)
+        if self.column in data:
+            self._index.add(key, data[self.column])
+        return True
+
+    def _remove(self, key: int) -> bool:
+        if not self._rows.remove(key):
+            return False
+        remove_id(self._ids, key)
+        self._index.remove(key)
+        return True
+
+    def create(self, payload: BaseModel) -> Any:
+        return self.create_many([payload])[0]
+
+    def create_many(self, payloads: List[BaseModel]) -> List[Any]:
+        keys = [self._insert(payload.model_dump()) for payload in payloads]
+        if keys:
+            versions.bump(self.collection)
+        return [self._item(key) for key in keys]
+
+    def get(self, record_id: int) -> Optional[Any]:
+        return self._item(record_id) if record_id in self._rows else None
+
+    def update(self, record_id: int, payload: BaseModel) -> Optional[Any]:
+        if not self._change(record_id, payload.model_dump(exclude_none=True)):
+            return None
+        versions.bump(self.collection, [record_id])
+        return self._item(record_id)
+
+    def update_many(self, payloads: List[BaseModel]) -> Dict[int, Any]:
+        updated = [key for key, data in merge_changes(payloads).items() if self._change(key, data)]
+        if updated:
+            versions.bump(self.collection, updated)
+        return {key: self._item(key) for key in updated}
+
+    def delete(self, record_id: int) -> bool:
+        return bool(self.delete_many([record_id]))
+
+    def delete_many(self, ids: List[int]) -> List[int]:
+        deleted = [key for key in ids if self._remove(key)]
+        if deleted:
+            versions.bump(self.collection, deleted)
+        return deleted
+
+class CompactPoliciesStore(CompactStore):
+    collection = "policies"
+    model = PolicyOut
+    fields = ("title", "description", "status", "reviewers", "file_url")
+    shared = ("status", "reviewers")
+
+    def __init__(self):
+        super().__init__()
+        # seed
+        self.create(PolicyCreate(title="Information Security Policy", description="Base IS policy", status="Approved"))
+
+class CompactRisksStore(CompactStore):
+    collection = "risks"
+    model = RiskOut
+    fields = ("title", "description", "impact", "likelihood", "score", "mitigation", "owner")
+    small = ("impact", "likelihood", "score")
+    shared = ("mitigation", "owner")
+
+    def __init__(self):
+        super().__init__()
+        self._stats = RiskAggregates()
+        # seed
+        self.create(RiskCreate(title="Data Breach", description="Unauthorized access", impact=5, likelihood=3))
+
+    def _insert(self, data: Dict[str, Any]) -> int:
+        data["score"] = data["impact"] * data["likelihood"]
+        key = super()._insert(data)
+        self._stats.add_values(key, data["impact"], data["likelihood"])
+        return key
+
+    def _change(self, key: int, data: Dict[str, Any]) -> bool:
+        if key not in self._rows:
+            return False
+        impact, likelihood = self._rows.value(key, "impact"), self._rows.value(key, "likelihood")
+        self._stats.remove_values(key, impact, likelihood)
+        impact, likelihood = data.get("impact", impact), data.get("likelihood", likelihood)
+        super()._change(key, {**data, "score": impact * likelihood})
+        self._stats.add_values(key, impact, likelihood)
+        return True
+
+    def _remove(self, key: int) -> bool:
+        if key in self._rows:
+            self._stats.remove_values(key, self._rows.value(key, "impact"), self._rows.value(key, "likelihood"))
+        return super()._remove(key)
+
+    def heatmap(self) -> RiskHeatmap:
+        return RiskHeatmap(cells=[list(row) for row in self._stats.cells], total=self._stats.total)
+
+    def stats(self, top: int = 10) -> RiskStats:
+        return RiskStats(top=[self._item(i) for i in self._stats.top_ids(top)], **self._stats.summary())
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from schemas.compliance import FrameworkControls, FrameworkCoverage, PolicyBlastRadius, UnmappedControls
+
+def coverage_percent(covered: int, controls: int) -> float:
+    return round(100.0 * covered / controls, 2) if controls else 0.0
+
+class _Framework:
+    def __init__(self, name: str):
+        self.name = name
+        self.controls: Dict[str, None] = {}  # declared controls, in order
+        self.mapped: Dict[str, Set[int]] = {}
+        self.covered = 0
+
+class CoverageIndex:
+    # Policy -> {(framework, control)} and per-framework covered-control counters, updated on
+    # every framework or mapping change so coverage reads are O(1) and a policy's blast radius
+    # is proportional to what it touches. A control counts as covered when it is declared on
+    # the framework and mapped to at least one policy.
+    def __init__(self):
+        self._frameworks: Dict[int, _Framework] = {}
+        self._by_policy: Dict[int, Set[Tuple[int, str]]] = defaultdict(set)
+
+    def set_framework(self, framework_id: int, name: str, controls: Iterable[str]):
+        fw = self._frameworks.get(framework_id)
+        if fw is None:
+            fw = self._frameworks[framework_id] = _Framework(name)
+        fw.name = name
+        fw.controls = dict.fromkeys(controls)
+        fw.covered = sum(1 for c in fw.controls if fw.mapped.get(c))
+
+    def remove_framework(self, framework_id: int):
+        fw = self._frameworks.pop(framework_id, None)
+        if fw is None:
+            return
+        for control, policies in fw.mapped.items():
+            for policy_id in policies:
+                self._unlink(policy_id, framework_id, control)
+
+    def map(self, framework_id: int, control: str, policy_ids: Iterable[int]):
+        # replaces the policies mapped to one control, as `control_mappings.update` does
+        fw = self._frameworks[framework_id]
+        before = fw.mapped.get(control) or set()
+        after = set(policy_ids)
+        for policy_id in before - after:
+            self._unlink(policy_id, framework_id, control)
+        for policy_id in after - before:
+            self._by_policy[policy_id].add((framework_id, control))
+        if control in fw.controls and bool(before) != bool(after):
+            fw.covered += 1 if after else -1
+        if after:
+            fw.mapped[control] = after
+        else:
+            fw.mapped.pop(control, None)
+
+    def _unlink(self, policy_id: int, framework_id: int, control: str):
+        pairs = self._by_policy.get(policy_id)
+        if pairs is None:
+            return
+        pairs.discard((framework_id, control))
+        if not pairs:
+            del self._by_policy[policy_id]
+
+    def coverage(self, framework_id: int) -> Optional[FrameworkCoverage]:
+        fw = self._frameworks.get(framework_id)
+        if fw is None:
+            return None
+        return FrameworkCoverage(framework_id=framework_id, name=fw.name, controls=len(fw.controls), covered=fw.covered,
+                                 percent=coverage_percent(fw.covered, len(fw.controls)))
+
+    def all_coverage(self) -> List[FrameworkCoverage]:
+        return [self.coverage(framework_id) for framework_id in sorted(self._frameworks)]
+
+    def unmapped(self, framework_id: int) -> Optional[UnmappedControls]:
+        fw = self._frameworks.get(framework_id)
+        if fw is None:
+            return None
+        mapped = fw.mapped
+        return UnmappedControls(framework_id=framework_id, controls=[c for c in fw.controls if c not in mapped])
+
+    def blast_radius(self, policy_id: int) -> PolicyBlastRadius:
+        grouped: Dict[int, List[str]] = defaultdict(list)
+        for framework_id, control in self._by_policy.get(policy_id, ()):
+            grouped[framework_id].append(control)
+        mappings = [FrameworkControls(framework_id=fid, name=self._frameworks[fid].name, controls=sorted(controls))
+                    for fid, controls in sorted(grouped.items())]
+        return PolicyBlastRadius(policy_id=policy_id, frameworks=len(mappings), controls=sum(len(m.controls) for m in mappings), mappings=mappings)
+
+# Supabase side: the framework_coverage, unmapped_controls and policy_controls views (see README)
+def coverage_from_row(row: Dict) -> FrameworkCoverage:
+    return FrameworkCoverage(percent=coverage_percent(row["covered"], row["controls"]), **row)
+
+def blast_radius_from_rows(policy_id: int, rows: List[Dict]) -> PolicyBlastRadius:
+    grouped: Dict[int, FrameworkControls] = {}
+    for row in rows:
+        entry = grouped.get(row["framework_id"])
+        if entry is None:
+            entry = grouped[row["framework_id"]] = FrameworkControls(framework_id=row["framework_id"], name=row["name"], controls=[])
+        entry.controls.append(row["control"])
+    mappings = [grouped[fid] for fid in sorted(grouped)]
+    for m in mappings:
+        m.controls.sort()
+    return PolicyBlastRadius(policy_id=policy_id, frameworks=len(mappings), controls=len(rows), mappings=mappings)
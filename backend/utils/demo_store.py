@@ -1,21 +1,44 @@
-from typing import List, Optional, Dict
-from schemas.policy import PolicyCreate, PolicyUpdate, PolicyOut
-from schemas.risk import RiskCreate, RiskUpdate, RiskOut
-from schemas.compliance import FrameworkCreate, FrameworkUpdate, FrameworkOut
-from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowTransition, WorkflowStatus
+import os
+from typing import Any, List, Optional, Dict, Tuple
+from starlette.concurrency import run_in_threadpool
+from schemas.policy import PolicyCreate, PolicyUpdate, PolicyBulkUpdate, PolicyOut
+from schemas.risk import RiskCreate, RiskUpdate, RiskBulkUpdate, RiskOut, RiskHeatmap, RiskStats
+from schemas.compliance import FrameworkCreate, FrameworkUpdate, FrameworkOut, FrameworkCoverage, UnmappedControls, PolicyBlastRadius
+from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowTransition, WorkflowStatus, WorkflowStageQueue
+from schemas.common import BulkError, PaginatedResponse
+from utils.async_db import HttpPool
+from utils.pagination import Cursor, page_ids, page_response, remove_id
+from utils.search import TrigramIndex
+from utils.aggregates import RiskAggregates
+from utils.coverage import CoverageIndex
+from utils.versions import LocalVersions, versions
+from utils.journal import WORKFLOW_SNAPSHOT_EVERY, Journal, JournalLocked
+from utils.compact_store import CompactPoliciesStore, CompactRisksStore
+from utils.sqlite_store import SqliteComplianceStore, SqliteDB, SqlitePoliciesStore, SqliteRisksStore
+from utils.workflow import WorkflowEngine
+
+# memory (default): per-process dicts, seeded for demos. compact: per-process too, with policies and
+# risks stored column-wise for large registers. sqlite: one WAL database file at SQLITE_PATH shared by
+# every worker, for on-prem deployments without Supabase.
+LOCAL_STORE = os.getenv("LOCAL_STORE", "memory")
 
 class PoliciesStore:
     def __init__(self):
         self._items: Dict[int, PolicyOut] = {}
+        self._ids: List[int] = []
+        self._index = TrigramIndex()
         self._seq = 1
         # seed
         self.create(PolicyCreate(title="Information Security Policy", description="Base IS policy", status="Approved"))
 
-    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20) -> List[PolicyOut]:
-        items = list(self._items.values())
-        if q:
-            items = [i for i in items if q.lower() in i.title.lower()]
-        return items[skip: skip + limit]
+    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[int] = None) -> List[PolicyOut]:
+        ids = self._index.search(q) if q else self._ids
+        return [self._items[i] for i in page_ids(ids, skip, limit, after)]
+
+    def page(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse[PolicyOut]:
+        ids = self._index.search(q) if q else self._ids
+        items = [self._items[i] for i in page_ids(ids, skip, limit, after.id if after else None)]
+        return page_response(items, len(ids), skip, limit, after)
 
     def count(self) -> int:
         return len(self._items)
@@ -23,7 +46,10 @@ class PoliciesStore:
     def create(self, payload: PolicyCreate) -> PolicyOut:
         item = PolicyOut(id=self._seq, **payload.model_dump())
         self._items[self._seq] = item
+        self._ids.append(self._seq)
+        self._index.add(self._seq, item.title)
         self._seq += 1
+        versions.bump("policies")
         return item
 
     def get(self, policy_id: int) -> Optional[PolicyOut]:
@@ -37,23 +63,50 @@ class PoliciesStore:
         data.update({k: v for k, v in payload.model_dump(exclude_none=True).items()})
         updated = PolicyOut(**data)
         self._items[policy_id] = updated
+        self._index.add(policy_id, updated.title)
+        versions.bump("policies", [policy_id])
         return updated
 
     def delete(self, policy_id: int) -> bool:
-        return self._items.pop(policy_id, None) is not None
+        if self._items.pop(policy_id, None) is None:
+            return False
+        self._index.remove(policy_id)
+        remove_id(self._ids, policy_id)
+        versions.bump("policies", [policy_id])
+        return True
+
+    def create_many(self, payloads: List[PolicyCreate]) -> List[PolicyOut]:
+        return [self.create(p) for p in payloads]
+
+    def update_many(self, payloads: List[PolicyBulkUpdate]) -> Dict[int, PolicyOut]:
+        updated = {}
+        for p in payloads:
+            item = self.update(p.id, p)
+            if item:
+                updated[p.id] = item
+        return updated
+
+    def delete_many(self, policy_ids: List[int]) -> List[int]:
+        return [i for i in policy_ids if self.delete(i)]
 
 class RisksStore:
     def __init__(self):
         self._items: Dict[int, RiskOut] = {}
+        self._ids: List[int] = []
+        self._index = TrigramIndex()
+        self._stats = RiskAggregates()
         self._seq = 1
         # seed
         self.create(RiskCreate(title="Data Breach", description="Unauthorized access", impact=5, likelihood=3))
 
-    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20) -> List[RiskOut]:
-        items = list(self._items.values())
-        if q:
-            items = [i for i in items if q.lower() in i.title.lower()]
-        return items[skip: skip + limit]
+    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[int] = None) -> List[RiskOut]:
+        ids = self._index.search(q) if q else self._ids
+        return [self._items[i] for i in page_ids(ids, skip, limit, after)]
+
+    def page(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse[RiskOut]:
+        ids = self._index.search(q) if q else self._ids
+        items = [self._items[i] for i in page_ids(ids, skip, limit, after.id if after else None)]
+        return page_response(items, len(ids), skip, limit, after)
 
     def count(self) -> int:
         return len(self._items)
@@ -62,7 +115,11 @@ class RisksStore:
         score = payload.impact * payload.likelihood
         item = RiskOut(id=self._seq, score=score, **payload.model_dump())
         self._items[self._seq] = item
+        self._ids.append(self._seq)
+        self._index.add(self._seq, item.title)
+        self._stats.add(item)
         self._seq += 1
+        versions.bump("risks")
         return item
 
     def get(self, risk_id: int) -> Optional[RiskOut]:
@@ -77,22 +134,59 @@ class RisksStore:
         data["score"] = data["impact"] * data["likelihood"]
         updated = RiskOut(**data)
         self._items[risk_id] = updated
+        self._index.add(risk_id, updated.title)
+        self._stats.remove(existing)
+        self._stats.add(updated)
+        versions.bump("risks", [risk_id])
         return updated
 
     def delete(self, risk_id: int) -> bool:
-        return self._items.pop(risk_id, None) is not None
+        existing = self._items.pop(risk_id, None)
+        if existing is None:
+            return False
+        self._index.remove(risk_id)
+        remove_id(self._ids, risk_id)
+        self._stats.remove(existing)
+        versions.bump("risks", [risk_id])
+        return True
+
+    def heatmap(self) -> RiskHeatmap:
+        return RiskHeatmap(cells=[list(row) for row in self._stats.cells], total=self._stats.total)
+
+    def stats(self, top: int = 10) -> RiskStats:
+        return RiskStats(top=[self._items[i] for i in self._stats.top_ids(top)], **self._stats.summary())
+
+    def create_many(self, payloads: List[RiskCreate]) -> List[RiskOut]:
+        return [self.create(p) for p in payloads]
+
+    def update_many(self, payloads: List[RiskBulkUpdate]) -> Dict[int, RiskOut]:
+        updated = {}
+        for p in payloads:
+            item = self.update(p.id, p)
+            if item:
+                updated[p.id] = item
+        return updated
+
+    def delete_many(self, risk_ids: List[int]) -> List[int]:
+        return [i for i in risk_ids if self.delete(i)]
 
 class ComplianceStore:
     def __init__(self):
         self._items: Dict[int, FrameworkOut] = {}
+        self._ids: List[int] = []
+        self._index = TrigramIndex()
+        self._coverage = CoverageIndex()
         self._seq = 1
         self.create(FrameworkCreate(name="ISO 27001", description="Information Security Management", controls=["A.5.1", "A.8.2"]))
 
-    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20) -> List[FrameworkOut]:
-        items = list(self._items.values())
-        if q:
-            items = [i for i in items if q.lower() in i.name.lower()]
-        return items[skip: skip + limit]
+    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[int] = None) -> List[FrameworkOut]:
+        ids = self._index.search(q) if q else self._ids
+        return [self._items[i] for i in page_ids(ids, skip, limit, after)]
+
+    def page(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse[FrameworkOut]:
+        ids = self._index.search(q) if q else self._ids
+        items = [self._items[i] for i in page_ids(ids, skip, limit, after.id if after else None)]
+        return page_response(items, len(ids), skip, limit, after)
 
     def count(self) -> int:
         return len(self._items)
@@ -100,9 +194,19 @@ class ComplianceStore:
     def create(self, payload: FrameworkCreate) -> FrameworkOut:
         item = FrameworkOut(id=self._seq, control_mappings={}, **payload.model_dump())
         self._items[self._seq] = item
+        self._ids.append(self._seq)
+        self._index.add(self._seq, item.name)
+        self._coverage.set_framework(self._seq, item.name, item.controls)
         self._seq += 1
+        versions.bump("frameworks")
         return item
 
+    def create_many(self, payloads: List[FrameworkCreate]) -> List[FrameworkOut]:
+        return [self.create(p) for p in payloads]
+
+    def get(self, framework_id: int) -> Optional[FrameworkOut]:
+        return self._items.get(framework_id)
+
     def update(self, framework_id: int, payload: FrameworkUpdate) -> Optional[FrameworkOut]:
         existing = self._items.get(framework_id)
         if not existing:
@@ -111,6 +215,9 @@ class ComplianceStore:
         data.update({k: v for k, v in payload.model_dump(exclude_none=True).items()})
         updated = FrameworkOut(**data)
         self._items[framework_id] = updated
+        self._index.add(framework_id, updated.name)
+        self._coverage.set_framework(framework_id, updated.name, updated.controls)
+        versions.bump("frameworks", [framework_id])
         return updated
 
     def map_controls(self, framework_id: int, mapping: Dict[str, List[int]]) -> bool:
@@ -119,47 +226,155 @@ class ComplianceStore:
             return False
         existing.control_mappings.update(mapping)
         self._items[framework_id] = existing
+        for control, policy_ids in mapping.items():
+            self._coverage.map(framework_id, control, policy_ids)
+        versions.bump("frameworks", [framework_id])
         return True
 
+    def coverage(self, framework_id: int) -> Optional[FrameworkCoverage]:
+        return self._coverage.coverage(framework_id)
+
+    def all_coverage(self) -> List[FrameworkCoverage]:
+        return self._coverage.all_coverage()
+
+    def unmapped(self, framework_id: int) -> Optional[UnmappedControls]:
+        return self._coverage.unmapped(framework_id)
+
+    def blast_radius(self, policy_id: int) -> PolicyBlastRadius:
+        return self._coverage.blast_radius(policy_id)
+
 class WorkflowsStore:
-    def __init__(self):
-        self._config = WorkflowConfig(role_order=["L1", "L2", "L3"])  # labels not tied to RBAC
-        self._requests: Dict[str, WorkflowStatus] = {}
+    # With a journal directory, every change is journaled and the engine is rebuilt from the
+    # snapshot and journal, so pending approvals survive restarts. The app calls open() at
+    # startup; otherwise the journal is recovered on first use.
+    def __init__(self, journal_dir: Optional[str] = None, snapshot_every: int = WORKFLOW_SNAPSHOT_EVERY):
+        self._journal_dir = journal_dir
+        self._snapshot_every = snapshot_every
+        self._journal: Optional[Journal] = None
+        self._state: Optional[WorkflowEngine] = None
+
+    @property
+    def _engine(self) -> WorkflowEngine:
+        if self._state is None:
+            self._state = self._recover() if self._journal_dir else WorkflowEngine(DEFAULT_WORKFLOW)
+        return self._state
+
+    def open(self):
+        # takes the journal's lock now, so a second worker fails at startup rather than with a
+        # 500 on its first workflow request
+        try:
+            self._engine
+        except JournalLocked:
+            raise JournalLocked(
+                f"Workflow journal {self._journal_dir} is locked by another process. With WORKFLOW_JOURNAL_DIR set, "
+                "run a single worker (no --workers), or give each instance its own directory") from None
+
+    def _recover(self) -> WorkflowEngine:
+        self._journal = Journal(self._journal_dir, self._snapshot_every)
+        snapshot, records = self._journal.recover()
+        engine = WorkflowEngine.restore(snapshot) if snapshot else WorkflowEngine(DEFAULT_WORKFLOW)
+        for record in records:
+            _replay(engine, record)
+        self._journal.snapshots(engine.snapshot)
+        return engine
+
+    def _log(self, record: Dict[str, Any]):
+        if self._journal is not None:
+            self._journal.append(record)
+
+    async def commit(self):
+        # returns once every change made so far is on disk
+        if self._journal is not None:
+            await self._journal.commit()
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._state = None
 
     def get_config(self) -> WorkflowConfig:
-        return self._config
+        return self._engine.config
 
     def set_config(self, config: WorkflowConfig):
-        self._config = config
+        self._engine.set_config(config)
+        self._log({"op": "config", "role_order": config.role_order})
 
     def create_request(self, req: WorkflowRequest) -> WorkflowStatus:
-        status = WorkflowStatus(request_id=req.request_id, status="Pending", stage=self._config.role_order[req.current_stage_index])
-        self._requests[req.request_id] = status
+        status = self._engine.create(req)
+        self._log({"op": "create", "request": req.model_dump()})
         return status
 
+    def get_request(self, request_id: str) -> Optional[WorkflowStatus]:
+        return self._engine.get(request_id)
+
     def transition(self, tr: WorkflowTransition) -> Optional[WorkflowStatus]:
-        status = self._requests.get(tr.request_id)
-        if not status:
-            return None
-        if tr.action == "approve":
-            # move to next stage or approve
-            current_index = self._config.role_order.index(status.stage) if status.stage in self._config.role_order else 0
-            if current_index + 1 < len(self._config.role_order):
-                status.stage = self._config.role_order[current_index + 1]
-                status.status = "Pending"
-            else:
-                status.status = "Approved"
-                status.stage = None
-            self._requests[tr.request_id] = status
-            return status
-        elif tr.action == "reject":
-            current_index = self._config.role_order.index(status.stage) if status.stage in self._config.role_order else 0
-            if current_index - 1 >= 0:
-                status.stage = self._config.role_order[current_index - 1]
-                status.status = "Pending"
-            else:
-                status.status = "Rejected"
-                status.stage = None
-            self._requests[tr.request_id] = status
-            return status
-        return None
\ No newline at end of file
+        status = self._engine.transition(tr)
+        if status:
+            self._log({"op": "transition", "request_id": tr.request_id, "action": tr.action})
+        return status
+
+    def transition_many(self, action: str, request_ids: List[str], stage: Optional[str] = None) -> Tuple[List[WorkflowStatus], List[BulkError]]:
+        items, errors = self._engine.transition_many(action, request_ids, stage)
+        if items:
+            # replaying the whole batch reproduces the same outcome, failures included
+            self._log({"op": "batch", "action": action, "request_ids": request_ids, "stage": stage})
+        return items, errors
+
+    def queue(self, stage: str, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse[WorkflowStatus]:
+        return self._engine.queue(stage, limit, after)
+
+    def stages(self) -> List[WorkflowStageQueue]:
+        return self._engine.stages()
+
+DEFAULT_WORKFLOW = WorkflowConfig(role_order=["L1", "L2", "L3"])  # labels not tied to RBAC
+
+def _replay(engine: WorkflowEngine, record: Dict[str, Any]):
+    op = record["op"]
+    if op == "create":
+        engine.create(WorkflowRequest(**record["request"]))
+    elif op == "transition":
+        engine.move(record["request_id"], record["action"])
+    elif op == "batch":
+        engine.transition_many(record["action"], record["request_ids"], record["stage"])
+    elif op == "config":
+        engine.set_config(WorkflowConfig(role_order=record["role_order"]))
+
+class AsyncStore:
+    # What the routes hold when Supabase is not configured: every call is awaited like the
+    # repositories'. The memory stores answer inline; the SQLite ones run in the threadpool, since a
+    # write can wait up to SQLITE_BUSY_TIMEOUT_MS on another worker's lock and that wait must not
+    # hold up the event loop.
+    def __init__(self, store: Any, threaded: bool = False):
+        self.store = store
+        self.threaded = threaded
+
+    def __getattr__(self, name: str):
+        method = getattr(self.store, name)
+
+        async def call(*args, **kwargs):
+            if self.threaded:
+                return await run_in_threadpool(method, *args, **kwargs)
+            return method(*args, **kwargs)
+        return call
+
+_sqlite: Optional[SqliteDB] = None
+
+def local_store(name: str) -> AsyncStore:
+    global _sqlite
+    if LOCAL_STORE == "sqlite":
+        if _sqlite is None:
+            # opened lazily on first query; ETags come from the versions it keeps, unless the
+            # routes are served from Supabase, whose writes it never sees
+            _sqlite = SqliteDB()
+            if not HttpPool.from_env().configured:
+                versions.use(_sqlite)
+        return AsyncStore({"policies": SqlitePoliciesStore, "risks": SqliteRisksStore, "compliance": SqliteComplianceStore}[name](_sqlite), threaded=True)
+    if versions.source is None and not HttpPool.from_env().configured:
+        # the stores are per process, so their versions are too
+        versions.use(LocalVersions())
+    stores = {"policies": PoliciesStore, "risks": RisksStore, "compliance": ComplianceStore}
+    if LOCAL_STORE == "compact":
+        # frameworks are few, so only the registers change representation
+        stores.update(policies=CompactPoliciesStore, risks=CompactRisksStore)
+    return AsyncStore(stores[name]())
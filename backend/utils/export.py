@@ -0,0 +1,54 @@
+import csv
+import inspect
+import io
+import json
+import os
+from typing import Any, AsyncIterator, Callable, List, Type
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+async def keyset_batches(list_fn: Callable, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[BaseModel]]:
+    # list_fn is a repository or demo store `list`; each batch seeks past the last id served
+    after = None
+    while True:
+        batch = list_fn(q=None, skip=0, limit=batch_size, after=after)
+        if inspect.isawaitable(batch):
+            batch = await batch
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        after = batch[-1].id
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+async def encode_csv(batches: AsyncIterator[List[BaseModel]], fields: List[str]) -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    # the header goes out before the first batch is read
+    yield buf.getvalue()
+    async for batch in batches:
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerows([_cell(getattr(item, f)) for f in fields] for item in batch)
+        yield buf.getvalue()
+
+async def encode_ndjson(batches: AsyncIterator[List[BaseModel]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(item.model_dump_json() + "\n" for item in batch)
+
+def export_response(list_fn: Callable, model: Type[BaseModel], fmt: str, name: str) -> StreamingResponse:
+    batches = keyset_batches(list_fn)
+    body = encode_csv(batches, list(model.model_fields)) if fmt == "csv" else encode_ndjson(batches)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
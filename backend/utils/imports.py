@@ -0,0 +1,83 @@
+import csv
+import inspect
+import io
+import json
+import os
+import sqlite3
+import typing
+from typing import Any, BinaryIO, Callable, Dict, List, Set, Tuple, Type
+import httpx
+from fastapi import HTTPException
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+from schemas.common import ImportProgress, ImportReport, ImportRowError
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+def _list_fields(model: Type[BaseModel]) -> Set[str]:
+    return {name for name, field in model.model_fields.items() if typing.get_origin(field.annotation) is list}
+
+def _row_payload(row: Dict[str, Any], list_fields: Set[str]) -> Dict[str, Any]:
+    # blank cells fall back to the model defaults; list cells are JSON (as exported) or `;`-separated
+    payload = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if key in list_fields:
+            if value.startswith("["):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            else:
+                value = [v.strip() for v in value.split(";") if v.strip()]
+        payload[key] = value
+    return payload
+
+def _read_chunk(reader: csv.DictReader, model: Type[BaseModel], list_fields: Set[str], size: int) -> Tuple[int, List[BaseModel], List[ImportRowError]]:
+    count, valid, errors = 0, [], []
+    try:
+        for row in reader:
+            count += 1
+            try:
+                valid.append(model.model_validate(_row_payload(row, list_fields)))
+            except ValidationError as e:
+                # line_num is the file line the record ended on, the header being line 1
+                errors.append(ImportRowError(row=reader.line_num, detail=e.errors(include_url=False, include_context=False)))
+            if count == size:
+                break
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable CSV near line {reader.line_num}: {e}")
+    return count, valid, errors
+
+async def import_csv(file: BinaryIO, model: Type[BaseModel], write: Callable, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportReport:
+    # Rows are parsed and validated `chunk_size` at a time and each chunk's valid rows go to `write`
+    # (a repository or demo store `create_many`) in one call, so memory is bounded by the chunk, not the file.
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    list_fields = _list_fields(model)
+    report = ImportReport()
+    chunk = 0
+    while True:
+        count, valid, errors = await run_in_threadpool(_read_chunk, reader, model, list_fields, chunk_size)
+        if not count:
+            break
+        chunk += 1
+        if valid:
+            try:
+                created = write(valid)
+                if inspect.isawaitable(created):
+                    created = await created
+                report.imported += len(created)
+            except (APIError, httpx.HTTPError, sqlite3.Error) as e:
+                # earlier chunks are already committed; keep going and report this one as failed
+                errors.append(ImportRowError(row=reader.line_num, detail=f"Chunk {chunk} was not written: {e}"))
+        report.rows += count
+        report.failed = report.rows - report.imported
+        report.progress.append(ImportProgress(chunk=chunk, rows=report.rows, imported=report.imported))
+        room = IMPORT_MAX_ERRORS - len(report.errors)
+        if len(errors) > room:
+            report.errors_truncated = True
+        report.errors.extend(errors[:max(room, 0)])
+    return report
@@ -0,0 +1,174 @@
+import asyncio
+import fcntl
+import glob
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+WORKFLOW_SNAPSHOT_EVERY = int(os.getenv("WORKFLOW_SNAPSHOT_EVERY", "25000"))
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class JournalLocked(RuntimeError):
+    pass
+
+class Journal:
+    # Append-only log of state changes in `<dir>/journal-<first lsn>.log`, one JSON record per
+    # line, next to a compact `<dir>/snapshot.json`. Records are applied in memory first and
+    # appended to a buffer; `commit` waits until its record is on disk. One fsync covers
+    # everything buffered while the previous one ran (group commit). Every `snapshot_every`
+    # records the state is snapshotted and a new segment started. Recovery therefore reads one
+    # snapshot and replays only the records after it.
+    def __init__(self, directory: str, snapshot_every: int = WORKFLOW_SNAPSHOT_EVERY):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.lsn = 0
+        self.durable_lsn = 0
+        self.snapshot_lsn = 0
+        self.fsyncs = 0
+        self._buffer: List[str] = []
+        self._file = None
+        self._size = 0
+        self._flush: Optional[asyncio.Future] = None
+        self._capture: Optional[Callable[[], Any]] = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock = open(os.path.join(directory, "lock"), "w")
+        try:
+            # one writer per journal; a second worker would interleave lsns
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise JournalLocked(f"Journal {directory} is in use by another process")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "journal-*.log")):
+            start = os.path.basename(path)[len("journal-"):-len(".log")]
+            if start.isdigit():
+                found.append((int(start), path))
+        return sorted(found)
+
+    def recover(self) -> Tuple[Optional[Any], Iterator[Dict[str, Any]]]:
+        # the latest snapshot, then the records after it; a torn last line from a crash ends the log
+        snapshot = None
+        path = os.path.join(self.directory, "snapshot.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.snapshot_lsn = self.lsn = data["lsn"]
+            snapshot = data["state"]
+        return snapshot, self._replay()
+
+    def _replay(self) -> Iterator[Dict[str, Any]]:
+        segments = self._segments()
+        for start, path in segments:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record["lsn"] <= self.lsn:
+                        continue
+                    if record["lsn"] != self.lsn + 1:
+                        raise RuntimeError(f"Journal gap after lsn {self.lsn} in {path}")
+                    self.lsn = record["lsn"]
+                    yield record
+        self.durable_lsn = self.lsn
+        # continue in a fresh segment; anything after a torn line is never replayed again
+        self._open(self.lsn + 1)
+
+    def _open(self, start: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, f"journal-{start}.log"), "ab")
+        self._size = self._file.tell()
+        _fsync_dir(self.directory)
+
+    def append(self, record: Dict[str, Any]) -> int:
+        self.lsn += 1
+        self._buffer.append(json.dumps({"lsn": self.lsn, **record}, separators=(",", ":")))
+        return self.lsn
+
+    def snapshots(self, capture: Callable[[], Any]):
+        self._capture = capture
+
+    async def commit(self, lsn: Optional[int] = None):
+        lsn = self.lsn if lsn is None else lsn
+        while self.durable_lsn < lsn:
+            if self._flush is None:
+                # the flush runs on its own so a cancelled caller does not strand the others
+                self._flush = asyncio.ensure_future(self._write())
+            flush = self._flush
+            await asyncio.shield(flush)
+
+    async def _write(self):
+        try:
+            if self._buffer:
+                await self._flush_buffer()
+            if self._capture is not None and self.lsn - self.snapshot_lsn >= self.snapshot_every:
+                await self._snapshot()
+        finally:
+            self._flush = None
+
+    async def _flush_buffer(self):
+        data = ("\n".join(self._buffer) + "\n").encode()
+        upto, buffered = self.lsn, self._buffer
+        self._buffer = []
+        try:
+            await run_in_threadpool(self._append_sync, data)
+        except BaseException:
+            # nothing after the last good record is kept; the records stay buffered
+            self._buffer = buffered + self._buffer
+            self._file.truncate(self._size)
+            raise
+        self._size += len(data)
+        self.durable_lsn = upto
+
+    def _append_sync(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+
+    async def _snapshot(self):
+        # The state is captured between two awaits, so it is exactly the state at `at`. Records
+        # still buffered are covered by the snapshot and are not written. The current segment stays
+        # until the snapshot is durable; if writing it fails, the buffered records go to that
+        # segment instead, so the log has no gap. Later records go to a new segment.
+        state, at = self._capture(), self.lsn
+        covered = len(self._buffer)
+        old = [path for start, path in self._segments() if start != at + 1]
+        try:
+            await run_in_threadpool(self._write_snapshot, state, at)
+        except BaseException:
+            if self._buffer:
+                await self._flush_buffer()
+            raise
+        self._buffer = self._buffer[covered:]
+        self._open(at + 1)
+        for segment in old:
+            os.remove(segment)
+        self.snapshot_lsn = self.durable_lsn = at
+
+    def _write_snapshot(self, state: Any, at: int):
+        path = os.path.join(self.directory, "snapshot.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"lsn": at, "state": state}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(self.directory)
+        self.fsyncs += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._lock.close()
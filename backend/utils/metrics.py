@@ -0,0 +1,170 @@
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# upper bounds, in seconds, of every latency histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# when set, GET /metrics requires `Authorization: Bearer <METRICS_TOKEN>`
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+Labels = Tuple[str, ...]
+
+class Metrics:
+    # Counters and histograms in Prometheus text format. Every thread records into its own shard
+    # (created on its first recording, the only time the lock is taken), so the event loop and
+    # threadpool workers never contend and no update is lost. A scrape adds the shards up; it may
+    # see a histogram's bucket before its sum, never a torn counter.
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Dict[Tuple[str, Labels], Any]] = []
+        self._families: Dict[str, Tuple[str, str, Labels, Tuple[float, ...]]] = {}
+
+    def counter(self, name: str, help: str, labels: Labels = ()) -> "Counter":
+        self._families[name] = ("counter", help, labels, ())
+        return Counter(self, name)
+
+    def histogram(self, name: str, help: str, labels: Labels = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> "Histogram":
+        self._families[name] = ("histogram", help, labels, buckets)
+        return Histogram(self, name, buckets)
+
+    def shard(self) -> Dict[Tuple[str, Labels], Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self) -> Dict[Tuple[str, Labels], Any]:
+        with self._lock:
+            shards = list(self._shards)
+        totals: Dict[Tuple[str, Labels], Any] = {}
+        for shard in shards:
+            # copied in one step, so a thread adding a series meanwhile can't break the iteration
+            for key, value in list(shard.items()):
+                if type(value) is list:
+                    total = totals.get(key)
+                    totals[key] = list(value) if total is None else [a + b for a, b in zip(total, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self) -> str:
+        series: Dict[str, List[Tuple[Labels, Any]]] = {name: [] for name in self._families}
+        for (name, labels), value in self.collect().items():
+            series[name].append((labels, value))
+        lines = []
+        for name, (kind, help, labelnames, buckets) in self._families.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in sorted(series[name]):
+                pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels)]
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                # buckets are kept per bound and made cumulative here
+                count = 0
+                for bound, hits in zip(buckets + (float("inf"),), value):
+                    count += hits
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{name}_bucket{_labels(pairs + [le])} {count}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+class Counter:
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def inc(self, *labels: str, value: float = 1):
+        shard = self.metrics.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+class Histogram:
+    def __init__(self, metrics: Metrics, name: str, buckets: Tuple[float, ...]):
+        self.metrics = metrics
+        self.name = name
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str):
+        shard = self.metrics.shard()
+        key = (self.name, labels)
+        cells = shard.get(key)
+        if cells is None:
+            # hits per bucket, +Inf included, then the sum
+            cells = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cells[bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs: List[str]) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+metrics = Metrics()
+http_requests = metrics.histogram("grc_http_request_duration_seconds", "HTTP requests by route template, method and status.", ("route", "method", "status"))
+repository_calls = metrics.histogram("grc_repository_call_duration_seconds", "Repository method calls, below the read caches.", ("repository", "method"))
+db_round_trips = metrics.histogram("grc_db_round_trip_duration_seconds", "PostgREST round trips by table and HTTP method.", ("table", "method"))
+auth_failures = metrics.counter("grc_auth_failures_total", "Requests rejected for missing or invalid credentials, or for their role.", ("reason",))
+rate_limit_rejections = metrics.counter("grc_rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("scope", "role"))
+
+class InstrumentedRepo:
+    # Async repository whose method calls are timed into repository_calls; other attributes
+    # are the wrapped repository's own
+    def __init__(self, name: str, repo: Any):
+        self.name = name
+        self.repo = repo
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.repo, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            begin = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                repository_calls.observe(time.perf_counter() - begin, self.name, name)
+
+        return call
+
+class MetricsMiddleware:
+    # Times every HTTP request into http_requests, labelled with the matched route's template
+    # (not the raw path, so ids don't multiply the series). Requests answered before routing,
+    # such as rate-limit rejections, and unknown paths are labelled "unrouted".
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        begin = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            http_requests.observe(time.perf_counter() - begin, route.path if route else "unrouted", scope["method"], str(status))
+
+def authorized(authorization: Optional[str]) -> bool:
+    return not METRICS_TOKEN or hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode())
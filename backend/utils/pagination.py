@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response
+from schemas.common import PaginatedResponse
+
+TOTAL_STRATEGIES = ("exact", "estimated", "cached")
+# Signs cursors, so the position a repository derives `total` from can't be forged. Every worker
+# must share it for a cursor issued by one to be accepted by another.
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or os.getenv("SUPABASE_JWT_SECRET") or secrets.token_hex(32)).encode()
+
+class Cursor(NamedTuple):
+    id: int
+    # rows served before the cursor, so a total can be derived from a count of the remainder
+    position: int = 0
+
+# Cursors are opaque to clients: url-safe base64 of the sort key of the last item served and
+# the position after it, then "." and a truncated HMAC of both.
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _signature(raw: bytes) -> str:
+    return _b64(hmac.new(CURSOR_SECRET, raw, hashlib.sha256).digest()[:12])
+
+def encode_cursor(last_id: int, position: int = 0) -> str:
+    raw = json.dumps({"id": last_id, "pos": position}, separators=(",", ":")).encode()
+    return f"{_b64(raw)}.{_signature(raw)}"
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    if not cursor:
+        return None
+    try:
+        body, _, signature = cursor.partition(".")
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        if not hmac.compare_digest(signature, _signature(raw)):
+            raise ValueError("bad signature")
+        data = json.loads(raw)
+        return Cursor(int(data["id"]), int(data.get("pos", 0)))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def page_response(items: Sequence, total: int, skip: int, limit: int, after: Optional[Cursor] = None) -> PaginatedResponse:
+    position = (after.position if after else skip) + len(items)
+    cursor = encode_cursor(items[-1].id, position) if limit > 0 and len(items) == limit else None
+    return PaginatedResponse(items=items, total=total, next_cursor=cursor)
+
+def page_json(page: PaginatedResponse, response: Optional[Response] = None) -> Response:
+    # The items were validated when the repository or store built them, so the page is encoded
+    # once, straight to bytes. Returned from a handler, this skips FastAPI's dump, re-validation
+    # and re-serialization against the return annotation, which still documents the schema.
+    # Headers that dependencies set on `response` (the ETag) are carried over.
+    fast = Response(page.model_dump_json(), media_type="application/json")
+    if response is not None:
+        fast.headers.raw.extend(response.headers.raw)
+    return fast
+
+def page_ids(ids: List[int], skip: int, limit: int, after: Optional[int] = None) -> List[int]:
+    # ids must be ascending; a cursor seeks by bisection so deep pages cost the same as the first
+    start = bisect_right(ids, after) if after is not None else skip
+    return ids[start:start + limit]
+
+def remove_id(ids: List[int], key: int):
+    i = bisect_left(ids, key)
+    if i < len(ids) and ids[i] == key:
+        del ids[i]
+
+class TotalCounter:
+    # How a repository reports `total` for list pages:
+    #   exact     - exact count requested alongside the page (same round trip)
+    #   estimated - PostgREST planner-based estimate alongside the page
+    #   cached    - exact count on a miss, then served from memory until the next write
+    def __init__(self, strategy: str = "exact", max_entries: int = 256):
+        if strategy not in TOTAL_STRATEGIES:
+            raise ValueError(f"Unknown total strategy: {strategy}")
+        self.strategy = strategy
+        self.max_entries = max_entries
+        self._cache: Dict[Optional[str], int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count_method(self) -> str:
+        return "estimated" if self.strategy == "estimated" else "exact"
+
+    def get(self, q: Optional[str]) -> Tuple[Optional[int], int]:
+        with self._lock:
+            cached = self._cache.get(q) if self.strategy == "cached" else None
+            return cached, self._generation
+
+    def put(self, q: Optional[str], total: int, generation: int) -> int:
+        if self.strategy != "cached":
+            return total
+        with self._lock:
+            # a write landed while the page was in flight; don't cache a count that may predate it
+            if generation != self._generation:
+                return total
+            if q not in self._cache and len(self._cache) >= self.max_entries:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[q] = total
+        return total
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._generation += 1
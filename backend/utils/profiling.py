@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.auth import authenticate
+from utils.rbac import Role, require_roles
+
+# per-request profiles and the background sampler's stacks; shared by the workers on a host
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "grc-profiles"))
+# per-request profiles kept, the oldest removed first
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+# background sampling of every thread, written every PROFILE_FLUSH_S; 0 turns it off
+PROFILE_SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "0"))
+PROFILE_FLUSH_S = float(os.getenv("PROFILE_FLUSH_S", "60"))
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STDLIB = os.path.dirname(os.__file__)
+PROFILE_ID = re.compile(r"[0-9a-f]{32}")
+
+@lru_cache(maxsize=None)
+def _label(code) -> str:
+    # "qualname (file:line)" for the folded format, which separates frames with ";"
+    path = code.co_filename
+    if path.startswith(BACKEND + os.sep):
+        path = path[len(BACKEND) + 1:]
+    elif path.startswith(STDLIB + os.sep) and "site-packages" not in path:
+        path = path[len(STDLIB) + 1:]
+    else:
+        path = path.rpartition("site-packages" + os.sep)[2]
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+def _stack(frame) -> List[str]:
+    # labels from the root of the thread down to `frame`
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def _worker_stack(frame) -> List[str]:
+    # a threadpool worker's stack without anyio's own frames below the function it runs
+    labels = []
+    while frame is not None and not (frame.f_code.co_name == "run" and "anyio" in frame.f_code.co_filename):
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def _awaiting(coro) -> List[Any]:
+    # the frames of a suspended coroutine and of every coroutine it is awaiting, outermost first
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+_active = 0
+_active_lock = threading.Lock()
+_switch_interval = sys.getswitchinterval()
+
+def _hand_over_gil(interval: float, start: bool):
+    # The sampler needs the GIL to take a sample, and a busy thread only hands it over every
+    # switch interval (5ms), longer than many requests. While any request is being profiled
+    # the interval is shortened to a fraction of the sampling one.
+    global _active, _switch_interval
+    with _active_lock:
+        if start:
+            if not _active:
+                _switch_interval = sys.getswitchinterval()
+            _active += 1
+            sys.setswitchinterval(min(_switch_interval, interval / 5))
+        else:
+            _active -= 1
+            if not _active:
+                sys.setswitchinterval(_switch_interval)
+
+class RequestProfile:
+    # Wall-clock samples of one request taken from a helper thread every `interval` seconds.
+    # While the request's task runs, its stack is read off the event loop thread, so requests
+    # served concurrently don't leak in. While it is suspended, the coroutines it is awaiting are
+    # walked: they end in the threadpool worker running its sync code (uploads, the sync fallback)
+    # or in "[await]" for I/O such as a PostgREST round trip. CPU-bound code holds the GIL for a
+    # whole switch interval, so samples are weighted by the microseconds since the previous one.
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def start(self, frame):
+        self._frame = frame
+        self._task = asyncio.current_task()
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        _hand_over_gil(self.interval, True)
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        _hand_over_gil(self.interval, False)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(round((now - last) * 1e6))
+            last = now
+
+    def sample(self, weight: int = 1):
+        frames = sys._current_frames()
+        labels = self._running(frames.get(self._loop_thread))
+        if labels is None:
+            labels = self._suspended(frames)
+        if labels:
+            self.stacks[";".join(labels)] += weight
+            self.samples += 1
+
+    def _running(self, frame) -> Optional[List[str]]:
+        labels = []
+        while frame is not None:
+            if frame is self._frame:
+                labels.reverse()
+                return labels
+            labels.append(_label(frame.f_code))
+            frame = frame.f_back
+        return None
+
+    def _suspended(self, frames: Dict[int, Any]) -> List[str]:
+        chain = _awaiting(self._task.get_coro()) if self._task else []
+        if not any(f is self._frame for f in chain):
+            return []
+        chain = chain[next(i for i, f in enumerate(chain) if f is self._frame) + 1:]
+        labels = [_label(f.f_code) for f in chain]
+        for f in chain:
+            if f.f_code.co_name == "run_sync_in_worker_thread":
+                worker = f.f_locals.get("worker")
+                if worker is not None and worker.ident in frames:
+                    stack = _worker_stack(frames[worker.ident])
+                    # parked on its queue: the call is queued, or done and its result not yet picked up
+                    parked = not stack or stack[0].startswith("Queue.get (")
+                    return labels + ["[threadpool]"] + (["[waiting]"] if parked else stack)
+        return labels + ["[await]"]
+
+def _requested(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and QueryParams(query).get("profile", "").lower() in ("1", "true")
+
+async def _require_admin(scope: Scope):
+    token = ""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            kind, _, token = value.decode("latin-1").partition(" ")
+            token = token if kind.lower() == "bearer" else ""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    await require_roles([Role.ADMIN])(authenticate(token))
+
+def _write(path: str, text: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def _folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+def save_profile(profile_id: str, stacks: Counter, info: Dict[str, Any]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    _write(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), _folded(stacks))
+    _write(os.path.join(PROFILE_DIR, f"{profile_id}.json"), json.dumps(info))
+    for old in list_profiles()[PROFILE_KEEP:]:
+        for ext in ("json", "folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{old['id']}.{ext}"))
+            except FileNotFoundError:
+                pass
+
+def list_profiles() -> List[Dict[str, Any]]:
+    profiles = []
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if name.endswith(".json") and PROFILE_ID.fullmatch(name[:-5]):
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # pruned or still being written by another worker
+                continue
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+def profile_path(profile_id: str) -> Optional[str]:
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    return path if PROFILE_ID.fullmatch(profile_id) and os.path.exists(path) else None
+
+class ProfileMiddleware:
+    # `X-Profile: 1` (or `?profile=1`) from an admin profiles that request from routing to the
+    # last byte sent. The response is unchanged apart from X-Profile-Location, where the folded
+    # stacks (weighted in microseconds) can be downloaded once the request has finished.
+    def __init__(self, app: ASGIApp, location: str = "/admin/profiles"):
+        self.app = app
+        self.location = location
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await _require_admin(scope)
+        except HTTPException as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)(scope, receive, send)
+            return
+        profile_id = uuid.uuid4().hex
+        location = f"{scope.get('root_path', '')}{self.location}/{profile_id}".encode()
+        status = 500
+
+        async def send_location(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-location", location)]
+            await send(message)
+
+        profile = RequestProfile(PROFILE_INTERVAL_MS / 1000)
+        profile.start(sys._getframe())
+        begin = time.time()
+        try:
+            await self.app(scope, receive, send_location)
+        finally:
+            profile.stop()
+            info = {"id": profile_id, "method": scope["method"], "path": scope["path"], "status": status, "created": begin,
+                    "duration_ms": round((time.time() - begin) * 1000, 3), "interval_ms": PROFILE_INTERVAL_MS,
+                    "samples": profile.samples}
+            await run_in_threadpool(save_profile, profile_id, profile.stacks, info)
+
+class StackSampler:
+    # Low-rate sampling of every thread in the process, rooted at the thread's name and folded
+    # into `path` every `flush` seconds and on stop. Counts accumulate for the life of the
+    # process, so the file is always one complete profile for flamegraph.pl, inferno or speedscope.
+    def __init__(self, path: str, hz: float, flush: float = PROFILE_FLUSH_S):
+        self.path = path
+        self.interval = 1 / hz
+        self.flush_every = flush
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        flushed = time.monotonic()
+        while not self._done.wait(self.interval):
+            self.sample()
+            if time.monotonic() - flushed >= self.flush_every:
+                self.flush()
+                flushed = time.monotonic()
+
+    def sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                self.stacks[";".join([names.get(ident, f"thread-{ident}")] + _stack(frame))] += 1
+
+    def flush(self):
+        _write(self.path, _folded(self.stacks))
+
+def start_sampler() -> Optional[StackSampler]:
+    if PROFILE_SAMPLE_HZ <= 0:
+        return None
+    return StackSampler(os.path.join(PROFILE_DIR, f"sampler-{os.getpid()}.folded"), PROFILE_SAMPLE_HZ).start()
@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from utils.auth import authenticate
+from utils.metrics import rate_limit_rejections
+
+# Comma-separated `scope[:role]=requests/period` rules, period s, m or h. A role without its own
+# rule uses the scope's; `anonymous` is a request without a valid token; 0 requests blocks.
+# Scopes: default (every route), login, bulk, import, export. Empty disables rate limiting.
+RATE_LIMITS = os.getenv("RATE_LIMITS", "default=600/m,default:anonymous=120/m,login=20/m,bulk=30/m,import=10/m,export=10/m")
+# every worker that opens the same file draws from the same buckets; empty keeps them per process
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "grc-ratelimit.bin"))
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+# proxies in front of the app that append to X-Forwarded-For (1 on Render); 0 keys on the socket peer
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+WAYS = 8
+MAGIC = b"GRCRL001"
+HEADER = struct.Struct("<8sI")
+SLOT = struct.Struct("<Qdd")
+GROUP = struct.Struct("<" + "Qdd" * WAYS)
+
+Limits = Dict[Tuple[str, Optional[str]], Tuple[float, float]]
+
+def parse_limits(spec: str) -> Limits:
+    # "bulk:viewer=5/m" -> {("bulk", "viewer"): (5 tokens, refilled at 5/60 per second)}
+    limits: Limits = {}
+    for rule in filter(None, (r.strip() for r in spec.split(","))):
+        try:
+            target, budget = rule.split("=")
+            count, period = budget.split("/")
+            scope, _, role = target.strip().partition(":")
+            limits[(scope, role or None)] = (float(count), float(count) / PERIODS[period.strip()[:1]])
+        except (ValueError, KeyError):
+            raise ValueError(f"Invalid rate limit rule: {rule!r}")
+    return limits
+
+class TokenBuckets:
+    # Token buckets in a memory-mapped file, so every worker on the host shares them. A key hashes
+    # to a group of WAYS slots (fingerprint, tokens, last refill) and only that group is locked:
+    # a byte-range lock on the file across processes, a mutex across threads. A full group reuses
+    # the slot refilled longest ago; a bucket idle that long is full again anyway.
+    def __init__(self, path: str = RATE_LIMIT_PATH, slots: int = RATE_LIMIT_SLOTS):
+        self._fd: Optional[int] = None
+        self.groups = max(slots // WAYS, 1)
+        if path:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                header = os.pread(self._fd, HEADER.size, 0)
+                if len(header) == HEADER.size and header[:len(MAGIC)] == MAGIC:
+                    # another worker created the table; its geometry wins
+                    self.groups = HEADER.unpack(header)[1]
+                else:
+                    os.ftruncate(self._fd, self._size())
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, self.groups), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(self._fd, self._size())
+        else:
+            self._map = mmap.mmap(-1, self._size())
+        self._mutex = threading.Lock()
+
+    def _size(self) -> int:
+        return HEADER.size + self.groups * WAYS * SLOT.size
+
+    def take(self, key: str, capacity: float, rate: float, now: Optional[float] = None) -> float:
+        # one token from `key`'s bucket: 0 when granted, else the seconds until one is available
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        group = fingerprint % self.groups
+        start = HEADER.size + group * WAYS * SLOT.size
+        now = time.time() if now is None else now
+        with self._mutex:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, group)
+            try:
+                values = GROUP.unpack_from(self._map, start)
+                fingerprints = values[0::3]
+                if fingerprint in fingerprints:
+                    i = fingerprints.index(fingerprint)
+                    tokens = min(capacity, values[3 * i + 1] + max(now - values[3 * i + 2], 0.0) * rate)
+                else:
+                    stamps = values[2::3]
+                    i, tokens = stamps.index(min(stamps)), capacity
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate if rate else math.inf
+                SLOT.pack_into(self._map, start + i * SLOT.size, fingerprint, tokens, now)
+                return wait
+            finally:
+                if self._fd is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, group)
+
+limits = parse_limits(RATE_LIMITS)
+_buckets: Optional[TokenBuckets] = None
+
+def buckets() -> TokenBuckets:
+    global _buckets
+    if _buckets is None:
+        _buckets = TokenBuckets()
+    return _buckets
+
+def client_address(request: Request) -> str:
+    if RATE_LIMIT_PROXY_HOPS:
+        forwarded = [a.strip() for a in request.headers.get("x-forwarded-for", "").split(",") if a.strip()]
+        # entries left of the ones our proxies appended are whatever the client sent
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def _wait(request: Request, scope: str) -> float:
+    # The header is read here rather than through the OAuth2 scheme so the OpenAPI document is
+    # unchanged; a bad token is limited as anonymous and rejected by the route's own auth check.
+    user = None
+    kind, _, token = request.headers.get("authorization", "").partition(" ")
+    if token and kind.lower() == "bearer":
+        try:
+            user = authenticate(token)
+        except HTTPException:
+            pass
+    role = user.role.value if user else "anonymous"
+    rule = limits.get((scope, role)) or limits.get((scope, None))
+    if rule is None:
+        return 0.0
+    who = f"user:{user.id}" if user else f"ip:{client_address(request)}"
+    wait = buckets().take(f"{scope}|{role}|{who}", *rule)
+    if wait:
+        rate_limit_rejections.inc(scope, role)
+    return wait
+
+def _retry_after(wait: float) -> Optional[Dict[str, str]]:
+    return {"Retry-After": str(math.ceil(wait))} if wait != math.inf else None
+
+def rate_limit(scope: str):
+    # per-route budgets (bulk, import, export, login) on top of the default one
+    async def dependency(request: Request):
+        wait = _wait(request, scope) if limits else 0.0
+        if wait:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=_retry_after(wait))
+    return dependency
+
+class RateLimitMiddleware:
+    # The "default" budget for every request, checked before routing so it costs no more than
+    # the bucket take itself
+    def __init__(self, app: ASGIApp, scope: str = "default"):
+        self.app = app
+        self.scope = scope
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and limits:
+            wait = _wait(Request(scope), self.scope)
+            if wait:
+                response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429, headers=_retry_after(wait))
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -12,11 +12,13 @@ class Role(str, Enum):
 def require_roles(roles: List[Role]):
     # Import here to avoid circular import at module load time
     from utils.auth import get_current_user
+    from utils.metrics import auth_failures
 
-    def dependency(user=Depends(get_current_user)):
+    async def dependency(user=Depends(get_current_user)):
         if user is None or getattr(user, "role", None) is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
         if user.role not in roles:
+            auth_failures.inc("forbidden")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
         return True
 
@@ -0,0 +1,50 @@
+import os
+from typing import Any, Dict, Optional
+from fastapi import Request
+from supabase import Client
+from utils import db
+from utils.async_db import HttpPool, get_async_repos
+from utils.cache import ReadCache, with_caches
+from utils.metrics import InstrumentedRepo
+
+class Registry:
+    # One per app, created with it and closed by its lifespan. Backends are built on first
+    # use: the supabase client (storage) and the repositories are shared by every route
+    # instead of each module building its own at import. With async_db off the same
+    # repositories send their requests from the threadpool.
+    def __init__(self, async_db: Optional[bool] = None):
+        self.async_db = os.getenv("ASYNC_DB", "true").lower() == "true" if async_db is None else async_db
+        self.pool = HttpPool.from_env(threaded=not self.async_db)
+        self._client: Optional[Client] = None
+        self._repos: Optional[Dict[str, Any]] = None
+        self.caches: Dict[str, ReadCache] = {}
+        self._built = False
+
+    @property
+    def client(self) -> Optional[Client]:
+        if self._client is None:
+            self._client = db.get_client()
+        return self._client
+
+    async def get_repos(self) -> Optional[Dict[str, Any]]:
+        if not self._built:
+            await self.pool.open()
+            repos = get_async_repos(self.pool)
+            # calls are timed below the per-entity read caches, so only those reaching the database count
+            repos = {name: InstrumentedRepo(name, repo) for name, repo in repos.items()} if repos else None
+            self._repos, self.caches = with_caches(repos)
+            self._built = True
+        return self._repos
+
+    async def close(self):
+        await self.pool.close()
+        self._repos = None
+        self.caches = {}
+        self._client = None
+        self._built = False
+
+async def get_registry(request: Request) -> Registry:
+    return request.app.state.registry
+
+async def get_repos(request: Request) -> Optional[Dict[str, Any]]:
+    return await request.app.state.registry.get_repos()
@@ -0,0 +1,108 @@
+from array import array
+from bisect import insort
+from collections import defaultdict
+from typing import Dict, List, Set
+from utils.pagination import remove_id
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    # Answers `q.lower() in text.lower()` for every indexed text, returning ids in
+    # ascending order. Queries shorter than a trigram scan the pre-lowered texts.
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._texts: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, key: int, text: str):
+        lowered = text.lower()
+        previous = self._texts.get(key)
+        if previous == lowered:
+            return
+        if previous is not None:
+            self._drop_postings(key, previous)
+        self._texts[key] = lowered
+        for gram in trigrams(lowered):
+            self._postings[gram].add(key)
+
+    def remove(self, key: int):
+        previous = self._texts.pop(key, None)
+        if previous is not None:
+            self._drop_postings(key, previous)
+
+    def search(self, q: str) -> List[int]:
+        needle = q.lower()
+        if len(needle) < 3:
+            return sorted(key for key, text in self._texts.items() if needle in text)
+        postings = []
+        for gram in trigrams(needle):
+            ids = self._postings.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+        texts = self._texts
+        # trigrams can all be present without being contiguous, so confirm the match
+        return sorted(key for key in candidates if needle in texts[key])
+
+    def _drop_postings(self, key: int, text: str):
+        for gram in trigrams(text):
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            ids.discard(key)
+            if not ids:
+                del self._postings[gram]
+
+class CompactTrigramIndex(TrigramIndex):
+    # Same answers as TrigramIndex, with every posting list a sorted array of ids: 4 bytes per
+    # entry instead of a set slot and an int object, and an append while ids only grow. Search
+    # confirms the shortest list against the texts instead of intersecting.
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._texts: Dict[int, str] = {}
+
+    def add(self, key: int, text: str):
+        lowered = text.lower()
+        previous = self._texts.get(key)
+        if previous == lowered:
+            return
+        if previous is not None:
+            self._drop_postings(key, previous)
+        self._texts[key] = lowered
+        postings = self._postings
+        for gram in trigrams(lowered):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array("i", (key,))
+            elif ids[-1] < key:
+                ids.append(key)
+            else:
+                insort(ids, key)
+
+    def search(self, q: str) -> List[int]:
+        needle = q.lower()
+        if len(needle) < 3:
+            return super().search(q)
+        shortest = None
+        for gram in trigrams(needle):
+            ids = self._postings.get(gram)
+            if not ids:
+                return []
+            if shortest is None or len(ids) < len(shortest):
+                shortest = ids
+        texts = self._texts
+        return [key for key in shortest if needle in texts[key]]
+
+    def _drop_postings(self, key: int, text: str):
+        for gram in trigrams(text):
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            remove_id(ids, key)
+            if not ids:
+                del self._postings[gram]
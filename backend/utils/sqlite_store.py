@@ -0,0 +1,377 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from schemas.policy import PolicyOut
+from schemas.risk import RiskOut, RiskHeatmap, RiskStats
+from schemas.compliance import FrameworkOut, FrameworkCoverage, UnmappedControls, PolicyBlastRadius
+from schemas.common import PaginatedResponse
+from utils.aggregates import LEVELS, heatmap_from_rows, stats_from_rows
+from utils.bulk import merge_changes
+from utils.coverage import blast_radius_from_rows, coverage_from_row
+from utils.pagination import Cursor, page_response
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join("data", "grc.db"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS versions (collection TEXT PRIMARY KEY, version INTEGER NOT NULL, modified REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS record_versions (
+  collection TEXT NOT NULL, id INTEGER NOT NULL, version INTEGER NOT NULL, modified REAL NOT NULL,
+  PRIMARY KEY (collection, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS policies (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, description TEXT, status TEXT,
+  reviewers TEXT, file_url TEXT
+);
+CREATE TABLE IF NOT EXISTS risks (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, description TEXT,
+  impact INTEGER NOT NULL, likelihood INTEGER NOT NULL,
+  score INTEGER GENERATED ALWAYS AS (impact * likelihood) STORED,
+  mitigation TEXT, owner TEXT
+);
+CREATE INDEX IF NOT EXISTS risks_score_idx ON risks (score DESC, id);
+CREATE INDEX IF NOT EXISTS risks_cell_idx ON risks (impact, likelihood);
+CREATE TABLE IF NOT EXISTS frameworks (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, description TEXT,
+  controls TEXT NOT NULL DEFAULT '[]', control_mappings TEXT NOT NULL DEFAULT '{}'
+);
+-- control_mappings flattened, for coverage and blast radius
+CREATE TABLE IF NOT EXISTS control_map (
+  framework_id INTEGER NOT NULL, control TEXT NOT NULL, policy_id INTEGER NOT NULL,
+  PRIMARY KEY (framework_id, control, policy_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS control_map_policy_idx ON control_map (policy_id);
+"""
+
+# substring search on the title/name columns, kept in step by triggers
+SEARCH = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({column}, content='{table}', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+  INSERT INTO {table}_fts (rowid, {column}) VALUES (new.id, new.{column});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+  INSERT INTO {table}_fts ({table}_fts, rowid, {column}) VALUES ('delete', old.id, old.{column});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {column} ON {table} BEGIN
+  INSERT INTO {table}_fts ({table}_fts, rowid, {column}) VALUES ('delete', old.id, old.{column});
+  INSERT INTO {table}_fts (rowid, {column}) VALUES (new.id, new.{column});
+END;
+"""
+
+class SqliteDB:
+    # One database file shared by every worker process. WAL lets readers run alongside the single
+    # writer; each write is a BEGIN IMMEDIATE transaction, so ids (AUTOINCREMENT) and versions are
+    # allocated under the database's write lock, across processes. Connections are per thread,
+    # and sqlite3 keeps each connection's prepared statements in its statement cache.
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._epoch: Optional[str] = None
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        # every worker runs this on its first connection; IF NOT EXISTS under the write lock makes it idempotent
+        script = SCHEMA + "".join(SEARCH.format(table=t, column=c) for t, c in (("policies", "title"), ("risks", "title"), ("frameworks", "name")))
+        with self._transaction(conn, "BEGIN IMMEDIATE"):
+            for statement in _statements(script):
+                conn.execute(statement)
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+
+    @contextmanager
+    def _transaction(self, conn: sqlite3.Connection, begin: str = "BEGIN"):
+        conn.execute(begin)
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def read(self):
+        # one snapshot for a page and its total
+        return self._transaction(self.connect())
+
+    def write(self):
+        return self._transaction(self.connect(), "BEGIN IMMEDIATE")
+
+    # versions for ETags, bumped in the writing transaction so every worker sees the same ones
+
+    def bump(self, conn: sqlite3.Connection, collection: str, ids: Iterable[int] = ()):
+        now = time.time()
+        version = conn.execute(
+            "INSERT INTO versions (collection, version, modified) VALUES (?, 1, ?) "
+            "ON CONFLICT (collection) DO UPDATE SET version = version + 1, modified = excluded.modified RETURNING version",
+            (collection, now)).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO record_versions (collection, id, version, modified) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET version = excluded.version, modified = excluded.modified",
+            [(collection, record_id, version, now) for record_id in ids])
+
+    @property
+    def epoch(self) -> str:
+        if self._epoch is None:
+            self._epoch = self.connect().execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+        return self._epoch
+
+    def collection_version(self, collection: str) -> Tuple[int, float]:
+        row = self.connect().execute("SELECT version, modified FROM versions WHERE collection = ?", (collection,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+    def record_version(self, collection: str, record_id: int) -> Tuple[int, float]:
+        row = self.connect().execute("SELECT version, modified FROM record_versions WHERE collection = ? AND id = ?", (collection, record_id)).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+def _statements(script: str) -> Iterator[str]:
+    # split on complete statements (trigger bodies contain semicolons)
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        if line.startswith("--"):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            yield buffer.strip()
+            buffer = ""
+
+def _match(q: str) -> str:
+    # the whole query as one FTS5 phrase: a substring match with the trigram tokenizer
+    return '"' + q.replace('"', '""') + '"'
+
+def _like(q: str) -> str:
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+class SqliteStore:
+    # The list/page/count/create/get/update/delete interface of the in-memory stores over one table
+    table = ""
+    column = ""
+    collection = ""
+    model: Type[BaseModel] = BaseModel
+    json_columns: Tuple[str, ...] = ()
+    generated: Tuple[str, ...] = ()
+
+    def __init__(self, db: SqliteDB):
+        self.db = db
+
+    def _item(self, row: sqlite3.Row):
+        data = dict(row)
+        for column in self.json_columns:
+            if data.get(column) is not None:
+                data[column] = json.loads(data[column])
+        return self.model(**data)
+
+    def _values(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        data = {k: v for k, v in data.items() if k not in self.generated}
+        for column in self.json_columns:
+            if data.get(column) is not None:
+                data[column] = json.dumps(data[column])
+        return data
+
+    def _where(self, q: Optional[str]) -> Tuple[str, List[Any]]:
+        if not q:
+            return "", []
+        if len(q) >= 3:
+            return f"id IN (SELECT rowid FROM {self.table}_fts WHERE {self.table}_fts MATCH ?)", [_match(q)]
+        # shorter than a trigram; LIKE folds ASCII case only
+        return f"{self.column} LIKE ? ESCAPE '\\'", [_like(q)]
+
+    def _select(self, conn: sqlite3.Connection, q: Optional[str], skip: int, limit: int, after: Optional[int]) -> List[sqlite3.Row]:
+        where, params = self._where(q)
+        clauses = [where] if where else []
+        if after is not None:
+            # keyset seek on the primary key when a cursor is given, offset paging otherwise
+            clauses.append("id > ?")
+            params.append(after)
+        sql = f"SELECT * FROM {self.table}" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY id LIMIT ?"
+        params.append(limit)
+        if after is None:
+            sql += " OFFSET ?"
+            params.append(skip)
+        return conn.execute(sql, params).fetchall()
+
+    def _count(self, conn: sqlite3.Connection, q: Optional[str]) -> int:
+        if q and len(q) >= 3:
+            # the index mirrors the table through triggers, so it can be counted on its own
+            return conn.execute(f"SELECT count(*) FROM {self.table}_fts WHERE {self.table}_fts MATCH ?", [_match(q)]).fetchone()[0]
+        where, params = self._where(q)
+        return conn.execute(f"SELECT count(*) FROM {self.table}" + (f" WHERE {where}" if where else ""), params).fetchone()[0]
+
+    def list(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[int] = None) -> List[Any]:
+        with self.db.read() as conn:
+            return [self._item(row) for row in self._select(conn, q, skip, limit, after)]
+
+    def page(self, q: Optional[str] = None, skip: int = 0, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse:
+        with self.db.read() as conn:
+            rows = self._select(conn, q, skip, limit, after.id if after else None)
+            total = self._count(conn, q)
+        return page_response([self._item(row) for row in rows], total, skip, limit, after)
+
+    def count(self) -> int:
+        return self.db.connect().execute(f"SELECT count(*) FROM {self.table}").fetchone()[0]
+
+    def _insert(self, conn: sqlite3.Connection, data: Dict[str, Any]) -> sqlite3.Row:
+        values = self._values(data)
+        columns = ", ".join(values)
+        marks = ", ".join("?" for _ in values)
+        return conn.execute(f"INSERT INTO {self.table} ({columns}) VALUES ({marks}) RETURNING *", list(values.values())).fetchone()
+
+    def _update(self, conn: sqlite3.Connection, record_id: int, data: Dict[str, Any]) -> Optional[sqlite3.Row]:
+        values = self._values(data)
+        if not values:
+            return conn.execute(f"SELECT * FROM {self.table} WHERE id = ?", (record_id,)).fetchone()
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        return conn.execute(f"UPDATE {self.table} SET {assignments} WHERE id = ? RETURNING *", [*values.values(), record_id]).fetchone()
+
+    def create(self, payload: BaseModel) -> Any:
+        return self.create_many([payload])[0]
+
+    def create_many(self, payloads: List[BaseModel]) -> List[Any]:
+        if not payloads:
+            return []
+        with self.db.write() as conn:
+            rows = [self._insert(conn, self._new(p)) for p in payloads]
+            self.db.bump(conn, self.collection, [row["id"] for row in rows])
+        return [self._item(row) for row in rows]
+
+    def _new(self, payload: BaseModel) -> Dict[str, Any]:
+        return payload.model_dump()
+
+    def get(self, record_id: int) -> Optional[Any]:
+        row = self.db.connect().execute(f"SELECT * FROM {self.table} WHERE id = ?", (record_id,)).fetchone()
+        return self._item(row) if row else None
+
+    def update(self, record_id: int, payload: BaseModel) -> Optional[Any]:
+        with self.db.write() as conn:
+            row = self._update(conn, record_id, payload.model_dump(exclude_none=True))
+            if row:
+                self.db.bump(conn, self.collection, [record_id])
+        return self._item(row) if row else None
+
+    def update_many(self, payloads: List[BaseModel]) -> Dict[int, Any]:
+        changes = merge_changes(payloads)
+        if not changes:
+            return {}
+        updated = {}
+        with self.db.write() as conn:
+            for record_id, data in changes.items():
+                row = self._update(conn, record_id, data)
+                if row:
+                    updated[record_id] = row
+            if updated:
+                self.db.bump(conn, self.collection, list(updated))
+        return {record_id: self._item(row) for record_id, row in updated.items()}
+
+    def delete(self, record_id: int) -> bool:
+        return bool(self.delete_many([record_id]))
+
+    def delete_many(self, ids: List[int]) -> List[int]:
+        if not ids:
+            return []
+        with self.db.write() as conn:
+            marks = ", ".join("?" for _ in ids)
+            deleted = {row[0] for row in conn.execute(f"DELETE FROM {self.table} WHERE id IN ({marks}) RETURNING id", ids)}
+            if deleted:
+                self._deleted(conn, deleted)
+                self.db.bump(conn, self.collection, deleted)
+        return [i for i in ids if i in deleted]
+
+    def _deleted(self, conn: sqlite3.Connection, ids: Iterable[int]):
+        pass
+
+class SqlitePoliciesStore(SqliteStore):
+    table, column, collection = "policies", "title", "policies"
+    model = PolicyOut
+    json_columns = ("reviewers",)
+
+class SqliteRisksStore(SqliteStore):
+    table, column, collection = "risks", "title", "risks"
+    model = RiskOut
+    generated = ("score",)
+
+    def heatmap(self) -> RiskHeatmap:
+        rows = self.db.connect().execute("SELECT impact, likelihood, count(*) AS count FROM risks GROUP BY impact, likelihood").fetchall()
+        return heatmap_from_rows([dict(row) for row in rows])
+
+    def stats(self, top: int = 10) -> RiskStats:
+        # the same summary as the risk_stats view; the top k walks risks_score_idx
+        with self.db.read() as conn:
+            summary = dict(conn.execute(
+                "SELECT count(*) AS total, avg(score) AS average_score, max(score) AS max_score, "
+                "sum(score < 10) AS low, sum(score >= 10 AND score < 20) AS medium, sum(score >= 20) AS high FROM risks").fetchone())
+            rows = conn.execute("SELECT * FROM risks ORDER BY score DESC, id LIMIT ?", (top,)).fetchall()
+        summary.update({name: summary[name] or 0 for name, _ in LEVELS})
+        return stats_from_rows(summary, [self._item(row) for row in rows])
+
+class SqliteComplianceStore(SqliteStore):
+    table, column, collection = "frameworks", "name", "frameworks"
+    model = FrameworkOut
+    json_columns = ("controls", "control_mappings")
+
+    def _new(self, payload: BaseModel) -> Dict[str, Any]:
+        return {**payload.model_dump(), "control_mappings": {}}
+
+    def _deleted(self, conn: sqlite3.Connection, ids: Iterable[int]):
+        conn.executemany("DELETE FROM control_map WHERE framework_id = ?", [(i,) for i in ids])
+
+    def map_controls(self, framework_id: int, mapping: Dict[str, List[int]]) -> bool:
+        # replaces the policies of each given control, in the stored JSON and the flattened index
+        with self.db.write() as conn:
+            row = conn.execute("SELECT control_mappings FROM frameworks WHERE id = ?", (framework_id,)).fetchone()
+            if not row:
+                return False
+            merged = {**json.loads(row[0]), **mapping}
+            conn.execute("UPDATE frameworks SET control_mappings = ? WHERE id = ?", (json.dumps(merged), framework_id))
+            conn.executemany("DELETE FROM control_map WHERE framework_id = ? AND control = ?", [(framework_id, c) for c in mapping])
+            conn.executemany("INSERT OR IGNORE INTO control_map (framework_id, control, policy_id) VALUES (?, ?, ?)",
+                             [(framework_id, c, p) for c, policy_ids in mapping.items() for p in policy_ids])
+            self.db.bump(conn, self.collection, [framework_id])
+        return True
+
+    def _coverage(self, where: str, params: List[Any]) -> List[FrameworkCoverage]:
+        rows = self.db.connect().execute(
+            "SELECT f.id AS framework_id, f.name, json_array_length(f.controls) AS controls, "
+            "(SELECT count(DISTINCT m.control) FROM control_map m WHERE m.framework_id = f.id "
+            " AND m.control IN (SELECT value FROM json_each(f.controls))) AS covered "
+            f"FROM frameworks f {where} ORDER BY f.id", params).fetchall()
+        return [coverage_from_row(dict(row)) for row in rows]
+
+    def coverage(self, framework_id: int) -> Optional[FrameworkCoverage]:
+        found = self._coverage("WHERE f.id = ?", [framework_id])
+        return found[0] if found else None
+
+    def all_coverage(self) -> List[FrameworkCoverage]:
+        return self._coverage("", [])
+
+    def unmapped(self, framework_id: int) -> Optional[UnmappedControls]:
+        with self.db.read() as conn:
+            if not conn.execute("SELECT 1 FROM frameworks WHERE id = ?", (framework_id,)).fetchone():
+                return None
+            rows = conn.execute(
+                "SELECT c.value FROM frameworks f, json_each(f.controls) c WHERE f.id = ? "
+                "AND c.value NOT IN (SELECT control FROM control_map WHERE framework_id = f.id) ORDER BY c.key",
+                (framework_id,)).fetchall()
+        return UnmappedControls(framework_id=framework_id, controls=[row[0] for row in rows])
+
+    def blast_radius(self, policy_id: int) -> PolicyBlastRadius:
+        rows = self.db.connect().execute(
+            "SELECT m.framework_id, f.name, m.control FROM control_map m JOIN frameworks f ON f.id = m.framework_id WHERE m.policy_id = ?",
+            (policy_id,)).fetchall()
+        return blast_radius_from_rows(policy_id, [dict(row) for row in rows])
@@ -0,0 +1,210 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import uuid
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Tuple
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from storage3.utils import StorageException
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+def uploads_dir() -> str:
+    return os.getenv("UPLOADS_DIR") or os.path.join(os.getcwd(), "uploads")
+
+def _staging_dir() -> str:
+    path = os.path.join(uploads_dir(), ".staging")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class Staged(NamedTuple):
+    path: str
+    digest: str
+    size: int
+
+def _write(f, data: bytes):
+    f.write(data)
+    f.flush()
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+async def stage(chunks: AsyncIterator[bytes]) -> Staged:
+    # Spools an upload to a staging file one chunk at a time, hashing as it goes
+    path = os.path.join(_staging_dir(), uuid.uuid4().hex)
+    digest, size = hashlib.sha256(), 0
+    try:
+        with open(path, "wb") as f:
+            async for data in chunks:
+                digest.update(data)
+                size += len(data)
+                await run_in_threadpool(_write, f, data)
+    except BaseException:
+        _discard(path)
+        raise
+    return Staged(path, digest.hexdigest(), size)
+
+async def read_chunks(file) -> AsyncIterator[bytes]:
+    # UploadFile is already spooled to disk by Starlette; never read it whole
+    while True:
+        data = await file.read(UPLOAD_CHUNK_SIZE)
+        if not data:
+            return
+        yield data
+
+async def coalesce(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # request bodies arrive in small pieces; write them UPLOAD_CHUNK_SIZE at a time
+    buf = bytearray()
+    async for data in stream:
+        buf += data
+        if len(buf) >= UPLOAD_CHUNK_SIZE:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class LocalBlobs:
+    # Content-addressed files under uploads/sha256/; the staged file is renamed into place
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.join(root or uploads_dir(), "sha256")
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(os.path.join(self.root, digest))
+
+    def put(self, staged: Staged, content_type: Optional[str] = None) -> bool:
+        if self.exists(staged.digest):
+            _discard(staged.path)
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        os.replace(staged.path, os.path.join(self.root, staged.digest))
+        return True
+
+    def url(self, digest: str) -> str:
+        return f"/uploads/sha256/{digest}"
+
+class StorageBlobs:
+    # Content-addressed objects under sha256/ in a Supabase storage bucket
+    def __init__(self, client, bucket: Optional[str] = None):
+        self.bucket = client.storage.from_(bucket or os.getenv("SUPABASE_STORAGE_BUCKET", "policy_files"))
+
+    def exists(self, digest: str) -> bool:
+        found = self.bucket.list("sha256", {"limit": 1, "search": digest})
+        return any(entry.get("name") == digest for entry in found)
+
+    def put(self, staged: Staged, content_type: Optional[str] = None) -> bool:
+        try:
+            if self.exists(staged.digest):
+                return False
+            options = {"content-type": content_type} if content_type else None
+            try:
+                with open(staged.path, "rb") as f:
+                    # httpx streams the open file from disk
+                    self.bucket.upload(f"sha256/{staged.digest}", f, options)
+            except StorageException:
+                # a concurrent upload of the same content got there first
+                if not self.exists(staged.digest):
+                    raise
+                return False
+            return True
+        finally:
+            _discard(staged.path)
+
+    def url(self, digest: str) -> str:
+        return self.bucket.get_public_url(f"sha256/{digest}")
+
+class UploadSessions:
+    # Resumable uploads: bytes land in `<id>.part` in the staging directory next to a `<id>.json`
+    # describing the upload. The offset is the part file's size, so a session survives restarts
+    # and is visible to every worker sharing the uploads directory.
+    def __init__(self, root: Optional[str] = None):
+        self._root = root
+
+    @property
+    def root(self) -> str:
+        if self._root:
+            os.makedirs(self._root, exist_ok=True)
+            return self._root
+        return _staging_dir()
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return os.path.join(self.root, f"{upload_id}.part"), os.path.join(self.root, f"{upload_id}.json")
+
+    def create(self, policy_id: int, filename: str, size: int, content_type: Optional[str] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        part, meta = self._paths(upload_id)
+        open(part, "wb").close()
+        info = {"upload_id": upload_id, "policy_id": policy_id, "filename": filename, "size": size, "content_type": content_type, "sha256": sha256}
+        with open(meta, "w") as f:
+            json.dump(info, f)
+        return {**info, "offset": 0}
+
+    def get(self, policy_id: int, upload_id: str) -> Dict[str, Any]:
+        part, meta = self._paths(upload_id)
+        try:
+            with open(meta) as f:
+                info = json.load(f)
+            offset = os.path.getsize(part)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if info["policy_id"] != policy_id:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return {**info, "offset": offset}
+
+    async def append(self, info: Dict[str, Any], content_range: Optional[str], chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        # Content-Range: bytes <first>-<last>/<size>; the range must start at the current offset
+        match = CONTENT_RANGE.fullmatch(content_range or "")
+        if not match:
+            raise HTTPException(status_code=400, detail="Content-Range: bytes <first>-<last>/<size> is required")
+        first, last, size = map(int, match.groups())
+        if size != info["size"] or last < first or last >= size:
+            raise HTTPException(status_code=416, detail="Range does not fit the upload")
+        if first != info["offset"]:
+            raise HTTPException(status_code=409, detail={"message": "Range must start at the current offset", "offset": info["offset"]})
+        part, _ = self._paths(info["upload_id"])
+        f = open(part, "ab")
+        try:
+            try:
+                # one writer per session, across workers too
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=409, detail={"message": "Upload is busy", "offset": info["offset"]})
+            if os.fstat(f.fileno()).st_size != first:
+                raise HTTPException(status_code=409, detail={"message": "Range must start at the current offset", "offset": os.fstat(f.fileno()).st_size})
+            expected = last - first + 1
+            written = 0
+            async for data in chunks:
+                if written + len(data) > expected:
+                    raise HTTPException(status_code=400, detail="Body is longer than the Content-Range")
+                await run_in_threadpool(_write, f, data)
+                written += len(data)
+        finally:
+            f.close()
+        if written != expected:
+            # keep what arrived; the client resumes from the reported offset
+            raise HTTPException(status_code=400, detail={"message": "Body is shorter than the Content-Range", "offset": first + written})
+        return {**info, "offset": first + written}
+
+    def discard(self, upload_id: str):
+        for path in self._paths(upload_id):
+            _discard(path)
+
+    async def finish(self, info: Dict[str, Any]) -> Staged:
+        part, meta = self._paths(info["upload_id"])
+        digest = await run_in_threadpool(_hash_file, part)
+        _discard(meta)
+        return Staged(part, digest, info["size"])
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import inspect
+import threading
+import time
+import uuid
+import weakref
+from email.utils import formatdate
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from utils.auth import get_current_user
+
+class LocalVersions:
+    # The memory and compact stores live in one process, so their versions can too: counters bumped
+    # by every write through them. The epoch is drawn per process, so a tag handed out by another
+    # worker, or before a restart, never matches here.
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._collections: Dict[str, Tuple[int, float]] = {}
+        self._records: Dict[Tuple[str, int], Tuple[int, float]] = {}
+
+    def changed(self, collection: str, ids: List[int]):
+        now = time.time()
+        with self._lock:
+            version = self._collections.get(collection, (0, 0.0))[0] + 1
+            self._collections[collection] = (version, now)
+            for record_id in ids:
+                self._records[(collection, record_id)] = (version, now)
+
+    def collection_version(self, collection: str) -> Tuple[int, float]:
+        return self._collections.get(collection, (0, 0.0))
+
+    def record_version(self, collection: str, record_id: int) -> Tuple[int, float]:
+        return self._records.get((collection, record_id), (0, 0.0))
+
+class VersionTracker:
+    # Versions for ETags come from the source that sees every write to the data being served: the
+    # SQLite file shared by workers (utils/sqlite_store.py), the versions table kept by triggers in
+    # Postgres (utils/async_db.py), or LocalVersions for the per-process stores. Without one there
+    # are no ETags and no 304s. bump() also tells this process's read caches what changed.
+    def __init__(self):
+        # read caches drop what a write touched; held weakly so a discarded cache just goes away
+        self._watchers = weakref.WeakSet()
+        self.source = None
+
+    def watch(self, watcher):
+        self._watchers.add(watcher)
+
+    def bump(self, collection: str, ids: Iterable[int] = ()):
+        ids = list(ids)
+        for watcher in list(self._watchers):
+            watcher.changed(collection, ids)
+
+    def use(self, source):
+        self.source = source
+        # a source that counts writes itself (LocalVersions) hears about them like the caches
+        if hasattr(source, "changed"):
+            self.watch(source)
+
+    @staticmethod
+    async def _version(found) -> Tuple[int, float]:
+        # the SQLite source answers directly, the Postgres one over the connection pool
+        return await found if inspect.isawaitable(found) else found
+
+    def _tag(self, source, version: Tuple[int, float]) -> Tuple[str, float]:
+        return f'W/"{source.epoch}.{version[0]}"', version[1]
+
+    async def collection(self, collection: str) -> Optional[Tuple[str, float]]:
+        source = self.source
+        if source is None:
+            return None
+        return self._tag(source, await self._version(source.collection_version(collection)))
+
+    async def record(self, collection: str, record_id: int) -> Optional[Tuple[str, float]]:
+        source = self.source
+        if source is None:
+            return None
+        return self._tag(source, await self._version(source.record_version(collection, record_id)))
+
+versions = VersionTracker()
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match requires
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def _conditional(request: Request, response: Response, tag: Optional[Tuple[str, float]]):
+    if tag is None:
+        return
+    etag, modified = tag
+    headers = {"ETag": etag}
+    if modified:
+        headers["Last-Modified"] = formatdate(modified, usegmt=True)
+    if _matches(request.headers.get("if-none-match"), etag):
+        # raised from a dependency, so the handler (and its queries) never run
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+def collection_etag(collection: str):
+    async def check(request: Request, response: Response, user=Depends(get_current_user)):
+        if getattr(versions.source, "remote", False):
+            # a database round trip: read alongside the handler's own query (see ConditionalRoute)
+            request.state.version = asyncio.ensure_future(versions.collection(collection))
+            return
+        _conditional(request, response, await versions.collection(collection))
+    return check
+
+def record_etag(collection: str, param: str):
+    async def check(request: Request, response: Response, user=Depends(get_current_user)):
+        _conditional(request, response, await versions.record(collection, int(request.path_params[param])))
+    return check
+
+class ConditionalRoute(APIRoute):
+    # Finishes the collection ETags collection_etag reads from a remote source alongside the handler,
+    # so a list stays one round trip. The two reads are not ordered against each other, so the tag
+    # also carries a digest of the body: a 304 means the client already has these bytes.
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except BaseException:
+                pending = getattr(request.state, "version", None)
+                if pending is not None:
+                    pending.cancel()
+                raise
+            pending = getattr(request.state, "version", None)
+            if pending is None or response.status_code != 200:
+                return response
+            tag, modified = await pending
+            digest = hashlib.blake2b(response.body, digest_size=8).hexdigest()
+            headers = {"ETag": f'{tag[:-1]}.{digest}"'}
+            if modified:
+                headers["Last-Modified"] = formatdate(modified, usegmt=True)
+            if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            response.headers.update(headers)
+            return response
+        return route
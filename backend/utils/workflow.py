@@ -0,0 +1,192 @@
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from schemas.common import BulkError, PaginatedResponse
+from schemas.workflow import WorkflowConfig, WorkflowRequest, WorkflowStageQueue, WorkflowStatus, WorkflowTransition
+from utils.pagination import Cursor, encode_cursor
+
+PENDING, APPROVED, REJECTED = "Pending", "Approved", "Rejected"
+
+class _Entry:
+    __slots__ = ("request_id", "title", "position", "status", "seq")
+
+    def __init__(self, request_id: str, title: Optional[str], seq: int):
+        self.request_id = request_id
+        self.title = title
+        self.position: Optional[int] = None
+        self.status = PENDING
+        self.seq = seq
+
+class _Queue:
+    # Arrival numbers in ascending order. A request leaving the queue is only counted out: its
+    # number is skipped when paging and swept once the departed outnumber those still waiting,
+    # so a move costs O(1) amortized even at the head of a long queue.
+    __slots__ = ("seqs", "live")
+
+    def __init__(self):
+        self.seqs: List[int] = []
+        self.live = 0
+
+    def add(self, seq: int):
+        self.seqs.append(seq)
+        self.live += 1
+
+    def remove(self, alive: Dict[int, Any]):
+        self.live -= 1
+        if len(self.seqs) > 2 * self.live + 64:
+            self.seqs = [seq for seq in self.seqs if seq in alive]
+
+    def page(self, alive: Dict[int, Any], limit: int, after: Optional[int] = None) -> List[int]:
+        page = []
+        for i in range(bisect_right(self.seqs, after) if after is not None else 0, len(self.seqs)):
+            if len(page) >= limit:
+                break
+            if self.seqs[i] in alive:
+                page.append(self.seqs[i])
+        return page
+
+class WorkflowEngine:
+    # Requests are indexed by (stage position, status); finished requests sit under (None, status).
+    # A request holds its stage as a position in role_order, so a transition is arithmetic rather
+    # than a search of the list. Each queue is the ascending arrival numbers of its requests, so a
+    # page starts with a bisection whatever its depth.
+    def __init__(self, config: Optional[WorkflowConfig] = None):
+        self._config = config or WorkflowConfig()
+        self._positions: Dict[str, int] = {stage: i for i, stage in enumerate(self._config.role_order)}
+        self._requests: Dict[str, _Entry] = {}
+        self._queues: Dict[Tuple[Optional[int], str], _Queue] = {}
+        self._by_seq: Dict[int, _Entry] = {}
+        self._seq = 0
+
+    @property
+    def config(self) -> WorkflowConfig:
+        return self._config
+
+    def _status(self, entry: _Entry) -> WorkflowStatus:
+        stage = self._config.role_order[entry.position] if entry.position is not None else None
+        return WorkflowStatus(request_id=entry.request_id, status=entry.status, stage=stage, title=entry.title)
+
+    def _move(self, entry: _Entry, position: Optional[int], status: str):
+        # leaves the old queue and joins the back of the new one
+        del self._by_seq[entry.seq]
+        self._queues[(entry.position, entry.status)].remove(self._by_seq)
+        self._enqueue(entry, position, status)
+
+    def _enqueue(self, entry: _Entry, position: Optional[int], status: str):
+        self._seq += 1
+        entry.seq, entry.position, entry.status = self._seq, position, status
+        self._by_seq[entry.seq] = entry
+        self._queues.setdefault((position, status), _Queue()).add(entry.seq)
+
+    def snapshot(self) -> Dict[str, Any]:
+        # everything needed to rebuild the engine exactly, arrival numbers included; _by_seq is
+        # always in arrival order, so the entries are too
+        entries = [[e.request_id, e.title, e.position, e.status, e.seq] for e in self._by_seq.values()]
+        return {"role_order": self._config.role_order, "seq": self._seq, "requests": entries}
+
+    @classmethod
+    def restore(cls, data: Dict[str, Any]) -> "WorkflowEngine":
+        engine = cls(WorkflowConfig(role_order=data["role_order"]))
+        engine._seq = data["seq"]
+        for request_id, title, position, status, seq in data["requests"]:
+            entry = engine._requests[request_id] = _Entry(request_id, title, seq)
+            entry.position, entry.status = position, status
+            engine._by_seq[seq] = entry
+            engine._queues.setdefault((position, status), _Queue()).add(seq)
+        return engine
+
+    def position(self, stage: str) -> int:
+        position = self._positions.get(stage)
+        if position is None:
+            raise HTTPException(status_code=404, detail="Stage not found")
+        return position
+
+    def set_config(self, config: WorkflowConfig):
+        if len(set(config.role_order)) != len(config.role_order):
+            raise HTTPException(status_code=422, detail="Stages in role_order must be unique")
+        old = self._config.role_order
+        positions = {stage: i for i, stage in enumerate(config.role_order)}
+        # requests in flight keep their stage by name; a removed stage hands its requests on to the
+        # next stage that survives, or the last stage when none does, so nothing skips approval
+        for entry in self._requests.values():
+            if entry.position is None:
+                continue
+            survivors = [positions[stage] for stage in old[entry.position:] if stage in positions]
+            entry.position = survivors[0] if survivors else len(config.role_order) - 1
+        self._config, self._positions = config, positions
+        # rebuilt in arrival order, so queues that merged stay in the order their requests arrived
+        self._queues = {}
+        for seq in sorted(self._by_seq):
+            entry = self._by_seq[seq]
+            self._queues.setdefault((entry.position, entry.status), _Queue()).add(seq)
+
+    def create(self, req: WorkflowRequest) -> WorkflowStatus:
+        if not 0 <= req.current_stage_index < len(self._config.role_order):
+            raise HTTPException(status_code=400, detail="current_stage_index is outside role_order")
+        entry = self._requests.get(req.request_id)
+        if entry is None:
+            entry = self._requests[req.request_id] = _Entry(req.request_id, req.title, 0)
+            self._enqueue(entry, req.current_stage_index, PENDING)
+        else:
+            # resubmitting an id restarts it
+            entry.title = req.title
+            self._move(entry, req.current_stage_index, PENDING)
+        return self._status(entry)
+
+    def get(self, request_id: str) -> Optional[WorkflowStatus]:
+        entry = self._requests.get(request_id)
+        return self._status(entry) if entry else None
+
+    def _transition(self, entry: _Entry, action: str) -> bool:
+        if entry.status != PENDING:
+            return False
+        if action == "approve":
+            if entry.position + 1 < len(self._config.role_order):
+                self._move(entry, entry.position + 1, PENDING)
+            else:
+                self._move(entry, None, APPROVED)
+        elif action == "reject":
+            if entry.position > 0:
+                self._move(entry, entry.position - 1, PENDING)
+            else:
+                self._move(entry, None, REJECTED)
+        else:
+            return False
+        return True
+
+    def move(self, request_id: str, action: str) -> bool:
+        entry = self._requests.get(request_id)
+        return entry is not None and self._transition(entry, action)
+
+    def transition(self, tr: WorkflowTransition) -> Optional[WorkflowStatus]:
+        if not self.move(tr.request_id, tr.action):
+            return None
+        return self._status(self._requests[tr.request_id])
+
+    def transition_many(self, action: str, request_ids: List[str], stage: Optional[str] = None) -> Tuple[List[WorkflowStatus], List[BulkError]]:
+        # with a stage, only requests still waiting there move, so two approvers clearing the same
+        # queue can't push a request on twice
+        position = self.position(stage) if stage is not None else None
+        items, errors = [], []
+        for index, request_id in enumerate(request_ids):
+            entry = self._requests.get(request_id)
+            if not entry:
+                errors.append(BulkError(index=index, detail="Request not found"))
+            elif position is not None and (entry.status != PENDING or entry.position != position):
+                errors.append(BulkError(index=index, detail=f"Request is not pending at {stage}"))
+            elif not self._transition(entry, action):
+                errors.append(BulkError(index=index, detail="Invalid transition"))
+            else:
+                items.append(self._status(entry))
+        return items, errors
+
+    def queue(self, stage: str, limit: int = 20, after: Optional[Cursor] = None) -> PaginatedResponse[WorkflowStatus]:
+        # pending at a stage, oldest first; the cursor is the arrival number of the last request served
+        queue = self._queues.get((self.position(stage), PENDING)) or _Queue()
+        page = queue.page(self._by_seq, limit, after.id if after else None)
+        position = (after.position if after else 0) + len(page)
+        cursor = encode_cursor(page[-1], position) if limit > 0 and len(page) == limit else None
+        return PaginatedResponse(items=[self._status(self._by_seq[seq]) for seq in page], total=queue.live, next_cursor=cursor)
+
+    def stages(self) -> List[WorkflowStageQueue]:
+        return [WorkflowStageQueue(stage=stage, pending=self._queues[(i, PENDING)].live if (i, PENDING) in self._queues else 0) for i, stage in enumerate(self._config.role_order)]